@@ -0,0 +1,239 @@
+"""
+Runs writer and reader processes against the same database at the same time and reports lock errors and
+latencies.
+
+Writers move pallets one at a time with move_pallet() or in small batches with move_pallets(), like the
+scanner integration. Readers search, print the first page of views and check locations, like the UI
+terminals. Every target location is used only once, so all moves are valid.
+
+Shuttles then move two pallets back and forth as fast as they can, which gives the rate of move_pallet()
+when every move contends for the write lock.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrency [--writers N] [--readers N] [--duration S] [--no-wal]
+                                           [--shuttle-moves N]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import create_db
+import varastologiikka as vl
+
+def percentile(samples: list[float], percent: float) -> float:
+    """
+    Returns a percentile of the samples using the nearest-rank method.
+
+    Args:
+        samples (list[float]): The samples, sorted in ascending order.
+        percent (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The sample at the percentile, or 0.0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, -(-len(samples) * percent // 100))
+    return samples[int(rank) - 1]
+
+def writer(db_path: str, concurrent: bool, pallets: list[int], locations: list[int], deadline: float,
+           batch: int, queue):
+    """
+    Moves the given pallets to the given locations, each location used once, until the deadline.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        concurrent (bool): Whether to use the concurrency mode of Database.
+        pallets (list[int]): The pallets this writer moves.
+        locations (list[int]): Free locations reserved for this writer.
+        deadline (float): The time.time() at which to stop.
+        batch (int): Pallets per move_pallets() call, or 1 to use move_pallet().
+        queue (multiprocessing.Queue): Receives ("writer", latencies, errors).
+    """
+    db = vl.Database(db_path, pool_size=1, concurrent=concurrent)
+    latencies, errors = [], []
+    targets = iter(locations)
+    step = 0
+    while time.time() < deadline:
+        moves = [(pallets[(step + i) % len(pallets)], next(targets, None)) for i in range(batch)]
+        if moves[-1][1] is None:
+            break
+        step += batch
+        start = time.perf_counter()
+        try:
+            if batch == 1:
+                db.move_pallet(*moves[0])
+            else:
+                db.move_pallets(moves)
+        except Exception as error:
+            errors.append(repr(error))
+        latencies.append(time.perf_counter() - start)
+        # Scanners move pallets at a human pace
+        time.sleep(0.002)
+    db.close()
+    queue.put(("writer", latencies, errors))
+
+def reader(db_path: str, concurrent: bool, codes: list[str], locations: list[int], deadline: float, queue):
+    """
+    Searches, prints and checks locations until the deadline.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        concurrent (bool): Whether to use the concurrency mode of Database.
+        codes (list[str]): Location codes to search for.
+        locations (list[int]): Locations to check.
+        deadline (float): The time.time() at which to stop.
+        queue (multiprocessing.Queue): Receives ("reader", latencies, errors).
+    """
+    db = vl.Database(db_path, pool_size=1, concurrent=concurrent)
+    rng = random.Random(os.getpid())
+    operations = (
+        lambda: db.search_and_print("LAVAPAIKAT", rng.choice(codes)),
+        lambda: db.print_table("LAVATIEDOT"),
+        lambda: db.location_is_free(rng.choice(locations)),
+    )
+    latencies, errors = [], []
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                rng.choice(operations)()
+            except Exception as error:
+                errors.append(repr(error))
+            latencies.append(time.perf_counter() - start)
+            output.seek(0)
+            output.truncate()
+    db.close()
+    queue.put(("reader", latencies, errors))
+
+def run(db_path: str, writers: int=4, readers: int=4, duration: float=5.0, concurrent: bool=True,
+        batch: int=1) -> dict:
+    """
+    Runs writer and reader processes against a database populated by create_db.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        writers (int, optional): The number of writer processes. Defaults to 4.
+        readers (int, optional): The number of reader processes. Defaults to 4.
+        duration (float, optional): Seconds to run. Defaults to 5.0.
+        concurrent (bool, optional): Whether to use the concurrency mode of Database. Defaults to True.
+        batch (int, optional): Pallets per write, 1 for move_pallet(). Defaults to 1.
+
+    Returns:
+        dict: For "writer" and "reader": the number of operations, the errors, and p50/p95/p99/max
+              latencies in seconds.
+    """
+    db = vl.Database(db_path, concurrent=concurrent)
+    pallets = [row[0] for row in db._query("SELECT Lavanumero FROM LAVA;")]
+    free = [row[0] for row in db._query("SELECT STunniste FROM SIJAINTI WHERE STunniste NOT IN "
+                                        "(SELECT Sijainti FROM LAVA WHERE Sijainti IS NOT NULL);")]
+    codes = [row[0] for row in db._query("SELECT Sijaintikoodi FROM SIJAINTI LIMIT 1000;")]
+    # Each writer gets its own pallets and locations, so writers never conflict over the same rows
+    pallet_share = len(pallets) // max(writers, 1)
+    location_share = len(free) // max(writers, 1)
+    deadline = time.time() + duration + 0.5
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=writer, args=(
+        db_path, concurrent, pallets[i * pallet_share:(i + 1) * pallet_share],
+        free[i * location_share:(i + 1) * location_share], deadline, batch, queue)) for i in range(writers)]
+    processes += [multiprocessing.Process(target=reader, args=(
+        db_path, concurrent, codes, free, deadline, queue)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    results = {"writer": ([], []), "reader": ([], [])}
+    for _ in processes:
+        kind, latencies, errors = queue.get()
+        results[kind][0].extend(latencies)
+        results[kind][1].extend(errors)
+    for process in processes:
+        process.join()
+
+    summary = {}
+    for kind, (latencies, errors) in results.items():
+        latencies.sort()
+        summary[kind] = {
+            "n": len(latencies),
+            "errors": errors,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        }
+    return summary
+
+def shuttles(db_path: str, moves: int, concurrent: bool=True) -> tuple[float, list[str]]:
+    """
+    Two shuttles move a pallet each back and forth between two free locations as fast as they can, through
+    separate connections in threads.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        moves (int): The number of moves of each shuttle.
+        concurrent (bool, optional): Whether to use the concurrency mode of Database. Defaults to True.
+
+    Returns:
+        tuple[float, list[str]]: The seconds the moves took and the errors.
+    """
+    db = vl.Database(db_path)
+    pallets = [row[0] for row in db._query("SELECT Lavanumero FROM LAVA ORDER BY Lavanumero LIMIT 2;")]
+    free = [row[0] for row in db._query("SELECT Sijainti FROM PAIKKAVARAUS WHERE Lavanumero IS NULL LIMIT 4;")]
+    db.close()
+    errors = []
+    def shuttle(pallet, locations):
+        db = vl.Database(db_path, pool_size=1, concurrent=concurrent)
+        try:
+            for i in range(moves):
+                db.move_pallet(pallet, locations[i % 2])
+        except Exception as error:
+            errors.append(repr(error))
+        finally:
+            db.close()
+    threads = [threading.Thread(target=shuttle, args=(pallets[0], free[:2])),
+               threading.Thread(target=shuttle, args=(pallets[1], free[2:]))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run.")
+    parser.add_argument("--batch", type=int, default=1, help="Pallets per write, 1 for move_pallet().")
+    parser.add_argument("--locations", type=int, default=50000)
+    parser.add_argument("--pallets", type=int, default=20000)
+    parser.add_argument("--no-wal", action="store_true", help="Use the default rollback journal instead.")
+    parser.add_argument("--shuttle-moves", type=int, default=1500, help="Moves of each shuttle, 0 to skip.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "stress.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--batches", str(args.pallets), "--movements", str(args.pallets), "--seed", "1"])
+        summary = run(db_path, args.writers, args.readers, args.duration, not args.no_wal, args.batch)
+        if args.shuttle_moves > 0:
+            elapsed, shuttle_errors = shuttles(db_path, args.shuttle_moves, not args.no_wal)
+
+    print("Tila: {}".format("rollback-journal" if args.no_wal else "WAL"))
+    for kind, result in summary.items():
+        print("{:7s} {:7d} op  virheitä {:4d}  p50 {:7.1f} ms  p95 {:7.1f} ms  p99 {:7.1f} ms  max {:7.1f} ms".format(
+            kind, result["n"], len(result["errors"]), result["p50"] * 1000, result["p95"] * 1000,
+            result["p99"] * 1000, result["max"] * 1000))
+        for error in sorted(set(result["errors"]))[:5]:
+            print("    " + error)
+    if args.shuttle_moves > 0:
+        print("Sukkulat: {} siirtoa {:.2f} s ({:.0f} siirtoa/s), virheitä {}".format(
+            2 * args.shuttle_moves, elapsed, 2 * args.shuttle_moves / elapsed, len(shuttle_errors)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the memory use of exporting a view with varastovienti against reading it whole with fetchall().
+
+A database is generated and LAVAPAIKAT is written to a CSV file twice: once from fetchall() like the
+printing of tables does, once streamed in batches. The time and the peak of the Python allocations
+(tracemalloc) are reported for both.
+
+Run from the repository root:
+    python -m benchmarks.bench_export [--locations N] [--pallets N] [--batch-size N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import create_db
+import varastokysely
+import varastovienti
+
+def measure(function) -> tuple[float, int]:
+    """
+    Runs a function and measures its time and the peak of its Python allocations.
+
+    Args:
+        function (Callable[[], Any]): The function.
+
+    Returns:
+        tuple[float, int]: The time in seconds and the peak in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=200000)
+    parser.add_argument("--pallets", type=int, default=150000)
+    parser.add_argument("--batch-size", type=int, default=varastovienti.EXPORT_BATCH)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--seed", str(args.seed)])
+        connection = sqlite3.connect(db_path)
+        catalog = varastokysely.SchemaCatalog.load(connection)
+        path = os.path.join(tmp, "lavapaikat.csv")
+
+        def whole():
+            cursor = connection.execute("SELECT * FROM LAVAPAIKAT")
+            columns = [description[0] for description in cursor.description]
+            varastovienti.write_csv(path, columns, [cursor.fetchall()])
+
+        def streamed():
+            varastovienti.export_relations(connection, [("LAVAPAIKAT", path)], args.batch_size, catalog)
+
+        results = {"fetchall": measure(whole), "virta": measure(streamed)}
+        rows = connection.execute("SELECT COUNT(*) FROM LAVAPAIKAT").fetchone()[0]
+        connection.close()
+
+    print("{} riviä".format(rows))
+    for name, (elapsed, peak) in results.items():
+        print("{:10s} {:8.3f} s {:10.0f} riviä/s {:10.1f} MiB".format(name, elapsed, rows / elapsed, peak / 2**20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares importing batches from a CSV file with varastotuonti against adding them with Database.add_entry().
+
+A manifest of generated ERÄ rows is written to a CSV file and imported into an empty database with the full
+schema. add_entry() commits each row, so it is only timed for the first --entries rows.
+
+Run from the repository root:
+    python -m benchmarks.bench_import [--rows N] [--entries N] [--chunk-size N]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+import create_db
+import varastologiikka as vl
+import varastotuonti
+
+def write_manifest(path: str, rows: int, products: int, seed: int):
+    """
+    Writes a CSV file of batches like a supplier manifest, with semicolons and decimal commas.
+
+    Args:
+        path (str): The path to the file.
+        rows (int): The number of batches.
+        products (int): The number of products the batches are of.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        None
+    """
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(("Eränumero", "Tuotenumero", "PE_pvm", "Myyntierät", "ME_yksikkö", "Määrä", "Määräyks",
+                         "Ltk_määrä"))
+        for batch in range(1, rows + 1):
+            sales_units = rng.randint(50, 500)
+            writer.writerow((batch, rng.randint(1, products), "2026-{:02d}-{:02d}".format(rng.randint(1, 12),
+                                                                                        rng.randint(1, 28)),
+                             sales_units, "pkt", "{:.2f}".format(sales_units * 0.83).replace(".", ","), "kg",
+                             "{:.2f}".format(sales_units / 6).replace(".", ",")))
+
+def build_db(db_path: str) -> vl.Database:
+    """
+    Creates a database with the full schema and the generated products.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+
+    Returns:
+        vl.Database: The database.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_db(["-o", db_path, "--warehouses", "1", "--locations", "1", "--pallets", "0",
+                             "--batches", "0", "--movements", "0"])
+    return vl.Database(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000, help="Batches in the manifest.")
+    parser.add_argument("--entries", type=int, default=2000, help="Batches added with add_entry().")
+    parser.add_argument("--chunk-size", type=int, default=varastotuonti.CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = os.path.join(tmp, "erät.csv")
+        write_manifest(manifest, args.rows, len(create_db.PRODUCTS), args.seed)
+
+        db = build_db(os.path.join(tmp, "entries.db"))
+        header, rows = varastotuonti.read_csv(manifest)
+        entries = [row for _, (_, row) in zip(range(args.entries), rows)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row in entries:
+                db.add_entry("ERÄ", row)
+        entry_time = time.perf_counter() - start
+        db.close()
+
+        db = build_db(os.path.join(tmp, "import.db"))
+        start = time.perf_counter()
+        result, = db.import_files([("ERÄ", manifest)], args.chunk_size)
+        import_time = time.perf_counter() - start
+        db.close()
+    assert not result.rejected
+
+    entry_rate = len(entries) / entry_time
+    import_rate = result.imported / import_time
+    print("add_entry():     {:8d} riviä {:8.3f} s ({:10.0f} riviä/s)".format(len(entries), entry_time, entry_rate))
+    print("import_files():  {:8d} riviä {:8.3f} s ({:10.0f} riviä/s)".format(result.imported, import_time,
+                                                                             import_rate))
+    print("Nopeutus: {:.1f}x".format(import_rate / entry_rate))
+
+if __name__ == "__main__":
+    main()
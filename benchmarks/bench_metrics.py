@@ -0,0 +1,65 @@
+"""
+Measures the overhead of collecting statement metrics with varastomittaus.Metrics.
+
+A database is generated and the same mix of point lookups, table reads and pallet moves is run with and
+without metrics, alternating between the two so that both see the same cache state. The best time of each
+and the overhead of the metrics are reported, and the slowest statements are listed.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics [--locations N] [--pallets N] [--operations N] [--rounds N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import create_db
+import varastologiikka as vl
+import varastomittaus as vm
+
+def run(db_path: str, operations: list[tuple[int, int]], metrics: vm.Metrics|None) -> float:
+    with vl.Database(db_path, pool_size=1, metrics=metrics) as db:
+        start = time.perf_counter()
+        for pallet, location in operations:
+            db.location_is_free(location)
+            db.get_table("LAVA", compare_attrs=("Lavanumero",), compare_to=(pallet,), comparators=("=",))
+            db.move_pallet(pallet, location)
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=50000)
+    parser.add_argument("--pallets", type=int, default=30000)
+    parser.add_argument("--operations", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--seed", str(args.seed)])
+        rng = random.Random(args.seed)
+        operations = [(rng.randint(1, args.pallets), rng.randint(1, args.locations)) for _ in range(args.operations)]
+        metrics = vm.Metrics()
+        plain, measured = [], []
+        for _ in range(args.rounds):
+            plain.append(run(db_path, operations, None))
+            measured.append(run(db_path, operations, metrics))
+
+    calls = args.operations * 3
+    print("Ilman mittareita: {:8.1f} µs/kutsu".format(min(plain) / calls * 1e6))
+    print("Mittareilla:      {:8.1f} µs/kutsu".format(min(measured) / calls * 1e6))
+    print("Lisäkustannus:    {:8.1f} %".format((min(measured) / min(plain) - 1) * 100))
+    statements = metrics.snapshot()["statements"]
+    print("Hitaimmat lauseet:")
+    for statement, stats in sorted(statements.items(), key=lambda item: -item[1]["seconds"])[:5]:
+        print("  {:8.1f} µs x {:6d}  {}".format(stats["seconds"] / stats["count"] * 1e6, stats["count"],
+                                               statement[:80]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares Database.move_pallets() against calling Database.move_pallet() in a loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_move_pallets [--moves N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import varastologiikka as vl
+
+def build_db(db_path: str, moves: int):
+    """
+    Creates a minimal database with enough locations and pallets for the given number of moves.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        moves (int): The number of moves the database must accommodate.
+
+    Returns:
+        vl.Database: The database.
+    """
+    db = vl.Database(db_path)
+    with db._conn as conn:
+        conn.execute("CREATE TABLE SIJAINTI (STunniste INTEGER NOT NULL PRIMARY KEY);")
+        conn.execute("CREATE TABLE LAVA (Sijainti INTEGER, Lavanumero INTEGER NOT NULL PRIMARY KEY);")
+        conn.execute("""
+                     CREATE TABLE SIIRTOTAPAHTUMA
+                         (Siirtoaika VARCHAR(23), Lavanumero INTEGER NOT NULL, Sijainti INTEGER NOT NULL);
+                     """)
+        conn.executemany("INSERT INTO SIJAINTI VALUES (?);", ((i,) for i in range(1, 2 * moves + 1)))
+        conn.executemany("INSERT INTO LAVA(Lavanumero) VALUES (?);", ((i,) for i in range(1, moves + 1)))
+        conn.commit()
+    return db
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--moves", type=int, default=500, help="Number of pallets to move.")
+    args = parser.parse_args()
+    moves = [(pallet, pallet) for pallet in range(1, args.moves + 1)]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_db(os.path.join(tmp, "loop.db"), args.moves)
+        start = time.perf_counter()
+        for pallet, location in moves:
+            db.move_pallet(pallet, location)
+        loop_time = time.perf_counter() - start
+        
+        db = build_db(os.path.join(tmp, "batch.db"), args.moves)
+        start = time.perf_counter()
+        results = db.move_pallets(moves)
+        batch_time = time.perf_counter() - start
+    assert all(result.moved for result in results)
+    
+    print("{} siirtoa".format(args.moves))
+    print("move_pallet() silmukassa: {:8.3f} s ({:10.0f} siirtoa/s)".format(loop_time, args.moves / loop_time))
+    print("move_pallets():           {:8.3f} s ({:10.0f} siirtoa/s)".format(batch_time, args.moves / batch_time))
+    print("Nopeutus: {:.1f}x".format(loop_time / batch_time))
+
+if __name__ == "__main__":
+    main()
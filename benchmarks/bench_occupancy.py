@@ -0,0 +1,86 @@
+"""
+Compares occupancy aggregates from varastoanalytiikka.OccupancySnapshot against the same aggregates in SQL.
+
+A database is generated and the fill rate per warehouse, aisle and floor and the empty sections are computed
+repeatedly, once with GROUP BY queries on SIJAINTI and LAVA, once from the NumPy arrays of the snapshot. The
+time to load the snapshot, to refresh it after a batch of movements and the mean time per aggregate are
+reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_occupancy [--locations N] [--pallets N] [--rounds N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import create_db
+import varastoanalytiikka as va
+import varastologiikka as vl
+
+FILL_RATES = """
+             SELECT S.Varasto, IFNULL(S.Hyllyväli, -1), IFNULL(S.Kerros, -1), COUNT(*), COUNT(P.Sijainti)
+             FROM SIJAINTI S LEFT OUTER JOIN (SELECT DISTINCT Sijainti FROM LAVA) P ON P.Sijainti = S.STunniste
+             GROUP BY 1, 2, 3;
+             """
+EMPTY_SECTIONS = """
+                 SELECT S.Varasto, S.Hyllyväli, S.Sektio
+                 FROM SIJAINTI S LEFT OUTER JOIN LAVA L ON L.Sijainti = S.STunniste
+                 WHERE S.Hyllyväli IS NOT NULL
+                 GROUP BY 1, 2, 3 HAVING COUNT(L.Lavanumero) = 0;
+                 """
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--warehouses", type=int, default=10)
+    parser.add_argument("--locations", type=int, default=1000000)
+    parser.add_argument("--pallets", type=int, default=800000)
+    parser.add_argument("--moves", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--warehouses", str(args.warehouses),
+                                 "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--seed", str(args.seed)])
+        connection = sqlite3.connect(db_path)
+
+        start = time.perf_counter()
+        snapshot = va.OccupancySnapshot.load(connection)
+        load_time = time.perf_counter() - start
+
+        rng = random.Random(args.seed)
+        db = vl.Database(db_path)
+        db.move_pallets([(rng.randint(1, args.pallets), rng.randint(1, args.locations)) for _ in range(args.moves)],
+                        check_occupancy=False)
+        start = time.perf_counter()
+        snapshot.refresh(connection)
+        refresh_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            connection.execute(FILL_RATES).fetchall()
+            connection.execute(EMPTY_SECTIONS).fetchall()
+        sql_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            snapshot.occupancy(("warehouse", "aisle", "floor"))
+            snapshot.empty()
+        snapshot_time = time.perf_counter() - start
+        connection.close()
+
+    print("Lataus:           {:8.3f} s".format(load_time))
+    print("Päivitys:         {:8.1f} ms / {} siirtoa".format(refresh_time * 1e3, args.moves))
+    print("SQL:              {:8.1f} ms/kierros".format(sql_time / args.rounds * 1e3))
+    print("NumPy:            {:8.1f} ms/kierros".format(snapshot_time / args.rounds * 1e3))
+
+if __name__ == "__main__":
+    main()
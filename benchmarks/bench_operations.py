@@ -0,0 +1,223 @@
+"""
+Times the main Database operations and a full scan of every view on a generated dataset.
+
+The dataset is built with create_db using the given size options, or an existing database is copied with
+--db. Every operation is run repeatedly and its p50/p95/p99 latency and throughput are reported. The results
+can be written as JSON with --output and compared against an earlier run with --compare.
+
+Run from the repository root:
+    python -m benchmarks.bench_operations [--pallets N ...] [--output results.json] [--compare old.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+import create_db
+import varastologiikka as vl
+import varastoskeema
+
+# Dataset options passed on to create_db
+DATASET_OPTIONS = ("warehouses", "locations", "pallets", "batches", "movements", "seed")
+
+def percentile(samples: list[float], percent: float) -> float:
+    """
+    Returns a percentile of the samples using the nearest-rank method.
+
+    Args:
+        samples (list[float]): The samples, sorted in ascending order.
+        percent (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The sample at the percentile.
+    """
+    rank = max(1, -(-len(samples) * percent // 100))
+    return samples[int(rank) - 1]
+
+def measure(operation, iterations: int, counts_rows: bool=False) -> dict:
+    """
+    Runs an operation repeatedly with its output suppressed and summarizes the latencies.
+
+    Args:
+        operation (Callable[[int], int|None]): The operation, called with the iteration number.
+        iterations (int): The number of runs.
+        counts_rows (bool, optional): Whether the operation returns the number of rows it read.
+                                      Defaults to False.
+
+    Returns:
+        dict: The number of runs, latency percentiles and the mean in milliseconds, operations per second
+              and rows per second if the operation returned row counts.
+    """
+    samples = []
+    rows = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(iterations):
+            start = time.perf_counter()
+            count = operation(i)
+            samples.append(time.perf_counter() - start)
+            if counts_rows:
+                rows += count
+    total = sum(samples)
+    samples.sort()
+    result = {
+        "n": iterations,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": total / iterations * 1000,
+        "ops_per_s": iterations / total,
+    }
+    if counts_rows:
+        result["rows_per_s"] = rows / total
+    return result
+
+def operations(db: vl.Database, rng: random.Random, iterations: int, scan_iterations: int) -> dict:
+    """
+    Builds the benchmarked operations. The write operations are planned so that they always succeed:
+    pallets are moved to free locations only and every added product is deleted again.
+
+    Args:
+        db (vl.Database): The database.
+        rng (random.Random): The random number generator.
+        iterations (int): The number of runs of each single-row operation.
+        scan_iterations (int): The number of runs of each full scan.
+
+    Returns:
+        dict: Operation names mapped to (operation, number of runs, whether the operation returns a row count).
+    """
+    locations = [row[0] for row in db._query("SELECT STunniste FROM SIJAINTI;")]
+    pallets = [row[0] for row in db._query("SELECT Lavanumero FROM LAVA;")]
+    occupied = {row[0] for row in db._query("SELECT Sijainti FROM LAVA WHERE Sijainti IS NOT NULL;")}
+    free = [location for location in locations if location not in occupied]
+    codes = db._query("SELECT Sijaintikoodi FROM SIJAINTI ORDER BY random() LIMIT ?;", (iterations,))
+    next_product = db._query("SELECT IFNULL(MAX(Tuotenumero), 0) + 1 FROM TUOTE;")[0][0]
+
+    # Distinct pallets and free target locations, so that every move changes a location
+    moved = rng.sample(pallets, min(iterations, len(pallets)))
+    targets = rng.sample(free, min(len(moved), len(free)))
+    moves = list(zip(moved, targets))
+    products = [(next_product + i, "Testituote {}".format(i), "Testaaja", "Muut", 4) for i in range(iterations)]
+
+    ops = {
+        "search_and_print TUOTETIEDOT": (lambda i: db.search_and_print("TUOTETIEDOT", "jäätelö", limit=100),
+                                         iterations, False),
+        "search_and_print LAVAPAIKAT": (lambda i: db.search_and_print("LAVAPAIKAT", codes[i % len(codes)][0]),
+                                        iterations, False),
+        "search_and_print LAVAPAIKAT LIKE": (lambda i: db.search_and_print("LAVAPAIKAT", "RU1", use_index=False),
+                                             scan_iterations, False),
+        "get_table LAVA": (lambda i: db.get_table("LAVA", "*", ("Lavanumero", "Lavanumero"),
+                                                  (rng.choice(pallets),) * 2, ("=", "="), ("AND",)),
+                           iterations, False),
+        "location_is_free": (lambda i: db.location_is_free(rng.choice(locations)), iterations, False),
+        "move_pallet": (lambda i: db.move_pallet(*moves[i]), len(moves), False),
+        "add_entry TUOTE": (lambda i: db.add_entry("TUOTE", products[i]), iterations, False),
+        "delete_entry TUOTE": (lambda i: db.delete_entry("TUOTE", "Tuotenumero", str(products[i][0])),
+                               iterations, False),
+    }
+    for view in varastoskeema.VIEWS:
+        ops["scan " + view] = (lambda i, view=view: len(db._query("SELECT * FROM {};".format(view))),
+                               scan_iterations, True)
+    return ops
+
+def git_commit() -> str|None:
+    """
+    Returns the current git commit of the working directory, if any.
+
+    Returns:
+        str|None: The commit hash, or None outside a git repository.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def print_results(results: dict, baseline: dict|None=None):
+    """
+    Prints the results as a table, with the change in p50 latency when a baseline is given.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict|None, optional): The results of an earlier run. Defaults to None.
+
+    Returns:
+        None
+    """
+    print("{:36s} {:>6s} {:>10s} {:>10s} {:>10s} {:>10s}".format(
+        "Operaatio", "n", "p50 ms", "p95 ms", "p99 ms", "op/s") + ("   muutos p50" if baseline else ""))
+    for name, result in results.items():
+        line = "{:36s} {:6d} {:10.3f} {:10.3f} {:10.3f} {:10.1f}".format(
+            name, result["n"], result["p50_ms"], result["p95_ms"], result["p99_ms"], result["ops_per_s"])
+        if baseline and name in baseline:
+            line += "   {:+10.1f} %".format((result["p50_ms"] / baseline[name]["p50_ms"] - 1) * 100)
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--warehouses", type=int, default=4)
+    parser.add_argument("--locations", type=int, default=20000)
+    parser.add_argument("--pallets", type=int, default=15000)
+    parser.add_argument("--batches", type=int, default=30000)
+    parser.add_argument("--movements", type=int, default=60000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default=None, help="Benchmark a copy of an existing database instead.")
+    parser.add_argument("--iterations", type=int, default=200, help="Runs of each single-row operation.")
+    parser.add_argument("--scan-iterations", type=int, default=5, help="Runs of each full scan.")
+    parser.add_argument("--cache-bytes", type=int, default=0, help="Enable the query result cache with this bound.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", default=None, help="Compare against the results in this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        if args.db:
+            shutil.copyfile(args.db, db_path)
+            dataset = {"db": args.db}
+        else:
+            dataset = {name: getattr(args, name) for name in DATASET_OPTIONS}
+            create_args = ["-o", db_path]
+            for name, value in dataset.items():
+                create_args += ["--" + name, str(value)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_db.create_db(create_args)
+
+        db = vl.Database(db_path, pool_size=1, cache_bytes=args.cache_bytes)
+        rng = random.Random(args.seed)
+        results = {}
+        ops = operations(db, rng, args.iterations, args.scan_iterations)
+        for name, (operation, iterations, counts_rows) in ops.items():
+            if iterations > 0:
+                results[name] = measure(operation, iterations, counts_rows)
+        db.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "dataset": dataset,
+            "cache_bytes": args.cache_bytes,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print("Tulokset tallennettu tiedostoon {}.".format(args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares putaway recommendations from varastosijoitus.PutawayIndex against ranking the free locations in SQL.
+
+A database is generated and the five cheapest free locations of a warehouse are looked up repeatedly,
+once with a query that computes the cost of every free location and sorts them, once from the index.
+The time to build the index and the mean time per recommendation are reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_putaway [--locations N] [--pallets N] [--lookups N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import create_db
+import varastosijoitus as vs
+
+RANKING = """
+          SELECT S.STunniste,
+                 CASE WHEN S.Hyllyväli IS NULL THEN {floor}
+                      ELSE {aisle} * ABS(S.Hyllyväli - {dock}) + {level} * (S.Kerros - 1)
+                           + {section} * (S.Sektio - 1) END AS Hinta
+          FROM SIJAINTI S JOIN PAIKKAVARAUS P ON P.Sijainti = S.STunniste
+          WHERE P.Lavanumero IS NULL AND S.Varasto = ?
+          ORDER BY Hinta, S.STunniste LIMIT 5
+          """.format(floor=vs.FLOOR_UNIT_COST, aisle=vs.AISLE_WEIGHT, dock=vs.DOCK_AISLE,
+                     level=vs.LEVEL_WEIGHT, section=vs.SECTION_WEIGHT)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=120000)
+    parser.add_argument("--pallets", type=int, default=80000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--seed", str(args.seed)])
+        connection = sqlite3.connect(db_path)
+        warehouses = [row[0] for row in connection.execute("SELECT DISTINCT Varasto FROM SIJAINTI;")]
+        rng = random.Random(args.seed)
+        lookups = [rng.choice(warehouses) for _ in range(args.lookups)]
+
+        start = time.perf_counter()
+        putaway = vs.PutawayIndex.load(connection)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for warehouse in lookups:
+            connection.execute(RANKING, (warehouse,)).fetchall()
+        sql_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for warehouse in lookups:
+            putaway.recommend(warehouse)
+        index_time = time.perf_counter() - start
+        connection.close()
+
+    print("Indeksin rakennus: {:.3f} s".format(load_time))
+    print("SQL:      {:10.1f} µs/suositus".format(sql_time / args.lookups * 1e6))
+    print("Indeksi:  {:10.1f} µs/suositus".format(index_time / args.lookups * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures the cold-start import time of the library and the user interface.
+
+Every sample imports the module in a fresh interpreter with `python -X importtime`, so nothing is cached
+between runs. The slowest direct imports of the last run are listed as well.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--runs N] [--top N]
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+MODULES = ("varastologiikka", "varastoUI", "create_db")
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def import_times(module: str) -> tuple[int, dict[str, int]]:
+    """
+    Imports a module in a fresh interpreter and collects its import time.
+
+    Args:
+        module (str): The name of the module to import.
+
+    Returns:
+        tuple[int, dict[str, int]]: The cumulative import time of the module in microseconds and the
+                                    cumulative times of the packages it imports directly.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, check=True)
+    children = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3)) // 2
+        # Imports are listed after the packages they import, so the children of a top-level
+        # import are collected until the import itself is reached
+        if depth == 0:
+            if match.group(4) == module:
+                return int(match.group(2)), children
+            children = {}
+        elif depth == 1:
+            children[match.group(4)] = int(match.group(2))
+    raise RuntimeError("Moduulin {} latausaikaa ei löytynyt.".format(module))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Number of samples per module.")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest imports to list.")
+    args = parser.parse_args()
+    
+    for module in MODULES:
+        samples = [import_times(module) for _ in range(args.runs)]
+        totals = [total / 1000 for total, _ in samples]
+        print("{}: mediaani {:.1f} ms, min {:.1f} ms ({} ajoa)".format(
+            module, statistics.median(totals), min(totals), args.runs))
+        slowest = sorted(samples[-1][1].items(), key=lambda item: item[1], reverse=True)
+        for name, micros in slowest[:args.top]:
+            print("    {:30s} {:8.1f} ms".format(name, micros / 1000))
+
+if __name__ == "__main__":
+    main()
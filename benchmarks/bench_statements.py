@@ -0,0 +1,153 @@
+"""
+Compares the statement texts of the old string-formatted SQL with the statements built by QueryBuilder.
+
+The same workload of location and pallet lookups and product additions and deletions is replayed twice on a generated
+dataset: once with the values formatted into the statement texts like Database used to do, once with the
+statements of varastokysely and bound values. For both the number of distinct statement texts, the hit rate
+of an LRU statement cache of the size sqlite3 uses by default (128) and the time are reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_statements [--iterations N] [--cache-size N]
+"""
+import argparse
+import collections
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import create_db
+import varastokysely
+
+def formatted_workload(rng: random.Random, codes: list[str], pallets: list[int], iterations: int,
+                       first_product: int) -> list[tuple[str, tuple]]:
+    """
+    Builds the workload with the values formatted into the statements, as Database did before QueryBuilder.
+
+    Args:
+        rng (random.Random): The random number generator.
+        codes (list[str]): Location codes to look up.
+        pallets (list[int]): Pallets to look up.
+        iterations (int): The number of rounds.
+        first_product (int): The first unused product number.
+
+    Returns:
+        list[tuple[str, tuple]]: The statements and their parameters.
+    """
+    workload = []
+    for i in range(iterations):
+        workload.append(("SELECT * FROM LAVAPAIKAT WHERE Sijainti = '{}'".format(rng.choice(codes)), ()))
+        pallet = rng.choice(pallets)
+        workload.append(("SELECT * FROM LAVA WHERE Lavanumero = {}".format(pallet), ()))
+        product = first_product + i
+        workload.append(("INSERT INTO TUOTE VALUES ({}, 'Testituote {}', 'Testaaja', 'Muut', 4)".format(
+            product, i), ()))
+        workload.append(("DELETE FROM TUOTE WHERE Tuotenumero = {}".format(product), ()))
+    return workload
+
+def bound_workload(builder: varastokysely.QueryBuilder, rng: random.Random, codes: list[str],
+                   pallets: list[int], iterations: int, first_product: int) -> list[tuple[str, tuple]]:
+    """
+    Builds the same workload with the statements of QueryBuilder and bound values.
+
+    Args:
+        builder (varastokysely.QueryBuilder): The query builder.
+        rng (random.Random): The random number generator.
+        codes (list[str]): Location codes to look up.
+        pallets (list[int]): Pallets to look up.
+        iterations (int): The number of rounds.
+        first_product (int): The first unused product number.
+
+    Returns:
+        list[tuple[str, tuple]]: The statements and their parameters.
+    """
+    location = builder.select("LAVAPAIKAT", "*", builder.where("LAVAPAIKAT", ("Sijainti",), ("=",)))
+    lookup = builder.select("LAVA", "*", builder.where("LAVA", ("Lavanumero",), ("=",)))
+    insert = builder.insert("TUOTE", 5)
+    delete = builder.delete("TUOTE", "Tuotenumero")
+    workload = []
+    for i in range(iterations):
+        workload.append((location, (rng.choice(codes),)))
+        workload.append((lookup, (rng.choice(pallets),)))
+        product = first_product + i
+        workload.append((insert, (product, "Testituote {}".format(i), "Testaaja", "Muut", 4)))
+        workload.append((delete, (product,)))
+    return workload
+
+def replay(db_path: str, workload: list[tuple[str, tuple]], cache_size: int) -> dict:
+    """
+    Runs a workload and simulates an LRU statement cache over its statement texts.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        workload (list[tuple[str, tuple]]): The statements and their parameters.
+        cache_size (int): The size of the statement cache.
+
+    Returns:
+        dict: The number of statements and distinct texts, the cache hit rate and the time in seconds.
+    """
+    cache = collections.OrderedDict()
+    hits = 0
+    for query, _ in workload:
+        if query in cache:
+            cache.move_to_end(query)
+            hits += 1
+        else:
+            cache[query] = None
+            if len(cache) > cache_size:
+                cache.popitem(last=False)
+
+    connection = sqlite3.connect(db_path, cached_statements=cache_size)
+    start = time.perf_counter()
+    for query, params in workload:
+        connection.execute(query, params).fetchall()
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return {
+        "n": len(workload),
+        "distinct": len({query for query, _ in workload}),
+        "hit_rate": hits / len(workload),
+        "seconds": elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000, help="Rounds of the workload.")
+    parser.add_argument("--cache-size", type=int, default=128, help="Size of the statement cache.")
+    parser.add_argument("--locations", type=int, default=20000)
+    parser.add_argument("--pallets", type=int, default=15000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-o", db_path, "--locations", str(args.locations), "--pallets", str(args.pallets),
+                                 "--seed", str(args.seed)])
+        with sqlite3.connect(db_path) as connection:
+            builder = varastokysely.QueryBuilder(varastokysely.SchemaCatalog.load(connection))
+            codes = [row[0] for row in connection.execute("SELECT Sijaintikoodi FROM SIJAINTI;")]
+            pallets = [row[0] for row in connection.execute("SELECT Lavanumero FROM LAVA;")]
+            first_product = connection.execute("SELECT IFNULL(MAX(Tuotenumero), 0) + 1 FROM TUOTE;").fetchone()[0]
+        connection.close()
+
+        results = {
+            "muotoiltu": replay(db_path, formatted_workload(random.Random(args.seed), codes, pallets,
+                                                            args.iterations, first_product), args.cache_size),
+            "sidottu": replay(db_path, bound_workload(builder, random.Random(args.seed), codes, pallets,
+                                                      args.iterations, first_product), args.cache_size),
+        }
+
+    print("{:10s} {:>8s} {:>10s} {:>12s} {:>10s} {:>10s}".format(
+        "Lauseet", "n", "erilaisia", "osumat %", "s", "op/s"))
+    for name, result in results.items():
+        print("{:10s} {:8d} {:10d} {:12.1f} {:10.3f} {:10.0f}".format(
+            name, result["n"], result["distinct"], result["hit_rate"] * 100, result["seconds"],
+            result["n"] / result["seconds"]))
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,291 @@
+import argparse
+import datetime
+import itertools
+import math
 import os
 import random
 import sys
+import time
 import varastologiikka as vl
+import varastoskeema
 
-def create_db():
-    db_name = "varasto.db"
-    populate_db = True
-    args = sys.argv[1:]
-    if len(args) > 0:
-        if "-t" in args or "--test" in args:
-            db_name = "test.db"
-        if "-e" in args or "--empty" in args:
-            populate_db = False
+# Pragmas for the bulk load. Durability is not needed as a failed load is simply run again.
+LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,
+}
+
+# The generated warehouses start with these, further ones get generated addresses
+WAREHOUSES = (
+    (145, "Varastotie 13, 60100 Seinäjoki"),
+    (113, "Rekkaväylä 2, 60100 Seinäjoki"),
+    # Values are fictional
+)
+
+# Nimi, Valmistaja, Tuoteryhmä, Säilytyslt and the batch sizes of each product:
+# Myyntierät, ME_yksikkö, Määrä, Määräyks, Ltk_määrä
+PRODUCTS = (
+    (("Luuton joulukinkku n. 5kg", "Atria", "Lihapakasteet", -18), (60, "kpl", 60 * 5., "kg", 60 / 3)),
+    (("Amppari-juomajää", "Pirkka", "Jäätelöt ja mehujäät", -18), (300, "pkt", 300 * 0.83, "kg", 300 / 6)),
+    (("Cocktail-perunapiirakka", "Myllyn Paras", "Leivät ja leivokset", -18), (200, "pss", 200 * 0.45, "kg", 200 / 4)),
+    (("Pingviini vaniljajäätelö", "Froneri", "Jäätelöt ja mehujäät", -18), (500, "pkt", 500., "l", 500 / 5)),
+)
+
+def parse_args(args: list[str]|None=None) -> argparse.Namespace:
+    """
+    Parses the command line arguments of create_db.
+
+    Args:
+        args (list[str]|None, optional): The arguments, or None to use sys.argv. Defaults to None.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Luo varastotietokannan ja täyttää sen esimerkkitiedoilla.")
+    parser.add_argument("-t", "--test", action="store_true", help="Luo test.db-tietokannan varasto.db:n sijaan.")
+    parser.add_argument("-e", "--empty", action="store_true", help="Luo vain taulut ja näkymät.")
+    parser.add_argument("-u", "--upgrade", action="store_true",
+                        help="Päivittää olemassa olevan tietokannan indeksit ja muut laajennukset.")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Tietokannan polku. Oletuksena varasto.db tai test.db.")
+    parser.add_argument("--warehouses", type=int, default=2, help="Varastojen määrä. Oletus 2.")
+    parser.add_argument("--locations", type=int, default=2580, help="Sijaintien määrä yhteensä. Oletus 2580.")
+    parser.add_argument("--pallets", type=int, default=220, help="Lavojen määrä. Oletus 220.")
+    parser.add_argument("--batches", type=int, default=None,
+                        help="Tuote-erien määrä. Oletuksena 10-30 erää tuotetta kohden.")
+    parser.add_argument("--movements", type=int, default=None,
+                        help="Siirtotapahtumien määrä. Oletuksena 7/8 lavoista siirretään kerran.")
+    parser.add_argument("--seed", type=int, default=None, help="Satunnaislukugeneraattorin siemen.")
+    options = parser.parse_args(sys.argv[1:] if args is None else args)
+    for name in ("warehouses", "locations", "pallets", "batches", "movements"):
+        if getattr(options, name) is not None and getattr(options, name) < 0:
+            parser.error("--{} ei voi olla negatiivinen.".format(name))
+    if options.locations < options.warehouses:
+        parser.error("Jokaiseen varastoon tarvitaan vähintään yksi sijainti.")
+    return options
+
+def generate_warehouses(count: int):
+    """
+    Generates warehouse rows.
+
+    Args:
+        count (int): The number of warehouses.
+
+    Yields:
+        tuple: VTunniste, Osoite
+    """
+    yield from WAREHOUSES[:count]
+    for i in range(len(WAREHOUSES), count):
+        yield (200 + i, "Varastotie {}, 60100 Seinäjoki".format(i + 1))
+
+def generate_locations(warehouses: list[int], count: int):
+    """
+    Generates location rows divided evenly between the warehouses. About one in forty locations of
+    each warehouse is a floor unit and the rest are shelves with 12 sections of 6 levels per aisle.
+
+    Args:
+        warehouses (list[int]): The IDs of the warehouses.
+        count (int): The total number of locations.
+
+    Yields:
+        tuple: Hyllyväli, Sektio, Kerros, Kuormaruutu, Varasto, STunniste
+    """
+    location_id = itertools.count(1)
+    for i, warehouse in enumerate(warehouses):
+        size = count // len(warehouses) + (i < count % len(warehouses))
+        floor_units = size // 40
+        for n in range(size - floor_units):
+            aisle, rest = divmod(n, 72)
+            section, level = divmod(rest, 6)
+            yield (aisle + 1, section + 1, level + 1, None, warehouse, next(location_id))
+        for n in range(floor_units):
+            yield (None, None, None, "RU{:d}".format(n + 1), warehouse, next(location_id))
+
+def generate_batches(rng: random.Random, count: int, products: int):
+    """
+    Generates product batches with best before dates in 2024-2027.
+
+    Args:
+        rng (random.Random): The random number generator.
+        count (int): The number of batches.
+        products (int): The number of products, numbered from 1.
+
+    Yields:
+        tuple: Eränumero, Tuotenumero, PE_pvm, Myyntierät, ME_yksikkö, Määrä, Määräyks, Ltk_määrä
+    """
+    first_day = datetime.date(2024, 1, 1).toordinal()
+    dates = [datetime.date.fromordinal(day).isoformat()
+             for day in range(first_day, datetime.date(2027, 12, 31).toordinal() + 1)]
+    # random() is several times faster than randrange(), which matters at tens of millions of rows
+    random = rng.random
+    for batch in range(1, count + 1):
+        product = int(random() * products)
+        yield (batch, product + 1, dates[int(random() * len(dates))]) + PRODUCTS[product][1]
+
+def spread(count: int, size: int, rng: random.Random):
+    """
+    Maps the numbers 0..count-1 to 1..size in a random looking order without storing a permutation,
+    so that consecutive numbers land far apart and every value is used before any is repeated.
+
+    Args:
+        count (int): The number of values to map.
+        size (int): The size of the target range.
+        rng (random.Random): The random number generator.
+
+    Yields:
+        int: A number in 1..size.
+    """
+    step = rng.randrange(1, size + 1) if size > 1 else 1
+    while math.gcd(step, size) != 1:
+        step += 1
+    offset = rng.randrange(size)
+    for i in range(count):
+        yield (i * step + offset) % size + 1
+
+def generate_movements(rng: random.Random, pallets: int, locations: int, movements: int,
+                       pallet_location: list[int|None]):
+    """
+    Generates pallet movements in time order. The first movements put pallets away to free locations and
+    the rest move already placed pallets to other free locations, so no location ever holds two pallets.
+    Stops early if every location is taken.
+
+    Args:
+        rng (random.Random): The random number generator.
+        pallets (int): The number of pallets, numbered from 1.
+        locations (int): The number of locations, numbered from 1.
+        movements (int): The number of movements.
+        pallet_location (list[int|None]): The location of each pallet indexed by Lavanumero - 1, updated
+                                          as the movements are generated.
+
+    Yields:
+        tuple: Siirtoaika, Lavanumero, Sijainti
+    """
+    free = list(range(1, locations + 1))
+    placed = []
+    put_away = spread(min(pallets, locations, movements), pallets, rng)
+    random = rng.random
+    # One movement per second, ending now. Formatting a datetime per row is slow, so the timestamps are
+    # built from the date and a precomputed time of day.
+    clock = ["{:02d}:{:02d}:{:02d}".format(second // 3600, second // 60 % 60, second % 60)
+             for second in range(86400)]
+    first = datetime.datetime.now() - datetime.timedelta(seconds=movements)
+    day = first.date()
+    second = first.hour * 3600 + first.minute * 60 + first.second
+    date = day.isoformat()
+    for _ in range(movements):
+        pallet = next(put_away, None)
+        if pallet is not None:
+            placed.append(pallet)
+        elif free and placed:
+            pallet = placed[int(random() * len(placed))]
+        else:
+            return
+        # Take a random free location and release the previous one of the pallet
+        i = int(random() * len(free))
+        location = free[i]
+        free[i] = free[-1]
+        free.pop()
+        if pallet_location[pallet - 1] is not None:
+            free.append(pallet_location[pallet - 1])
+        pallet_location[pallet - 1] = location
+        second += 1
+        if second == 86400:
+            second = 0
+            day += datetime.timedelta(days=1)
+            date = day.isoformat()
+        yield (date + " " + clock[second], pallet, location)
+
+def bulk_insert(cur, table: str, rows) -> int:
+    """
+    Inserts rows into a table with a single executemany() call and reports the insert rate.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to use.
+        table (str): The table, optionally followed by a column list.
+        rows (Iterable[tuple]): The rows to insert. May be a generator.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    start = time.perf_counter()
+    cur.executemany("INSERT INTO {} VALUES ({});".format(table, ", ".join("?" * len(first))),
+                    itertools.chain((first,), rows))
+    elapsed = time.perf_counter() - start
+    print("  {:16s} {:>12,d} riviä {:8.2f} s".format(table.split("(")[0], cur.rowcount, elapsed))
+    return cur.rowcount
+
+def populate(connection, options: argparse.Namespace):
+    """
+    Fills an empty database with generated data in a single transaction.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+        options (argparse.Namespace): The parsed arguments of create_db.
+
+    Returns:
+        None
+    """
+    rng = random.Random(options.seed)
+    batches = options.batches
+    if batches is None:
+        batches = sum(rng.randint(10, 30) for _ in PRODUCTS)
+    movements = options.movements
+    if movements is None:
+        movements = int(options.pallets * (7/8))
+    
+    cur = connection.cursor()
+    start = time.perf_counter()
+    rows = 0
+    # VTunniste, Osoite
+    warehouses = list(generate_warehouses(options.warehouses))
+    rows += bulk_insert(cur, "VARASTO", warehouses)
+    # Hyllyväli, Sektio, Kerros, Kuormaruutu, Varasto, STunniste
+    rows += bulk_insert(cur, "SIJAINTI(Hyllyväli, Sektio, Kerros, Kuormaruutu, Varasto, STunniste)",
+                        generate_locations([warehouse for warehouse, _ in warehouses], options.locations))
+    # Tuotenumero, Nimi, Valmistaja, Tuoteryhmä, Säilytyslt
+    rows += bulk_insert(cur, "TUOTE", ((i + 1,) + product for i, (product, _) in enumerate(PRODUCTS)))
+    # Eränumero, Tuotenumero, PE_pvm, Myyntierät, ME_yksikkö, Määrä, Määräyks, Ltk_määrä
+    rows += bulk_insert(cur, "ERÄ", generate_batches(rng, batches, len(PRODUCTS)))
+    # Siirtoaika, Lavanumero, Sijainti
+    pallet_location = [None] * options.pallets
+    rows += bulk_insert(cur, "SIIRTOTAPAHTUMA(Siirtoaika, Lavanumero, Sijainti)",
+                        generate_movements(rng, options.pallets, options.locations, movements, pallet_location))
+    # Tyyppi, Sijainti, Lavanumero. The pallets are added at their final locations.
+    rows += bulk_insert(cur, "LAVA", ((rng.choice(("EUR", "FIN", "TEH")), location, pallet + 1)
+                                      for pallet, location in enumerate(pallet_location)))
+    # Lavanumero, Eränumero
+    if options.pallets > 0:
+        rows += bulk_insert(cur, "ERÄ_LAVALLA", zip(spread(batches, options.pallets, rng), range(1, batches + 1)))
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    print("Lisätty {:,d} riviä {:.2f} sekunnissa ({:,.0f} riviä/s).".format(rows, elapsed, rows / max(elapsed, 1e-9)))
+
+def create_db(args: list[str]|None=None):
+    options = parse_args(args)
+    db_name = options.output or ("test.db" if options.test else "varasto.db")
+    if options.upgrade:
+        # Add missing indexes and other extensions to an existing database
+        if not os.path.exists(db_name):
+            print("Tietokantaa '{}' ei löytynyt.".format(db_name))
+            return
+        vl.Database(db_name).upgrade_schema()
+        print("Tietokanta '{}' päivitetty.".format(db_name))
+        return
     
     print("Luodaan tietokanta '{}'...".format(db_name))
     
-    # Remove previous database when script is run
-    if os.path.exists(db_name):
-        os.remove(db_name)
+    # Remove previous database when script is run, along with the WAL files of the concurrency mode
+    for path in (db_name, db_name + "-wal", db_name + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     
-    db = vl.Database(db_name)
+    db = vl.Database(db_name, pragmas=LOAD_PRAGMAS)
     with db._conn as connection:
         cur = connection.cursor()
     
@@ -38,13 +304,14 @@ def create_db():
                          Kuormaruutu VARCHAR(8) COLLATE NOCASE,
                          Varasto INTEGER,
                          STunniste INTEGER NOT NULL,
+                         {},
                         CONSTRAINT SIJAINTIPA PRIMARY KEY (STunniste),
                         CONSTRAINT HYLLYTA UNIQUE (Hyllyväli, Sektio, Kerros, Varasto),
                         CONSTRAINT RUTA UNIQUE (Kuormaruutu, Varasto),
                         CONSTRAINT SIJVARVA
                         FOREIGN KEY (Varasto) REFERENCES VARASTO(VTunniste)
                                     ON DELETE SET NULL ON UPDATE CASCADE );
-                    """)
+                    """.format(varastoskeema.LOCATION_CODE.strip()))
         cur.execute("""
                     CREATE TABLE LAVA
                         (Tyyppi CHAR(3)
@@ -57,18 +324,7 @@ def create_db():
                         FOREIGN KEY (Sijainti) REFERENCES SIJAINTI(STunniste)
                                     ON DELETE SET NULL ON UPDATE CASCADE );
                     """)
-        cur.execute("""
-                    CREATE TABLE SIIRTOTAPAHTUMA
-                        (Siirtoaika VARCHAR(23) CHECK (Siirtoaika LIKE '____-__-__ __:__:__'),
-                         Lavanumero INTEGER NOT NULL,
-                         Sijainti INTEGER NOT NULL,
-                        PRIMARY KEY (Siirtoaika, Lavanumero, Sijainti),
-                        FOREIGN KEY (Lavanumero) REFERENCES LAVA(Lavanumero)
-                                    ON DELETE CASCADE ON UPDATE CASCADE,
-                        FOREIGN KEY (Sijainti) REFERENCES SIJAINTI(STunniste)
-                                    ON DELETE CASCADE ON UPDATE CASCADE );
-                        -- Siirtoaika has to be a key to allow moving back and forth at different times
-                    """)
+        cur.execute(varastoskeema.MOVEMENTS.format("SIIRTOTAPAHTUMA"))
         cur.execute("""
                     CREATE TABLE TUOTE
                         (Tuotenumero INTEGER NOT NULL,
@@ -106,163 +362,15 @@ def create_db():
                     """)
         connection.commit()
         
-        ### Create views
-        cur.execute("""
-                    CREATE VIEW TUOTETIEDOT AS
-                    SELECT T.*, COUNT(E.Eränumero) AS Erämäärä
-                    FROM TUOTE T LEFT OUTER JOIN ERÄ E ON T.Tuotenumero = E.Tuotenumero
-                    GROUP BY T.Tuotenumero;
-                    """)
-        cur.execute("""
-                    CREATE VIEW TUOTEERÄT AS
-                    SELECT T.Nimi, T.Valmistaja, E.*, T.Tuoteryhmä, T.Säilytyslt, EL.Lavanumero, L.Tyyppi,
-                           SIJAINTI_STR(S.Hyllyväli, S.Sektio, S.Kerros, S.Kuormaruutu) AS Sijainti, S.Varasto
-                    FROM ERÄ E JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
-                    LEFT OUTER JOIN ERÄ_LAVALLA EL ON E.Eränumero = EL.Eränumero
-                    LEFT OUTER JOIN LAVA L ON EL.Lavanumero = L.Lavanumero
-                    LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste;
-                    """)
-        cur.execute("""
-                    CREATE VIEW LAVAPAIKAT AS
-                    SELECT SIJAINTI_STR(S.Hyllyväli, S.Sektio, S.Kerros, S.Kuormaruutu) AS Sijainti,
-                           S.Varasto, L.Lavanumero, L.Tyyppi, T.Nimi, E.PE_pvm, E.Ltk_määrä,
-                           S.STunniste AS Sijainti_ID
-                    FROM SIJAINTI S LEFT OUTER JOIN LAVA L ON S.STunniste = L.Sijainti
-                    LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
-                    LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
-                    LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero;
-                    """)
-        cur.execute("""
-                    CREATE VIEW LAVATIEDOT AS
-                    SELECT L.Lavanumero, L.Tyyppi,
-                           SIJAINTI_STR(S.Hyllyväli, S.Sektio, S.Kerros, S.Kuormaruutu) AS Sijainti,
-                           E.Ltk_määrä, T.Nimi AS Tuotenimi, E.PE_pvm, ST.Siirtoaika
-                    FROM LAVA L LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste
-                    LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
-                    LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
-                    LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
-                    LEFT OUTER JOIN SIIRTOTAPAHTUMA ST ON L.Lavanumero = ST.Lavanumero
-                    GROUP BY L.Lavanumero;
-                    """)
-        cur.execute("""
-                    CREATE VIEW VARASTOTIEDOT AS
-                    SELECT V.VTunniste AS Tunniste, V.Osoite, COUNT(L.Lavanumero) AS Lavat,
-                           COUNT(S.STunniste) AS Lavapaikat
-                    FROM VARASTO V LEFT OUTER JOIN SIJAINTI S ON V.VTunniste = S.Varasto
-                    LEFT OUTER JOIN LAVA L ON S.STunniste = L.Sijainti
-                    GROUP BY V.VTunniste;
-                    """)
-        cur.execute("""
-                    CREATE VIEW LAVASIIRROT AS
-                    SELECT L.Lavanumero, ST.Siirtoaika,
-                           SIJAINTI_STR(S.Hyllyväli, S.Sektio, S.Kerros, S.Kuormaruutu) AS Sijainti,
-                           L.Tyyppi, T.Nimi AS Tuotenimi, E.PE_pvm
-                    FROM LAVA L LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste
-                    LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
-                    LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
-                    LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
-                    LEFT OUTER JOIN SIIRTOTAPAHTUMA ST ON L.Lavanumero = ST.Lavanumero
-                    GROUP BY L.Lavanumero, ST.Siirtoaika;
-                    """)
+        if not options.empty:
+            populate(connection, options)
         
-        connection.commit()
-        if not populate_db:
-            return
-        
-        ### Add some items to the tables
-        # Add a couple of warehouse entries
-        # VTunniste, Osoite
-        cur.execute("""
-                    INSERT INTO VARASTO VALUES
-                        (145, 'Varastotie 13, 60100 Seinäjoki'),
-                        (113, 'Rekkaväylä 2, 60100 Seinäjoki');
-                    -- Values are fictional
-                    """)
-        
-        # Add some shelves and floor units
-        # Hyllyväli, Sektio, Kerros, Kuormaruutu, Varasto, STunniste
-        hyllyt = []
-        for vali in range(1, 31):
-            for sektio in range(1, 9):
-                for kerros in range(1, 9):
-                    hyllyt.append((vali, sektio, kerros))
-        hyllyt2 = []
-        for vali in range(1, 11):
-            for sektio in range(1, 13):
-                for kerros in range(1, 6):
-                    hyllyt2.append((vali, sektio, kerros))
-        ru_paikat = []
-        for ru in range(1, 41):
-            ru_paikat.append(("RU94{:d}".format(ru),))
-        for ru in range(1, 21):
-            ru_paikat.append(("RU200{:d}".format(ru),))
-        cur.executemany("INSERT INTO SIJAINTI(Hyllyväli, Sektio, Kerros, Varasto) VALUES (?, ?, ?, 145);", hyllyt)
-        cur.executemany("INSERT INTO SIJAINTI(Hyllyväli, Sektio, Kerros, Varasto) VALUES (?, ?, ?, 113);", hyllyt2)
-        cur.executemany("INSERT INTO SIJAINTI(Kuormaruutu, Varasto) VALUES (?, 145);", ru_paikat)
-        
-        # Add some pallets
-        # Tyyppi, Sijainti, Lavanumero
-        for i in range(220):
-            cur.execute("INSERT INTO LAVA(Tyyppi) VALUES (?);", (random.choice(["EUR", "FIN", "TEH"]),))
-        
-        # Add some products
-        # Tuotenumero, Nimi, Valmistaja, Tuoteryhmä, Säilytyslt
-        cur.execute("""
-                    INSERT INTO TUOTE(Nimi, Valmistaja, Tuoteryhmä, Säilytyslt) VALUES
-                        ('Luuton joulukinkku n. 5kg', 'Atria', 'Lihapakasteet', -18),
-                        ('Amppari-juomajää', 'Pirkka', 'Jäätelöt ja mehujäät', -18),
-                        ('Cocktail-perunapiirakka', 'Myllyn Paras', 'Leivät ja leivokset', -18),
-                        ('Pingviini vaniljajäätelö', 'Froneri', 'Jäätelöt ja mehujäät', -18);
-                    """)
-        
-        # Add some product batches
-        # Eränumero, Tuotenumero, PE_pvm, Myyntierät, ME_yksikkö, Määrä, Määräyks, Ltk_määrä
-        tuotteet = cur.execute("SELECT Tuotenumero FROM TUOTE;")
-        tuotteet = tuotteet.fetchall()
-        erat = []
-        ind = 0
-        met = (60, 300, 200, 500)
-        meyks = ("kpl", "pkt", "pss", "pkt")
-        maara = (met[0] * 5., met[1] * 0.83, met[2] * 0.45, met[3])
-        maarayks = ("kg", "kg", "kg", "l")
-        ltk = (met[0] / 3, met[1] / 6, met[2] / 4, met[3] / 5)
-        for ind, tuote in enumerate(tuotteet):
-            eramaara = random.randint(10, 30)
-            for x in range(eramaara):
-                pe = vl.randdate()
-                erat.append(
-                    (random.randint(1, 999999), tuote[0], pe, met[ind],
-                     meyks[ind], maara[ind], maarayks[ind], ltk[ind])
-                    )
-        cur.executemany("""
-                        INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm, Myyntierät,
-                        ME_yksikkö, Määrä, Määräyks, Ltk_määrä)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-                        """, erat)
-        
-        # Bind batches to pallets
-        # Lavanumero, Eränumero
-        lavat = cur.execute("SELECT Lavanumero FROM LAVA;")
-        lavat = lavat.fetchall()
-        erat = cur.execute("SELECT Eränumero FROM ERÄ;")
-        erat = erat.fetchall()
-        siirto_lkm = len(erat)
-        val_lavat = random.sample(lavat, k=siirto_lkm)
-        # val_erat = random.sample(erat, k=siirto_lkm)
-        siirrot = []
-        for i in range(siirto_lkm):
-            siirrot.append((val_lavat[i][0], erat[i][0]))
-        cur.executemany("INSERT INTO ERÄ_LAVALLA(Lavanumero, Eränumero) VALUES (?, ?);", siirrot)
-        
-        sijainnit = cur.execute("SELECT STunniste FROM SIJAINTI;")
-        sijainnit = sijainnit.fetchall()
-        
-        connection.commit()
-    
-    # Move the pallets to random locations
-    paikat = random.sample(sijainnit, k=int(len(lavat) * (7/8)))
-    for i, paikka in enumerate(paikat):
-        db.move_pallet(lavat[i][0], paikka[0])
+        ### Create views, indexes and other schema extensions
+        # Done after the data is loaded, as building an index once is faster than updating it on every insert
+        start = time.perf_counter()
+        varastoskeema.upgrade(connection)
+        if not options.empty:
+            print("Indeksit ja laajennukset luotu {:.2f} sekunnissa.".format(time.perf_counter() - start))
         
     print("Tietokanta '{}' luotu.".format(db_name))
 
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import os
+import sqlite3
+import threading
+import unittest
+
+import create_db
+import varastologiikka as vl
+from benchmarks import bench_concurrency
+
+class TestConcurrency(unittest.TestCase):
+    
+    def setUp(self):
+        self.db_path = "test.db"
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-t", "--locations", "3000", "--pallets", "500", "--movements", "500", "--seed", "1"])
+    
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+    
+    def test_wal_enabled(self):
+        db = vl.Database(self.db_path, concurrent=True)
+        self.assertEqual(db._query("PRAGMA journal_mode;"), [("wal",)])
+    
+    def test_retry_when_locked(self):
+        # Another connection holds the write lock for a moment, and busy_timeout is off to force SQLITE_BUSY
+        blocker = sqlite3.connect(self.db_path, check_same_thread=False)
+        blocker.execute("BEGIN EXCLUSIVE;")
+        timer = threading.Timer(0.2, blocker.commit)
+        timer.start()
+        try:
+            db = vl.Database(self.db_path, pragmas={"busy_timeout": 0}, concurrent=True)
+            db.move_pallet(1, 2999)
+            self.assertEqual(db._query("SELECT Sijainti FROM LAVA WHERE Lavanumero = 1;"), [(2999,)])
+        finally:
+            timer.join()
+            blocker.close()
+    
+    def test_no_retry_by_default(self):
+        blocker = sqlite3.connect(self.db_path)
+        blocker.execute("BEGIN EXCLUSIVE;")
+        try:
+            db = vl.Database(self.db_path, pragmas={"busy_timeout": 0})
+            with self.assertRaises(sqlite3.OperationalError):
+                db.move_pallet(1, 2999)
+        finally:
+            blocker.close()
+    
+    def test_shuttle_moves(self):
+        # Two shuttles move their pallets back and forth as fast as they can through separate connections, see
+        # benchmarks/bench_concurrency.py for the rate
+        moves = 1500
+        _, errors = bench_concurrency.shuttles(self.db_path, moves)
+        self.assertEqual(errors, [])
+        db = vl.Database(self.db_path)
+        rows = db._query("SELECT Siirtoaika FROM SIIRTOTAPAHTUMA WHERE Siirto_ID > 500 ORDER BY Siirto_ID;")
+        self.assertEqual(len(rows), 2 * moves)
+        # Every movement is later than the one recorded before it
+        self.assertEqual(len(set(rows)), len(rows))
+        self.assertTrue(all(earlier < later for (earlier,), (later,) in zip(rows, rows[1:])))
+
+    def test_stress(self):
+        summary = bench_concurrency.run(self.db_path, writers=3, readers=3, duration=1.5)
+        for kind in ("writer", "reader"):
+            self.assertGreater(summary[kind]["n"], 0)
+            self.assertEqual(summary[kind]["errors"], [])
+            self.assertLess(summary[kind]["p99"], 2.0)
+
+if __name__ == "__main__":
+    unittest.main()
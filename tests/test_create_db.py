@@ -1,7 +1,12 @@
+import contextlib
+import io
 import os
+import shutil
 import unittest
 
+import create_db
 import varastologiikka as vl
+import varastoskeema
 
 class TestCreateDB(unittest.TestCase):
     
@@ -83,5 +88,91 @@ class TestCreateDB(unittest.TestCase):
             count = cursor.fetchone()[0]
             self.assertGreater(count, 0)
 
+class TestUpgradeDB(unittest.TestCase):
+    
+    def setUp(self):
+        # Upgrade a copy of the database shipped with the repository
+        shutil.copyfile("varasto.db", "test.db")
+        os.system("python create_db.py -t -u")
+    
+    def tearDown(self):
+        if os.path.exists("test.db"):
+            os.remove("test.db")
+    
+    def test_extensions_added(self):
+        with vl._Connection("test.db") as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master;")
+            names = cursor.fetchall()
+            self.assertIn(("LAVASIJIX",), names)
+            self.assertIn(("SIJKOODITA",), names)
+            self.assertIn(("PAIKKAVARAUS",), names)
+            self.assertIn(("SALDOT_RYHMITTÄIN",), names)
+            self.assertEqual(varastoskeema.check_summaries(conn),
+                             {table: [] for table in varastoskeema.SUMMARIES})
+    
+    def test_data_kept(self):
+        with vl._Connection("varasto.db") as conn:
+            expected = conn.execute("SELECT * FROM LAVAPAIKAT ORDER BY Sijainti_ID;").fetchall()
+        with vl._Connection("test.db") as conn:
+            self.assertEqual(conn.execute("SELECT * FROM LAVAPAIKAT ORDER BY Sijainti_ID;").fetchall(), expected)
+
+    def test_movements_migrated(self):
+        with vl._Connection("varasto.db") as conn:
+            expected = conn.execute("SELECT Siirtoaika, Lavanumero, Sijainti FROM SIIRTOTAPAHTUMA "
+                                    "ORDER BY Siirtoaika, rowid;").fetchall()
+        with vl._Connection("test.db") as conn:
+            self.assertEqual(conn.execute("SELECT Siirtoaika, Lavanumero, Sijainti FROM SIIRTOTAPAHTUMA "
+                                          "ORDER BY Siirto_ID;").fetchall(), expected)
+
+class TestGenerateDB(unittest.TestCase):
+    
+    ARGS = ["-t", "--warehouses", "3", "--locations", "400", "--pallets", "300",
+            "--batches", "500", "--movements", "900", "--seed", "7"]
+    
+    def setUp(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(self.ARGS)
+    
+    def tearDown(self):
+        if os.path.exists("test.db"):
+            os.remove("test.db")
+    
+    def dump(self):
+        with vl._Connection("test.db") as conn:
+            return {table: conn.execute("SELECT * FROM {};".format(table)).fetchall()
+                    for table in ("VARASTO", "SIJAINTI", "LAVA", "ERÄ", "ERÄ_LAVALLA")}
+    
+    def test_row_counts(self):
+        with vl._Connection("test.db") as conn:
+            counts = [conn.execute("SELECT COUNT(*) FROM {};".format(table)).fetchone()[0]
+                      for table in ("VARASTO", "SIJAINTI", "LAVA", "ERÄ", "ERÄ_LAVALLA", "SIIRTOTAPAHTUMA")]
+        self.assertEqual(counts, [3, 400, 300, 500, 500, 900])
+    
+    def test_movements_consistent(self):
+        with vl._Connection("test.db") as conn:
+            # Every pallet is where its latest movement took it and no location holds two pallets
+            latest = conn.execute("""
+                                  SELECT L.Lavanumero FROM LAVA L
+                                  WHERE L.Sijainti IS NOT (SELECT S.Sijainti FROM SIIRTOTAPAHTUMA S
+                                                           WHERE S.Lavanumero = L.Lavanumero
+                                                           ORDER BY S.Siirtoaika DESC LIMIT 1);
+                                  """).fetchall()
+            self.assertEqual(latest, [])
+            shared = conn.execute("""
+                                  SELECT Sijainti FROM LAVA WHERE Sijainti IS NOT NULL
+                                  GROUP BY Sijainti HAVING COUNT(*) > 1;
+                                  """).fetchall()
+            self.assertEqual(shared, [])
+            occupied = conn.execute("SELECT COUNT(*) FROM PAIKKAVARAUS WHERE Lavanumero IS NOT NULL;").fetchone()[0]
+            self.assertEqual(occupied, 300)
+            self.assertEqual(conn.execute("SELECT SUM(Lavat) FROM SIJAINNIT_VARASTOITTAIN;").fetchone()[0], 300)
+    
+    def test_seed_repeatable(self):
+        first = self.dump()
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(self.ARGS)
+        self.assertEqual(self.dump(), first)
+
 if __name__ == "__main__":
     unittest.main()
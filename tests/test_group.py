@@ -1,10 +1,46 @@
 import unittest
-from test_create_db import TestCreateDB
-from test_varastologiikka import TestVarastoLogiikka
+from test_concurrency import TestConcurrency
+from test_create_db import TestCreateDB, TestGenerateDB, TestUpgradeDB
+from test_query_plans import TestQueryPlans
+from test_varastoanalytiikka import TestAnalytics
+from test_varastoarkisto import TestArchive
+from test_varastoasync import TestAsyncDatabase
+from test_varastokysely import TestQueryBuilder, TestSchemaCatalog
+from test_varastologiikka import (TestConnectionPool, TestExpiry, TestFormatTable, TestLastMovement,
+                                 TestLocationCode, TestMovePallets, TestOccupancy, TestPagination, TestQueryCache,
+                                 TestSearch, TestSummaries, TestVarastoLogiikka)
+from test_varastomittaus import TestMetrics
+from test_varastosijoitus import TestPutaway
+from test_varastotuonti import TestImport
+from test_varastovienti import TestExport
 
 class TestGroup(unittest.TestSuite):
     
     def __init__(self):
         super().__init__()
         self.addTest(unittest.makeSuite(TestCreateDB))
+        self.addTest(unittest.makeSuite(TestUpgradeDB))
+        self.addTest(unittest.makeSuite(TestGenerateDB))
         self.addTest(unittest.makeSuite(TestVarastoLogiikka))
+        self.addTest(unittest.makeSuite(TestMovePallets))
+        self.addTest(unittest.makeSuite(TestSearch))
+        self.addTest(unittest.makeSuite(TestLastMovement))
+        self.addTest(unittest.makeSuite(TestLocationCode))
+        self.addTest(unittest.makeSuite(TestOccupancy))
+        self.addTest(unittest.makeSuite(TestExpiry))
+        self.addTest(unittest.makeSuite(TestSummaries))
+        self.addTest(unittest.makeSuite(TestPagination))
+        self.addTest(unittest.makeSuite(TestFormatTable))
+        self.addTest(unittest.makeSuite(TestQueryCache))
+        self.addTest(unittest.makeSuite(TestConnectionPool))
+        self.addTest(unittest.makeSuite(TestQueryPlans))
+        self.addTest(unittest.makeSuite(TestConcurrency))
+        self.addTest(unittest.makeSuite(TestAsyncDatabase))
+        self.addTest(unittest.makeSuite(TestArchive))
+        self.addTest(unittest.makeSuite(TestQueryBuilder))
+        self.addTest(unittest.makeSuite(TestSchemaCatalog))
+        self.addTest(unittest.makeSuite(TestPutaway))
+        self.addTest(unittest.makeSuite(TestImport))
+        self.addTest(unittest.makeSuite(TestExport))
+        self.addTest(unittest.makeSuite(TestMetrics))
+        self.addTest(unittest.makeSuite(TestAnalytics))
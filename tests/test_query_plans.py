@@ -0,0 +1,122 @@
+import os
+import re
+import unittest
+
+import create_db
+import varastologiikka as vl
+import varastoskeema
+
+def table_scans(plan: list[str]) -> list[str]:
+    """
+    Returns the steps of a query plan that scan a whole table or build an automatic index.
+    Scans of the view's own co-routine, of materialized subqueries and of virtual tables
+    (eg. json_each over a parameter list) are not table scans.
+    """
+    subqueries = {step.split(" ", 1)[1] for step in plan if step.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    return [step for step in plan
+            if "AUTOMATIC" in step
+            or (step.startswith("SCAN ") and step.split(" ")[1] not in subqueries and "VIRTUAL TABLE" not in step)]
+
+class TestQueryPlans(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if os.path.exists("test.db"):
+            os.remove("test.db")
+        create_db.create_db(["-t", "-e"])
+        with vl._Connection("test.db") as conn:
+            conn.execute("INSERT INTO VARASTO VALUES (145, 'Varastotie 13');")
+            conn.executemany("INSERT INTO SIJAINTI VALUES (1, 1, ?, NULL, 145, ?);", [(1, 1), (2, 2)])
+            conn.executemany("INSERT INTO LAVA VALUES ('EUR', NULL, ?);", [(1,), (2,)])
+            conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists("test.db"):
+            os.remove("test.db")
+
+    def setUp(self):
+        self.db = vl.Database("test.db", pool_size=1)
+        self.statements = []
+        with self.db._conn as conn:
+            conn.set_trace_callback(self.statements.append)
+
+    def tearDown(self):
+        self.db.close()
+
+    def assertIndexedPlan(self, query: str, allowed_scans: int=0):
+        plan = self.db.query_plan(query)
+        scans = table_scans(plan)
+        self.assertLessEqual(len(scans), allowed_scans, "{}\n{}".format(query.strip(), "\n".join(plan)))
+
+    def assertOperationIndexed(self, operation, *args):
+        self.statements.clear()
+        operation(*args)
+        # Schema lookups and the internal statements of FTS5 tables are not plans of our queries
+        queries = [statement for statement in self.statements
+                   if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"))
+                   and "sqlite_master" not in statement and "'main'." not in statement]
+        self.assertTrue(queries)
+        for query in queries:
+            self.assertIndexedPlan(query)
+
+    def test_views_scan_only_driving_table(self):
+        views = self.db._query("SELECT name FROM sqlite_master WHERE type = 'view';")
+        self.assertTrue(views)
+        for (view,) in views:
+            with self.subTest(view=view):
+                # The outermost table is read in full, every join must be an index seek
+                self.assertIndexedPlan("SELECT * FROM {}".format(view), allowed_scans=1)
+
+    def test_location_is_free(self):
+        self.assertOperationIndexed(self.db.location_is_free, 1)
+
+    def test_free_locations(self):
+        self.assertOperationIndexed(self.db.free_locations, 145)
+
+    def test_location_id(self):
+        self.assertOperationIndexed(self.db.location_id, "1-1-1", 145)
+
+    def test_location_lookup(self):
+        self.assertOperationIndexed(
+            self.db.get_table, "LAVAPAIKAT", "Sijainti_ID", ("Sijainti", "Varasto"), ("1-1-1", 145),
+            ("=", "="), ("AND",)
+            )
+
+    def test_pallet_lookup(self):
+        self.assertOperationIndexed(self.db.get_table, "LAVATIEDOT", "*", ("Lavanumero",), (1,), ("=",))
+        self.assertOperationIndexed(self.db.last_movement, 1)
+        self.assertOperationIndexed(self.db.movement_history, 1)
+
+    def test_search(self):
+        for view in vl._SEARCH_PATHS:
+            with self.subTest(view=view):
+                self.assertOperationIndexed(self.db.search, view, "1")
+
+    def test_search_row_map(self):
+        # The rows of a composite primary key are found from the keys of the table
+        self.assertIndexedPlan("SELECT R.Rivi FROM ERÄ E CROSS JOIN HAKU_ERÄ_RIVIT R "
+                               "ON R.Eränumero = E.Eränumero AND R.Tuotenumero = E.Tuotenumero", allowed_scans=1)
+
+    def test_expiry(self):
+        self.assertOperationIndexed(self.db.pick_fefo, 1, 10)
+        self.assertOperationIndexed(self.db.pick_fefo, 1, 10, 145)
+        self.assertOperationIndexed(self.db.expiring_batches, 30)
+        self.assertOperationIndexed(self.db.expiring_batches, 30, 145, None, True)
+
+    def test_summary_triggers(self):
+        # The share of a changed row is found by seeks from the row
+        for table in varastoskeema.SUMMARY_SOURCES:
+            for statement in varastoskeema._summary_changes(table, "+", "NEW").split(";")[:-1]:
+                query = re.sub(r"NEW\.\w+", "1", statement[statement.index("SELECT"):statement.index("ON CONFLICT")])
+                with self.subTest(table=table, summary=statement.split()[2]):
+                    self.assertIndexedPlan(query)
+
+    def test_move_pallet(self):
+        self.assertOperationIndexed(self.db.move_pallet, 1, 1)
+
+    def test_move_pallets(self):
+        self.assertOperationIndexed(self.db.move_pallets, [(1, 2), (2, 1)])
+
+if __name__ == "__main__":
+    unittest.main()
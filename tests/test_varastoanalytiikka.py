@@ -0,0 +1,94 @@
+import contextlib
+import io
+import math
+import os
+import unittest
+from unittest import mock
+
+import varastoanalytiikka as va
+import varastologiikka as vl
+from test_varastologiikka import create_test_db
+
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        # Warehouse 145 has the shelf locations 1 (1-2-3) and 3 (1-2-4) and the floor unit 2 (RU941).
+        # Pallet 10 is in location 1 and pallet 20 in location 2.
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_occupancy(self):
+        occupancy = self.db.occupancy()
+        self.assertEqual(occupancy.keys.tolist(), [[145]])
+        self.assertEqual((occupancy.slots.tolist(), occupancy.occupied.tolist(), occupancy.pallets.tolist()),
+                         ([3], [2], [2]))
+        occupancy = self.db.occupancy(("aisle", "floor"), warehouse=145)
+        self.assertEqual(occupancy.rows(), [(va.FLOOR_UNIT, va.FLOOR_UNIT, 1, 1, 1, 100.0),
+                                            (1, 3, 1, 1, 1, 100.0), (1, 4, 1, 0, 0, 0.0)])
+        self.assertEqual(self.db.occupancy(warehouse=1).rows(), [])
+        # Groups numbered by sorting give the same result
+        with mock.patch.object(va, "_MIN_DENSE_GROUPS", 0), mock.patch.object(va, "_DENSE_GROUPS_PER_LOCATION", 0):
+            with vl._Connection(self.db_path) as conn:
+                snapshot = va.OccupancySnapshot.load(conn)
+            self.assertEqual(snapshot.occupancy(("aisle", "floor"), warehouse=145).rows(), occupancy.rows())
+        with self.assertRaises(ValueError):
+            self.db.occupancy(("hylly",))
+
+    def test_heatmap_and_empty(self):
+        snapshot = self.db.occupancy_snapshot()
+        heatmap = snapshot.heatmap(145)
+        self.assertEqual((heatmap.rows.tolist(), heatmap.columns.tolist()), ([-1, 1], [-1, 3, 4]))
+        self.assertEqual([[None if math.isnan(value) else value for value in row] for row in heatmap.fill_rate],
+                         [[1.0, None, None], [None, 1.0, 0.0]])
+        self.assertEqual(snapshot.empty().tolist(), [])
+        self.assertEqual(snapshot.empty(("warehouse", "aisle", "section", "floor")).tolist(), [[145, 1, 2, 4]])
+        mix = snapshot.pallet_mix()
+        self.assertEqual((mix.warehouses.tolist(), mix.counts.tolist()), ([145], [[2, 0, 0]]))
+
+    def test_refresh_from_movements(self):
+        snapshot = self.db.occupancy_snapshot()
+        self.db.move_pallet(10, 3)
+        self.db.move_pallet(20, 1)
+        self.db.move_pallet(20, 3)
+        self.assertIs(self.db.occupancy_snapshot(), snapshot)
+        self.assertEqual(snapshot.pallets_at.tolist(), [0, 0, 2])
+        self.assertEqual(snapshot.empty(("aisle", "floor")).tolist(), [[-1, -1], [1, 3]])
+
+    def test_reload_on_unknown_pallet(self):
+        snapshot = self.db.occupancy_snapshot()
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("INSERT INTO LAVA VALUES ('FIN', 3, 30);")
+            conn.execute("INSERT INTO SIIRTOTAPAHTUMA (Siirtoaika, Lavanumero, Sijainti) "
+                         "VALUES ('2026-10-18 12:00:00', 30, 3);")
+            conn.commit()
+            self.assertEqual(snapshot.refresh(conn), 1)
+        self.assertEqual(snapshot.pallet_mix().counts.tolist(), [[2, 1, 0]])
+        self.assertEqual(self.db.occupancy_snapshot().occupancy().occupied.tolist(), [3])
+
+    def test_reload_on_changed_tables(self):
+        snapshot = self.db.occupancy_snapshot()
+        # Changed through another Database, as by the writer of AsyncDatabase
+        with vl.Database(self.db_path, pool_size=1) as writer, contextlib.redirect_stdout(io.StringIO()):
+            writer.delete_entry("SIJAINTI", "STunniste", "3")
+            writer.delete_entry("LAVA", "Lavanumero", "20")
+        self.assertIsNot(self.db.occupancy_snapshot(), snapshot)
+        occupancy = self.db.occupancy()
+        self.assertEqual((occupancy.slots.tolist(), occupancy.occupied.tolist(), occupancy.pallets.tolist()),
+                         ([2], [1], [1]))
+
+    def test_matches_view(self):
+        self.db.move_pallet(20, 3)
+        rows = self.db._query("""
+            SELECT Varasto, COUNT(*), COUNT(Lavanumero) FROM (SELECT DISTINCT Varasto, Sijainti_ID, Lavanumero
+                                                              FROM LAVAPAIKAT)
+            GROUP BY Varasto;
+            """)
+        occupancy = self.db.occupancy()
+        self.assertEqual([tuple(row) for row in rows],
+                         list(zip(occupancy.keys[:, 0].tolist(), occupancy.slots.tolist(), occupancy.pallets.tolist())))
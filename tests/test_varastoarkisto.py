@@ -0,0 +1,78 @@
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import unittest
+
+import varastoarkisto
+import varastologiikka as vl
+from test_varastologiikka import create_test_db
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        self.archive_path = varastoarkisto.archive_path(self.db_path)
+        if os.path.exists(self.archive_path):
+            os.remove(self.archive_path)
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+        self.recent = (datetime.datetime.now() - datetime.timedelta(days=1)).isoformat(" ", "seconds")
+        with self.db._conn as conn:
+            conn.executemany("INSERT INTO SIIRTOTAPAHTUMA (Siirtoaika, Lavanumero, Sijainti) VALUES (?, ?, ?);",
+                             [("2020-01-01 08:00:00", 10, 3), ("2020-01-01 09:00:00", 10, 1),
+                              ("2021-06-01 12:00:00", 20, 2), (self.recent, 10, 1)])
+            conn.commit()
+
+    def tearDown(self):
+        self.db.close()
+        for path in (self.db_path, self.archive_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_rollups(self):
+        self.assertEqual(self.db._query("SELECT * FROM SIIRROT_PÄIVITTÄIN WHERE Päivä < '2022';"),
+                         [("2020-01-01", 2), ("2021-06-01", 1)])
+        self.assertEqual(self.db._query("SELECT * FROM SIIRROT_LAVOITTAIN WHERE Lavanumero = 10;"),
+                         [(10, 3, "2020-01-01 08:00:00", self.recent, 1)])
+
+    def test_old_movements_archived(self):
+        self.assertEqual(self.db.archive_movements(30), 3)
+        self.assertEqual(self.db._query("SELECT Siirtoaika FROM SIIRTOTAPAHTUMA;"), [(self.recent,)])
+        # The rollups still cover the archived movements
+        self.assertEqual(self.db._query("SELECT Siirrot FROM SIIRROT_LAVOITTAIN WHERE Lavanumero = 10;"), [(3,)])
+        self.assertEqual(self.db.movement_history(10),
+                         [("2020-01-01 08:00:00", 3), ("2020-01-01 09:00:00", 1), (self.recent, 1)])
+        # Running again archives nothing more
+        self.assertEqual(self.db.archive_movements(30), 0)
+        with vl._Connection(self.archive_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM SIIRTOARKISTO;").fetchone(), (3,))
+
+    def test_retention(self):
+        self.assertEqual(self.db.archive_movements(365 * 100), 0)
+        self.assertEqual(self.db.movement_history(20), [("2021-06-01 12:00:00", 2)])
+        with self.assertRaises(ValueError):
+            self.db.archive_movements(-1)
+
+    def test_command_line(self):
+        self.db.close()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastoarkisto.main([self.db_path, "--days", "0"])
+        self.assertIn("Arkistoitu 4", output.getvalue())
+
+    def test_old_schema(self):
+        # The movements of the database shipped with the repository have no Siirto_ID
+        self.db.close()
+        shutil.copyfile("varasto.db", self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+        with self.assertRaisesRegex(ValueError, "--upgrade"):
+            self.db.archive_movements(0)
+        self.db.close()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastoarkisto.main([self.db_path, "--days", "0"])
+        self.assertIn("create_db.py --upgrade", output.getvalue())
+        self.assertFalse(os.path.exists(self.archive_path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import io
+import os
+import time
+import unittest
+
+import varastoasync
+from test_varastologiikka import create_test_db
+
+# A query that runs for minutes unless interrupted
+SLOW_QUERY = """
+             WITH RECURSIVE N(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM N)
+             SELECT COUNT(*) FROM N WHERE i < 0;
+             """
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    
+    async def asyncSetUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = varastoasync.AsyncDatabase(self.db_path, readers=2)
+    
+    async def asyncTearDown(self):
+        await self.db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+    
+    async def test_read_and_write(self):
+        self.assertEqual(await self.db.location_is_free(3), None)
+        await self.db.move_pallet(10, 3)
+        self.assertEqual(await self.db.location_is_free(3), 10)
+        self.assertEqual(sorted(await self.db.get_table("LAVA", "Lavanumero, Sijainti")), [(10, 3), (20, 2)])
+    
+    async def test_concurrent_writes(self):
+        results = await asyncio.gather(self.db.move_pallets([(10, 3)]), self.db.move_pallets([(20, 3)]))
+        # Writes are serialized, so exactly one of the moves to location 3 gets it
+        self.assertEqual(sorted(result[0].moved for result in results), [False, True])
+    
+    async def test_search(self):
+        rows = await self.db.search("TUOTETIEDOT", "vanilja", "Tuotenumero")
+        self.assertEqual(rows, [(1,)])
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            await self.db.search_and_print("TUOTETIEDOT", "vanilja")
+        self.assertIn("Pingviini", output.getvalue())
+    
+    async def test_timeout_interrupts(self):
+        start = time.perf_counter()
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.db.query(SLOW_QUERY, timeout=0.2)
+        # The reader threads are free again once the query has been interrupted
+        self.assertEqual(await asyncio.gather(self.db.query("SELECT 1;"), self.db.query("SELECT 2;")), [[(1,)], [(2,)]])
+        self.assertLess(time.perf_counter() - start, 5)
+    
+    async def test_cancel(self):
+        task = asyncio.create_task(self.db.query(SLOW_QUERY))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(await self.db.location_is_free(1), 10)
+    
+    async def test_recommendations_follow_writes(self):
+        self.assertEqual([slot.location for slot in await self.db.recommend_locations(145)], [3])
+        # Written on the writer thread, while the index is kept by the readers
+        with contextlib.redirect_stdout(io.StringIO()):
+            await self.db.delete_entry("SIJAINTI", "STunniste", "3")
+        self.assertEqual(await self.db.recommend_locations(145), [])
+        with contextlib.redirect_stdout(io.StringIO()):
+            await self.db.add_entry("SIJAINTI", (2, 1, 1, None, 145, 4))
+        self.assertEqual([slot.location for slot in await self.db.recommend_locations(145)], [4])
+    
+    async def test_occupancy_follows_writes(self):
+        self.assertEqual((await self.db.occupancy()).slots.tolist(), [3])
+        with contextlib.redirect_stdout(io.StringIO()):
+            await self.db.delete_entry("SIJAINTI", "STunniste", "3")
+            await self.db.delete_entry("LAVA", "Lavanumero", "20")
+        occupancy = await self.db.occupancy()
+        self.assertEqual((occupancy.slots.tolist(), occupancy.occupied.tolist(), occupancy.pallets.tolist()),
+                         ([2], [1], [1]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import contextlib
+import io
+import os
+import unittest
+
+import varastokysely
+import varastologiikka as vl
+from test_varastologiikka import create_test_db
+
+class TestQueryBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+        self.builder = self.db._query_builder()
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_names_checked(self):
+        self.assertEqual(self.builder.select("lava", "lavanumero, SIJAINTI"), "SELECT Lavanumero, Sijainti FROM LAVA")
+        for relation, select in (("LAVA; DROP TABLE LAVA", "*"), ("LAVA", "Lavanumero FROM ERÄ --"),
+                                 ("LAVA", "Lavanumero, (SELECT 1)"), ("MUU", "*")):
+            with self.subTest(relation=relation, select=select), self.assertRaises(ValueError):
+                self.builder.select(relation, select)
+
+    def test_operators_checked(self):
+        self.assertEqual(self.builder.where("LAVA", ("Lavanumero", "Tyyppi"), ("=", "like"), ("or",)),
+                         "(Lavanumero = ?) OR (Tyyppi LIKE ?)")
+        with self.assertRaises(ValueError):
+            self.builder.where("LAVA", ("Lavanumero",), ("= 1 OR 1 =",))
+        with self.assertRaises(ValueError):
+            self.builder.where("LAVA", ("Lavanumero", "Tyyppi"), ("=", "="), ("; DELETE FROM LAVA",))
+        with self.assertRaises(ValueError):
+            self.builder.where("LAVA", ("Lavanumero", "Tyyppi"), ("=",), ("AND",))
+
+    def test_keywords_quoted(self):
+        catalog = varastokysely.SchemaCatalog({"Order": [varastokysely.Column("Group"), varastokysely.Column("Määrä")]})
+        builder = varastokysely.QueryBuilder(catalog)
+        self.assertEqual(builder.select("order", "group, määrä"), 'SELECT "Group", Määrä FROM "Order"')
+
+    def test_values_bound(self):
+        # Different values give the same statement texts
+        queries = []
+        execute = self.db._execute
+        print_query = self.db.print_query
+        self.db._execute = lambda query, params=(), conn=None: queries.append(query) or execute(query, params, conn)
+        self.db.print_query = lambda query, params=(): queries.append(query) or print_query(query, params)
+        self.assertEqual(self.db.get_table("LAVA", "Lavanumero", ("Sijainti",), (1,), ("=",)), [(10,)])
+        self.assertEqual(self.db.get_table("LAVA", "Lavanumero", ("Sijainti",), (2,), ("=",)), [(20,)])
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.db.search_and_print("TUOTE", "juoma", use_index=False)
+            self.db.search_and_print("TUOTE", "ei_%", use_index=False)
+        self.assertIn("Amppari-juomajää", output.getvalue())
+        self.assertNotIn("Pingviini", output.getvalue())
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(len(set(queries)), 2)
+
+    def test_entries_bound(self):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.db.add_entry("TUOTE", (3, "Robert'); DROP TABLE TUOTE; --", "Testaaja", "Muut", 4))
+            self.db.delete_entry("TUOTE", "Tuotenumero = 1 OR 1", "1")
+        self.assertIn("Virhe:", output.getvalue())
+        self.assertEqual(self.db.get_table("TUOTE", "Nimi", ("Tuotenumero",), (3,), ("=",)),
+                         [("Robert'); DROP TABLE TUOTE; --",)])
+        self.assertEqual(len(self.db.get_table("TUOTE")), 3)
+
+class TestSchemaCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+        self.catalog = self.db._query_builder().catalog
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_types_and_keys(self):
+        self.assertEqual([(column.name, column.affinity) for column in self.catalog.columns("ERÄ")][:3],
+                         [("Eränumero", "INTEGER"), ("Tuotenumero", "INTEGER"), ("PE_pvm", "TEXT")])
+        self.assertEqual(self.catalog.column_info("ERÄ", "Määrä").affinity, "NUMERIC")
+        self.assertEqual(self.catalog.primary_key("SIIRTOTAPAHTUMA"), ("Siirto_ID",))
+        self.assertIn(varastokysely.ForeignKey(("Sijainti",), "SIJAINTI", ("STunniste",)),
+                      self.catalog.foreign_keys("LAVA"))
+        self.assertEqual(self.catalog.foreign_keys("LAVAPAIKAT"), ())
+
+    def test_values_converted(self):
+        self.assertEqual(self.catalog.convert("ERÄ", "Määrä", " 2,5 "), 2.5)
+        self.assertEqual(self.catalog.convert("TUOTE", "Tuotenumero", "3"), 3)
+        self.assertEqual(self.catalog.convert("TUOTE", "Nimi", "3"), "3")
+        self.assertIsNone(self.catalog.convert("TUOTE", "Säilytyslt", ""))
+        with self.assertRaises(ValueError):
+            self.catalog.convert("TUOTE", "Tuotenumero", "kolme")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db.add_entry("TUOTE", ("3", "Mansikkajäätelö", "Pirkka", "Jäätelöt ja mehujäät", "-18"))
+        self.assertEqual(self.db._query("SELECT typeof(Tuotenumero), typeof(Säilytyslt) FROM TUOTE "
+                                        "WHERE Tuotenumero = 3;"), [("integer", "integer")])
+
+    def test_search_by_affinity(self):
+        builder = self.db._query_builder()
+        query, params = builder.search("TUOTE", "*", "jää")
+        self.assertNotIn("Tuotenumero", query)
+        self.assertIn("(Nimi LIKE :haku", query)
+        query, params = builder.search("TUOTE", "*", "2")
+        self.assertIn("(Tuotenumero = :luku)", query)
+        self.assertEqual(params["luku"], 2)
+
+    def test_reloaded_on_schema_change(self):
+        builder = self.db._query_builder()
+        self.assertIs(self.db._query_builder(), builder)
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("ALTER TABLE TUOTE ADD COLUMN Huomautus TEXT;")
+        self.assertEqual(self.db.get_table("TUOTE", "Huomautus", ("Tuotenumero",), (1,), ("=",)), [(None,)])
+        self.assertIsNot(self.db._query_builder(), builder)
+
+if __name__ == "__main__":
+    unittest.main()
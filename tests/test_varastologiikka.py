@@ -1,6 +1,16 @@
+import contextlib
+import datetime
+import io
 import os
+import shutil
+import subprocess
+import sys
+import threading
 import unittest
+from unittest import mock
+import create_db
 import varastologiikka as vl
+import varastoskeema
 
 class TestVarastoLogiikka(unittest.TestCase):
 
@@ -48,5 +58,530 @@ class TestVarastoLogiikka(unittest.TestCase):
         self.assertIsInstance(date, str)
         self.assertRegex(date, r"\d{4}-\d{2}-\d{2}")
 
+class TestMovePallets(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        self.db = vl.Database(self.db_path)
+        with self.db._conn as conn:
+            conn.execute("CREATE TABLE SIJAINTI (STunniste INTEGER NOT NULL PRIMARY KEY);")
+            conn.execute("CREATE TABLE LAVA (Sijainti INTEGER, Lavanumero INTEGER NOT NULL PRIMARY KEY);")
+            conn.execute("""
+                         CREATE TABLE SIIRTOTAPAHTUMA
+                             (Siirtoaika VARCHAR(23) CHECK (Siirtoaika LIKE '____-__-__ __:__:__'),
+                              Lavanumero INTEGER NOT NULL,
+                              Sijainti INTEGER NOT NULL,
+                             PRIMARY KEY (Siirtoaika, Lavanumero, Sijainti) );
+                         """)
+            conn.executemany("INSERT INTO SIJAINTI VALUES (?);", [(1,), (2,), (3,)])
+            conn.executemany("INSERT INTO LAVA VALUES (?, ?);", [(1, 10), (None, 20), (None, 30)])
+            conn.commit()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_moves_applied_in_one_batch(self):
+        results = self.db.move_pallets([(10, 2), (20, 1)])
+        self.assertTrue(all(result.moved for result in results))
+        self.assertEqual(self.db._query("SELECT Lavanumero, Sijainti FROM LAVA ORDER BY Lavanumero"),
+                         [(10, 2), (20, 1), (30, None)])
+        self.assertEqual(self.db._query("SELECT COUNT(*) FROM SIIRTOTAPAHTUMA"), [(2,)])
+
+    def test_rejected_moves_reported(self):
+        results = self.db.move_pallets([(20, 1), (30, 4), (99, 3), (30, 3), (30, 2)])
+        self.assertEqual([result.moved for result in results], [False, False, False, True, False])
+        self.assertIn("10", results[0].reason)
+        self.assertEqual(self.db._query("SELECT Sijainti FROM LAVA WHERE Lavanumero = 30"), [(3,)])
+        self.assertEqual(self.db._query("SELECT COUNT(*) FROM SIIRTOTAPAHTUMA"), [(1,)])
+
+def create_test_db(db_path: str):
+    """
+    Creates the full schema with a warehouse, three locations, two products, two batches and two pallets.
+    Pallet 10 is in location 1 (1-2-3) and pallet 20 in location 2 (RU941), location 3 (1-2-4) is free.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_db(["-t", "-e"])
+    with vl._Connection(db_path) as conn:
+        conn.execute("INSERT INTO VARASTO VALUES (145, 'Varastotie 13');")
+        conn.executemany("INSERT INTO SIJAINTI VALUES (?, ?, ?, ?, 145, ?);",
+                         [(1, 2, 3, None, 1), (None, None, None, "RU941", 2), (1, 2, 4, None, 3)])
+        conn.executemany("INSERT INTO TUOTE(Tuotenumero, Nimi, Valmistaja) VALUES (?, ?, ?);",
+                         [(1, "Pingviini vaniljajäätelö", "Froneri"), (2, "Amppari-juomajää", "Pirkka")])
+        conn.executemany("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (?, ?, ?);",
+                         [(500, 1, "2025-01-31"), (600, 2, "2026-05-01")])
+        conn.executemany("INSERT INTO LAVA VALUES ('EUR', ?, ?);", [(1, 10), (2, 20)])
+        conn.executemany("INSERT INTO ERÄ_LAVALLA VALUES (?, ?);", [(10, 500), (20, 600)])
+        conn.commit()
+
+class TestLastMovement(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_latest_movement_shown(self):
+        self.assertIsNone(self.db.last_movement(10))
+        with self.db._conn as conn:
+            # Recorded out of order, eg. from a scanner that was offline
+            conn.executemany("INSERT INTO SIIRTOTAPAHTUMA (Siirtoaika, Lavanumero, Sijainti) VALUES (?, ?, ?);",
+                             [("2024-03-01 10:00:00", 10, 3), ("2024-05-01 10:00:00", 10, 1),
+                              ("2024-04-01 10:00:00", 10, 3)])
+            conn.commit()
+        self.assertEqual(self.db.last_movement(10), ("2024-05-01 10:00:00", 1))
+        self.assertEqual(self.db.get_table("LAVATIEDOT", "Siirtoaika", ("Lavanumero",), (10,), ("=",)),
+                         [("2024-05-01 10:00:00",)])
+        self.db.move_pallet(10, 3)
+        moved_at, location = self.db.last_movement(10)
+        self.assertGreater(moved_at, "2024-05-01 10:00:00")
+        self.assertEqual(location, 3)
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_prefix_search(self):
+        self.assertTrue(self.db.has_search_index())
+        rows = self.db.search("TUOTETIEDOT", "pingv", select="Tuotenumero")
+        self.assertEqual(rows, [(1,)])
+
+    def test_search_follows_relations(self):
+        # Pallets are found through their products, batches and locations
+        self.assertEqual(self.db.search("LAVATIEDOT", "froneri", select="Lavanumero"), [(10,)])
+        self.assertEqual(self.db.search("LAVATIEDOT", "2026-05", select="Lavanumero"), [(20,)])
+        self.assertEqual(self.db.search("LAVAPAIKAT", "1-2-3", select="Lavanumero"), [(10,)])
+
+    def test_index_kept_in_sync(self):
+        with self.db._conn as conn:
+            conn.execute("UPDATE TUOTE SET Nimi = 'Mansikkajäätelö' WHERE Tuotenumero = 1;")
+            conn.execute("DELETE FROM TUOTE WHERE Tuotenumero = 2;")
+            conn.commit()
+        self.assertEqual(self.db.search("TUOTETIEDOT", "mansikka", select="Tuotenumero"), [(1,)])
+        self.assertEqual(self.db.search("TUOTETIEDOT", "pingviini"), [])
+        self.assertEqual(self.db.search("TUOTETIEDOT", "pirkka"), [])
+
+    def test_index_survives_renumbered_rowids(self):
+        with self.db._conn as conn:
+            conn.executemany("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (?, 1, ?);",
+                             [(700, "2025-03-01"), (800, "2025-04-01")])
+            conn.execute("DELETE FROM ERÄ WHERE Eränumero = 500;")
+            conn.commit()
+            # VACUUM may renumber the rowids of ERÄ, which has no integer primary key
+            conn.execute("UPDATE ERÄ SET rowid = rowid + 100;")
+            conn.execute("UPDATE ERÄ SET PE_pvm = '2027-01-01' WHERE Eränumero = 800;")
+            conn.execute("DELETE FROM ERÄ WHERE Eränumero = 700;")
+            conn.commit()
+            self.assertEqual(sorted(conn.execute("SELECT Avain, Teksti FROM HAKU_ERÄ;").fetchall()),
+                             [(600, "600 2026-05-01"), (800, "800 2027-01-01")])
+        self.assertEqual(self.db.search("TUOTEERÄT", "2027", select="Eränumero"), [(800,)])
+
+    def test_broad_term_capped(self):
+        with self.db._conn as conn:
+            conn.executemany("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (?, 1, '2030-01-01');",
+                             [(1000 + i,) for i in range(30)])
+            conn.execute("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (2030, 1, '2030-06-30');")
+            conn.commit()
+        self.assertEqual(len(self.db.search("TUOTEERÄT", "20", select="Eränumero")), 33)
+        self.assertEqual(len(self.db.search("TUOTEERÄT", "20", select="Eränumero", limit=5)), 5)
+        self.assertEqual(len(self.db.search("TUOTEERÄT", "20", select="Eränumero", limit=None)), 33)
+        # Batch 2030 expiring in 2030 matches better than the other batches expiring in 2030
+        self.assertEqual(self.db.search("TUOTEERÄT", "2030", select="Eränumero", limit=1), [(2030,)])
+        with mock.patch.object(vl, "SEARCH_CANDIDATES", 10):
+            rows = self.db.search("TUOTEERÄT", "2030", select="Eränumero", limit=5)
+        self.assertEqual(len(rows), 5)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.db.search_and_print("TUOTEERÄT", "20", select="Eränumero", limit=5)
+        self.assertIn("Näytetään 5 parasta osumaa.", output.getvalue())
+
+    def test_moves_not_indexed(self):
+        with self.db._conn as conn:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            conn.execute("UPDATE LAVA SET Sijainti = 3 WHERE Lavanumero = 10;")
+            self.assertFalse(any("HAKU_LAVA" in statement for statement in statements))
+            conn.execute("UPDATE LAVA SET Tyyppi = 'FIN' WHERE Lavanumero = 10;")
+            self.assertTrue(any("HAKU_LAVA" in statement for statement in statements))
+            conn.set_trace_callback(None)
+            conn.commit()
+        self.assertEqual(self.db.search("LAVATIEDOT", "fin", select="Lavanumero"), [(10,)])
+
+    def test_like_fallback(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.db.search_and_print("TUOTETIEDOT", "vanilja", use_index=False)
+        self.assertIn("Pingviini", output.getvalue())
+        with self.assertRaises(ValueError):
+            self.db.search("VARASTOTIEDOT", "145")
+
+class TestLocationCode(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_location_id(self):
+        self.assertEqual(self.db.location_id("1-2-3", 145), 1)
+        self.assertEqual(self.db.location_id("ru941", "145"), 2)
+        self.assertIsNone(self.db.location_id("1-2-3", 113))
+        self.assertIsNone(self.db.location_id("1-2", 145))
+
+    def test_code_matches_location_to_str(self):
+        rows = self.db._query("SELECT Hyllyväli, Sektio, Kerros, Kuormaruutu, Sijaintikoodi FROM SIJAINTI")
+        for *location, code in rows:
+            self.assertEqual(code, vl.location_to_str(*location))
+
+    def test_views_do_not_call_python(self):
+        views = self.db._query("SELECT sql FROM sqlite_master WHERE type = 'view'")
+        self.assertTrue(views)
+        for (view,) in views:
+            self.assertNotIn("SIJAINTI_STR", view)
+
+class TestOccupancy(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_occupant(self):
+        self.assertEqual(self.db.location_is_free(1), 10)
+        self.assertIsNone(self.db.location_is_free(3))
+        with self.assertRaises(ValueError):
+            self.db.location_is_free(99)
+
+    def test_occupancy_follows_moves(self):
+        self.db.move_pallet(10, 3)
+        self.assertIsNone(self.db.location_is_free(1))
+        self.assertEqual(self.db.location_is_free(3), 10)
+        self.assertEqual(self.db.free_locations(145), [(1, "1-2-3")])
+
+    def test_occupancy_follows_inserts_and_deletes(self):
+        with self.db._conn as conn:
+            conn.execute("INSERT INTO SIJAINTI VALUES (1, 2, 5, NULL, 145, 4);")
+            conn.execute("INSERT INTO LAVA VALUES ('FIN', 4, 30);")
+            conn.execute("DELETE FROM LAVA WHERE Lavanumero = 10;")
+            conn.commit()
+        self.assertEqual(self.db.location_is_free(4), 30)
+        self.assertEqual(self.db.free_locations(145), [(1, "1-2-3"), (3, "1-2-4")])
+
+class TestExpiry(unittest.TestCase):
+
+    TODAY = datetime.date(2025, 1, 25)
+
+    def setUp(self):
+        # Product 1 has batch 700 expired, 500 and 800 on pallets, 1000 not on a pallet and 900 without a date
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("UPDATE ERÄ SET Myyntierät = 100 WHERE Eränumero = 500;")
+            conn.executemany("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm, Myyntierät) VALUES (?, 1, ?, ?);",
+                             [(700, "2025-01-20", 50), (800, "2025-03-01", 80), (900, None, 40),
+                              (1000, "2025-02-10", 30)])
+            conn.execute("INSERT INTO LAVA VALUES ('EUR', 3, 30);")
+            conn.executemany("INSERT INTO ERÄ_LAVALLA VALUES (?, ?);", [(30, 700), (30, 800), (10, 800), (20, 900)])
+            conn.commit()
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_first_expired_first_out(self):
+        self.assertEqual(self.db.pick_fefo(1, 150, today=self.TODAY),
+                         [vl.PickLine(500, "2025-01-31", 100, [(10, "1-2-3")]),
+                          vl.PickLine(800, "2025-03-01", 50, [(10, "1-2-3"), (30, "1-2-4")])])
+        # Batches without a date come last, and all there is is picked
+        self.assertEqual([(line.batch, line.quantity) for line in self.db.pick_fefo(1, 1000, today=self.TODAY)],
+                         [(500, 100), (800, 80), (900, 40)])
+        self.assertEqual(self.db.pick_fefo(1, 10, warehouse=113, today=self.TODAY), [])
+        with self.assertRaises(ValueError):
+            self.db.pick_fefo(1, 0)
+
+    def test_picking_cached_with_stored_codes(self):
+        db = vl.Database(self.db_path, pool_size=1, cache_bytes=2**20)
+        statements = []
+        with db._conn as conn:
+            conn.set_trace_callback(statements.append)
+        expected = db.pick_fefo(1, 150, today=self.TODAY)
+        self.assertEqual(db.pick_fefo(1, 150, today=self.TODAY), expected)
+        self.assertEqual(db.cache_stats()["hits"], 1)
+        db.expiring_batches(7, today=self.TODAY)
+        self.assertFalse(any("SIJAINTI_STR" in statement for statement in statements))
+        db.close()
+
+    def test_expiring_within_days(self):
+        self.assertEqual(self.db.expiring_batches(7, today=self.TODAY),
+                         [("2025-01-31", 500, 1, "Pingviini vaniljajäätelö", 10, "1-2-3", 145)])
+        self.assertEqual([row[1] for row in self.db.expiring_batches(20, today=self.TODAY)], [500, 1000])
+        self.assertEqual([row[1] for row in self.db.expiring_batches(20, 145, today=self.TODAY)], [500])
+        self.assertEqual([row[1] for row in self.db.expiring_batches(7, today=self.TODAY, include_expired=True)],
+                         [700, 500])
+        with self.assertRaises(ValueError):
+            self.db.expiring_batches(-1)
+
+class TestSummaries(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("INSERT INTO VARASTO VALUES (113, 'Rekkaväylä 2');")
+            conn.execute("INSERT INTO SIJAINTI VALUES (NULL, NULL, NULL, 'RU1', 113, 4);")
+            conn.execute("UPDATE ERÄ SET Ltk_määrä = 20.5 WHERE Eränumero = 500;")
+            conn.execute("UPDATE ERÄ SET Ltk_määrä = 50 WHERE Eränumero = 600;")
+            conn.commit()
+        self.db = vl.Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_views_follow_changes(self):
+        self.assertEqual(self.db.get_table("VARASTOTIEDOT", "Tunniste, Lavat, Lavapaikat"), [(113, 0, 1), (145, 2, 3)])
+        self.assertEqual(sorted(self.db.get_table("TUOTETIEDOT", "Tuotenumero, Erämäärä")), [(1, 1), (2, 1)])
+        self.assertEqual(self.db.stock_by_group(), [(145, "Muut", 70.5)])
+        self.db.move_pallet(10, 4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db.add_entry("ERÄ", (700, 2, "2026-06-01", 10, "pkt", 5.0, "kg", 4.25))
+            self.db.add_entry("ERÄ_LAVALLA", (20, 700))
+            self.db.delete_entry("LAVA", "Lavanumero", "20")
+        self.assertEqual(self.db.get_table("VARASTOTIEDOT", "Tunniste, Lavat, Lavapaikat"), [(113, 1, 1), (145, 0, 3)])
+        self.assertEqual(sorted(self.db.get_table("TUOTETIEDOT", "Tuotenumero, Erämäärä")), [(1, 1), (2, 2)])
+        self.assertEqual(self.db.stock_by_group(113), [(113, "Muut", 20.5)])
+        self.assertEqual(self.db.stock_by_group(145), [])
+        with self.db._conn as conn:
+            conn.execute("UPDATE TUOTE SET Tuoteryhmä = 'Jäätelöt' WHERE Tuotenumero = 1;")
+            conn.commit()
+        self.assertEqual(self.db.stock_by_group(), [(113, "Jäätelöt", 20.5)])
+        self.assertEqual(self.db.check_summaries(),
+                         {"SIJAINNIT_VARASTOITTAIN": [], "ERÄT_TUOTTEITTAIN": [], "SALDOT_RYHMITTÄIN": []})
+
+    def test_inconsistency_found(self):
+        with self.db._conn as conn:
+            conn.execute("UPDATE SALDOT_RYHMITTÄIN SET Ltk_määrä = 0;")
+            conn.execute("DELETE FROM ERÄT_TUOTTEITTAIN WHERE Tuotenumero = 2;")
+            conn.commit()
+        self.assertEqual(self.db.check_summaries(),
+                         {"SIJAINNIT_VARASTOITTAIN": [], "ERÄT_TUOTTEITTAIN": [(2,)],
+                          "SALDOT_RYHMITTÄIN": [(145, "Muut")]})
+
+    def test_checked_within_transaction(self):
+        db = vl.Database(self.db_path, pool_size=1)
+        with db._conn as conn:
+            conn.execute("UPDATE ERÄT_TUOTTEITTAIN SET Erämäärä = 5 WHERE Tuotenumero = 1;")
+            # The pool hands the same connection to the check, which sees the uncommitted change
+            self.assertEqual(db.check_summaries()["ERÄT_TUOTTEITTAIN"], [(1,)])
+            self.assertTrue(conn.in_transaction)
+            conn.rollback()
+        self.assertEqual(db.check_summaries()["ERÄT_TUOTTEITTAIN"], [])
+        db.close()
+
+    def test_old_schema(self):
+        # The database shipped with the repository has no summary tables
+        shutil.copyfile("varasto.db", self.db_path)
+        db = vl.Database(self.db_path)
+        stock = db.stock_by_group()
+        self.assertTrue(stock)
+        self.assertEqual(db.stock_by_group(stock[0][0]), [row for row in stock if row[0] == stock[0][0]])
+        with self.assertRaisesRegex(ValueError, "--upgrade"):
+            db.check_summaries()
+        db.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-t", "-u"])
+        db = vl.Database(self.db_path)
+        self.assertEqual(db.stock_by_group(), stock)
+        self.assertEqual(db.check_summaries(), {table: [] for table in varastoskeema.SUMMARIES})
+        db.close()
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path)
+        with self.db._conn as conn:
+            # A second batch on pallet 10 gives LAVAPAIKAT two rows for location 1
+            conn.execute("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (700, 2, '2026-06-01');")
+            conn.execute("INSERT INTO ERÄ_LAVALLA VALUES (10, 700);")
+            conn.commit()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_pages_cover_view(self):
+        pages = list(self.db.iter_pages("LAVAPAIKAT", "Sijainti_ID, Lavanumero", page_size=1))
+        self.assertEqual([rows for _, rows in pages], [[(1, 10), (1, 10)], [(2, 20)], [(3, None)]])
+        self.assertEqual(pages[0][0], ["Sijainti_ID", "Lavanumero"])
+
+    def test_rows_of_table(self):
+        rows = list(self.db.iter_rows("SIJAINTI", "STunniste", page_size=2))
+        self.assertEqual(rows, [(1,), (2,), (3,)])
+
+    def test_custom_key(self):
+        rows = list(self.db.iter_rows("TUOTEERÄT", "Tuotenumero, Eränumero", page_size=1, key="Tuotenumero"))
+        self.assertEqual(sorted(rows), [(1, 500), (2, 600), (2, 700)])
+
+class TestFormatTable(unittest.TestCase):
+
+    def test_format_table(self):
+        table = vl.format_table(["Nimi", "Määrä", "Huom"], [("Amppari", 12, None), ("Pingviini", 3.5, "a")], 5)
+        self.assertEqual(table.splitlines(), [
+            "   Nimi       Määrä  Huom",
+            "5  Amppari       12",
+            "6  Pingviini    3.5  a",
+        ])
+
+    def test_unknown_renderer(self):
+        with self.assertRaises(ValueError):
+            vl.Database("test.db", renderer="html")
+
+    def test_pandas_not_imported(self):
+        result = subprocess.run([sys.executable, "-c", "import sys, varastoUI; print('pandas' in sys.modules)"],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1, cache_bytes=1 << 20)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_hits(self):
+        first = self.db.get_table("TUOTETIEDOT")
+        self.assertEqual(self.db._query("SELECT *\n  FROM TUOTETIEDOT;"), first)
+        self.assertEqual(self.db.cache_stats()["hits"], 1)
+        self.assertEqual(self.db.cache_stats()["misses"], 1)
+
+    def test_move_invalidates(self):
+        self.assertIsNone(self.db.location_is_free(3))
+        self.assertEqual(list(self.db.iter_rows("LAVAPAIKAT", "Sijainti_ID, Lavanumero")),
+                         [(1, 10), (2, 20), (3, None)])
+        products = self.db.get_table("TUOTETIEDOT")
+        self.db.move_pallet(10, 3)
+        self.assertEqual(self.db.location_is_free(3), 10)
+        self.assertEqual(list(self.db.iter_rows("LAVAPAIKAT", "Sijainti_ID, Lavanumero")),
+                         [(1, None), (2, 20), (3, 10)])
+        # Products do not depend on pallet locations, so they are still cached
+        hits = self.db.cache_stats()["hits"]
+        self.assertEqual(self.db.get_table("TUOTETIEDOT"), products)
+        self.assertEqual(self.db.cache_stats()["hits"], hits + 1)
+
+    def test_entries_invalidate(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(len(self.db.get_table("TUOTE")), 2)
+            self.db.add_entry("TUOTE", (3, "Mansikkajäätelö", "Pirkka", "Jäätelöt ja mehujäät", -18))
+            self.assertEqual(len(self.db.get_table("TUOTE")), 3)
+            self.db.delete_entry("TUOTE", "Tuotenumero", "3")
+            self.assertEqual(len(self.db.get_table("TUOTE")), 2)
+
+    def test_external_change(self):
+        self.assertIsNone(self.db.location_is_free(3))
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("UPDATE LAVA SET Sijainti = 3 WHERE Lavanumero = 10;")
+            conn.commit()
+        self.assertEqual(self.db.location_is_free(3), 10)
+
+    def test_memory_bound(self):
+        db = vl.Database(self.db_path, pool_size=1, cache_bytes=2000)
+        for i in range(20):
+            db._query("SELECT ? AS i, Nimi FROM TUOTE", (i,))
+        stats = db.cache_stats()
+        self.assertLessEqual(stats["bytes"], 2000)
+        self.assertGreater(stats["evictions"], 0)
+        db.close()
+
+    def test_volatile_not_cached(self):
+        self.db._query("SELECT random();")
+        self.db._query("SELECT random();")
+        self.assertEqual(self.db.cache_stats()["hits"], 0)
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=2)
+        with self.db._conn as conn:
+            conn.execute("CREATE TABLE LAVA (Sijainti INTEGER, Lavanumero INTEGER NOT NULL PRIMARY KEY);")
+            conn.commit()
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_connection_reused(self):
+        with self.db._conn as first:
+            pass
+        with self.db._conn as second:
+            self.assertIs(first, second)
+            # The SIJAINTI_STR function is registered once per pooled connection
+            self.assertEqual(second.execute("SELECT SIJAINTI_STR(1, 2, 3, NULL)").fetchone()[0], "1-2-3")
+
+    def test_nested_context_same_connection(self):
+        with self.db._conn as outer:
+            with self.db._conn as inner:
+                self.assertIs(outer, inner)
+
+    def test_threads_get_own_connections(self):
+        seen = []
+        barrier = threading.Barrier(2)
+        def worker():
+            with self.db._conn as conn:
+                seen.append(conn)
+                barrier.wait()
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(seen[0], seen[1])
+
+    def test_uncommitted_changes_rolled_back(self):
+        with self.db._conn as conn:
+            conn.execute("INSERT INTO LAVA(Lavanumero) VALUES (1);")
+        self.assertEqual(self.db._query("SELECT COUNT(*) FROM LAVA"), [(0,)])
+
+    def test_closed_pool_refuses_use(self):
+        self.db.close()
+        with self.assertRaises(vl.sql.ProgrammingError):
+            self.db._query("SELECT 1")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import unittest
+
+import varastologiikka as vl
+import varastomittaus as vm
+from test_varastologiikka import create_test_db
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.metrics = vm.Metrics()
+        self.db = vl.Database(self.db_path, pool_size=1, metrics=self.metrics)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_normalize(self):
+        self.assertEqual(vm.normalize("SELECT *\n  FROM LAVA WHERE Lavanumero = 10 AND Tyyppi = 'EU''R'"),
+                         "SELECT * FROM LAVA WHERE Lavanumero = ? AND Tyyppi = ?")
+        self.assertEqual(vm.normalize("SELECT * FROM LAVA WHERE Lavanumero IN (1, 2, 3) AND -1.5e3 < x'00'"),
+                         "SELECT * FROM LAVA WHERE Lavanumero IN (?, ...) AND -? < x?")
+        self.assertEqual(vm.normalize("SELECT PE_pvm FROM ERÄ_LAVALLA2"), "SELECT PE_pvm FROM ERÄ_LAVALLA2")
+
+    def test_statements_and_operations(self):
+        self.assertEqual(self.db.location_is_free(1), 10)
+        self.assertIsNone(self.db.location_is_free(3))
+        with self.assertRaises(ValueError):
+            self.db.location_is_free(99)
+        snapshot = self.metrics.snapshot()
+        stats = snapshot["statements"]["SELECT Lavanumero FROM PAIKKAVARAUS WHERE Sijainti = ?"]
+        self.assertEqual((stats["count"], stats["rows"]), (3, 2))
+        self.assertEqual(stats["buckets"]["+Inf"], 3)
+        self.assertEqual((snapshot["operations"]["location_is_free"]["count"],
+                          snapshot["operations"]["location_is_free"]["errors"]), (3, 1))
+        # The pool opens one connection, reused by every operation
+        self.assertEqual(snapshot["connections"]["count"], 1)
+
+    def test_triggers_counted_with_statement(self):
+        self.db.move_pallet(10, 3)
+        statements = self.metrics.snapshot()["statements"]
+        self.assertEqual(statements["UPDATE LAVA SET Sijainti = ? WHERE Lavanumero = ?"]["count"], 1)
+        self.assertEqual(statements["COMMIT"]["count"], 1)
+        self.assertFalse(any(statement.startswith("--") for statement in statements))
+
+    def test_one_shot_connections(self):
+        db = vl.Database(self.db_path, metrics=self.metrics)
+        self.assertEqual(db.location_id("1-2-3", 145), 1)
+        self.metrics.reset()
+        # Every operation opens a connection of its own once the schema has been loaded
+        self.assertEqual(db.location_id("RU941", 145), 2)
+        self.assertEqual(db.location_id("1-2-4", 145), 3)
+        self.assertEqual(self.metrics.snapshot()["connections"]["count"], 2)
+        self.assertEqual(self.metrics.snapshot()["operations"]["location_id"]["count"], 2)
+
+    def test_slow_queries_logged_with_plan(self):
+        metrics = vm.Metrics(slow_query_seconds=0, slow_log_size=2)
+        db = vl.Database(self.db_path, pool_size=1, metrics=metrics)
+        db.get_table("TUOTE")
+        db._query("SELECT Nimi FROM TUOTE WHERE Tuotenumero = ?", (2,))
+        db.close()
+        self.assertGreaterEqual(metrics.slow_total, 2)
+        entry = metrics.slow_queries[-1]
+        self.assertEqual(entry.statement, "SELECT Nimi FROM TUOTE WHERE Tuotenumero = ?")
+        self.assertEqual(entry.text, "SELECT Nimi FROM TUOTE WHERE Tuotenumero = 2")
+        self.assertEqual(entry.rows, 1)
+        self.assertEqual(entry.plan, ["SEARCH TUOTE USING INTEGER PRIMARY KEY (rowid=?)"])
+        self.assertEqual(len(metrics.slow_queries), 2)
+        # Capturing the plans is not counted
+        self.assertFalse(any(statement.startswith("EXPLAIN") for statement in metrics.snapshot()["statements"]))
+
+    def test_steps(self):
+        metrics = vm.Metrics(progress_steps=10)
+        db = vl.Database(self.db_path, pool_size=1, metrics=metrics)
+        db._query("WITH RECURSIVE N(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM N WHERE i < 1000) "
+                  "SELECT SUM(i) FROM N")
+        db.close()
+        stats = metrics.snapshot()["statements"]
+        self.assertGreater(next(value["steps"] for statement, value in stats.items() if "RECURSIVE" in statement),
+                           1000)
+
+    def test_export(self):
+        self.db._query('SELECT "Nimi" FROM TUOTE WHERE Nimi = ?', ("Amppari",))
+        snapshot = json.loads(self.metrics.to_json())
+        self.assertEqual(snapshot["statements"]['SELECT "Nimi" FROM TUOTE WHERE Nimi = ?']["rows"], 0)
+        lines = self.metrics.to_prometheus().splitlines()
+        label = 'statement="SELECT \\"Nimi\\" FROM TUOTE WHERE Nimi = ?"'
+        self.assertIn("# TYPE varasto_statement_seconds histogram", lines)
+        self.assertIn("varasto_statement_seconds_count{" + label + "} 1", lines)
+        self.assertIn("varasto_statement_seconds_bucket{" + label + ',le="+Inf"} 1', lines)
+        self.assertIn("varasto_statement_rows_total{" + label + "} 0", lines)
+        self.assertIn("varasto_connection_open_seconds_count 1", lines)
+        self.assertIn("varasto_slow_statements_total 0", lines)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()["statements"], {})
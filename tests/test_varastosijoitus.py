@@ -0,0 +1,113 @@
+import contextlib
+import io
+import os
+import unittest
+
+import create_db
+import varastologiikka as vl
+import varastosijoitus as vs
+
+class TestPutaway(unittest.TestCase):
+
+    def setUp(self):
+        # Warehouse 1 has aisles 1-3 of 2 sections and 2 levels and the floor unit RU1. Pallet 10 of frozen meat
+        # is in aisle 3 and pallet 20 of the same product is outside the warehouse.
+        self.db_path = "test.db"
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-t", "-e"])
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("INSERT INTO VARASTO VALUES (1, 'Varastotie 1');")
+            conn.executemany("INSERT INTO SIJAINTI VALUES (?, ?, ?, NULL, 1, ?);",
+                             [(aisle, section, level, aisle * 100 + section * 10 + level)
+                              for aisle in (1, 2, 3) for section in (1, 2) for level in (1, 2)])
+            conn.execute("INSERT INTO SIJAINTI VALUES (NULL, NULL, NULL, 'RU1', 1, 1);")
+            conn.execute("INSERT INTO TUOTE VALUES (1, 'Luuton joulukinkku', 'Atria', 'Lihapakasteet', -18);")
+            conn.execute("INSERT INTO ERÄ(Eränumero, Tuotenumero, PE_pvm) VALUES (500, 1, '2026-12-01');")
+            conn.executemany("INSERT INTO LAVA VALUES ('EUR', ?, ?);", [(322, 10), (None, 20)])
+            conn.executemany("INSERT INTO ERÄ_LAVALLA VALUES (?, 500);", [(10,), (20,)])
+            conn.commit()
+        self.db = vl.Database(self.db_path, pool_size=1)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def test_ranked_by_distance_and_level(self):
+        self.assertEqual([(slot.code, slot.cost) for slot in self.db.recommend_locations(1, count=6)],
+                         [("1-1-1", 0.0), ("1-2-1", 0.1), ("2-1-1", 1.0), ("2-2-1", 1.1), ("1-1-2", 2.0),
+                          ("3-1-1", 2.0)])
+        self.assertEqual(self.db.recommend_locations(2), [])
+
+    def test_product_groups_clustered(self):
+        self.assertEqual([slot.code for slot in self.db.recommend_locations(1, 20, count=4)],
+                         ["3-1-1", "3-2-1", "3-1-2", "1-1-1"])
+        # The floor unit comes last
+        self.assertEqual(self.db.recommend_locations(1, 20, count=20)[-1].code, "RU1")
+
+    def test_moves_followed(self):
+        self.assertEqual(self.db.recommend_locations(1, count=1)[0].code, "1-1-1")
+        self.db.move_pallet(10, 111)
+        # Moved by another connection
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("UPDATE LAVA SET Sijainti = 121 WHERE Lavanumero = 20;")
+            conn.execute("INSERT INTO SIIRTOTAPAHTUMA (Siirtoaika, Lavanumero, Sijainti) "
+                         "VALUES ('2026-01-01 08:00:00', 20, 121);")
+            conn.commit()
+        self.assertEqual([slot.code for slot in self.db.recommend_locations(1, count=3)],
+                         ["2-1-1", "2-2-1", "1-1-2"])
+        # Aisle 3 is free again and the meat is now in aisle 1
+        self.assertEqual([slot.code for slot in self.db.recommend_locations(1, 20, count=2)], ["1-1-2", "1-2-2"])
+        # New pallets are seen after the index is rebuilt
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db.add_entry("LAVA", ("FIN", 211, 30))
+        self.assertNotIn("2-1-1", [slot.code for slot in self.db.recommend_locations(1, count=3)])
+
+    def test_changes_of_other_connections_seen(self):
+        self.assertEqual(self.db.recommend_locations(1, count=1)[0].code, "1-1-1")
+        with vl._Connection(self.db_path) as conn:
+            conn.execute("DELETE FROM SIJAINTI WHERE STunniste = 111;")
+            conn.execute("INSERT INTO SIJAINTI VALUES (1, 1, 3, NULL, 2, 2113);")
+            conn.commit()
+        self.assertEqual(self.db.recommend_locations(1, count=1)[0].code, "1-2-1")
+        self.assertEqual([slot.location for slot in self.db.recommend_locations(2)], [2113])
+        # Moves are followed from the movement log without building the index again
+        index = self.db._putaway[1]
+        self.db.move_pallet(20, 121)
+        self.assertEqual(self.db.recommend_locations(1, count=1)[0].code, "2-1-1")
+        self.assertIs(self.db._putaway[1], index)
+
+    def test_same_as_full_ranking(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_db(["-t", "--warehouses", "2", "--locations", "3000", "--pallets", "1800",
+                                 "--seed", "5"])
+        with vl._Connection(self.db_path) as conn:
+            putaway = vs.PutawayIndex.load(conn, {145: 20})
+            free = conn.execute("""
+                                SELECT S.STunniste, S.Varasto, S.Hyllyväli, S.Sektio, S.Kerros
+                                FROM SIJAINTI S JOIN PAIKKAVARAUS P ON P.Sijainti = S.STunniste
+                                WHERE P.Lavanumero IS NULL;
+                                """).fetchall()
+            # The product group of a pallet is the first of its batches
+            groups = set(conn.execute("""
+                                      SELECT S.Varasto, S.Hyllyväli, MIN(T.Tuoteryhmä)
+                                      FROM LAVA L JOIN SIJAINTI S ON L.Sijainti = S.STunniste
+                                      JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
+                                      JOIN ERÄ E ON EL.Eränumero = E.Eränumero
+                                      JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
+                                      GROUP BY L.Lavanumero;
+                                      """).fetchall())
+        for warehouse, group in ((145, None), (145, "Lihapakasteet"), (113, "Leivät ja leivokset")):
+            dock = 20 if warehouse == 145 else vs.DOCK_AISLE
+            expected = sorted(
+                (round(vs.FLOOR_UNIT_COST if aisle is None else
+                       vs.AISLE_WEIGHT * abs(aisle - dock) + vs.LEVEL_WEIGHT * (level - 1)
+                       + vs.SECTION_WEIGHT * (section - 1)
+                       - (vs.CLUSTER_BONUS if (warehouse, aisle, group) in groups else 0), 6), location)
+                for location, location_warehouse, aisle, section, level in free if location_warehouse == warehouse)
+            with self.subTest(warehouse=warehouse, group=group):
+                self.assertEqual([(slot.cost, slot.location)
+                                  for slot in putaway.recommend(warehouse, 25, group=group)], expected[:25])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import unittest
+from unittest import mock
+
+import varastologiikka as vl
+import varastoskeema
+import varastotuonti
+from test_varastologiikka import create_test_db
+
+class TestImport(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, pool_size=1)
+        self.paths = []
+
+    def tearDown(self):
+        self.db.close()
+        for path in [self.db_path] + self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write(self, name: str, text: str) -> str:
+        path = "test_{}.csv".format(name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        self.paths.append(path)
+        return path
+
+    def test_files_imported(self):
+        products = self.write("tuote", "Tuotenumero;Nimi;Valmistaja\n"
+                                       "3;Mansikkajäätelö;Pirkka\n"
+                                       "4;Mustikkapiirakka;\n")
+        batches = self.write("erä", "eränumero;tuotenumero;pe_pvm;määrä\n"
+                                    "700;3;2026-02-01;12,5\n"
+                                    "800;4;2026-03-01;\n")
+        # Given out of order, the products are imported before the batches that refer to them
+        results = self.db.import_files([("ERÄ", batches), ("tuote", products)])
+        self.assertEqual([(result.table, result.imported, result.rejected) for result in results],
+                         [("TUOTE", 2, []), ("ERÄ", 2, [])])
+        # Missing columns get their defaults and empty fields are NULL
+        self.assertEqual(self.db._query("SELECT Valmistaja, Tuoteryhmä, Säilytyslt FROM TUOTE "
+                                        "WHERE Tuotenumero = 4;"), [(None, "Muut", 21)])
+        self.assertEqual(self.db._query("SELECT typeof(Tuotenumero), Määrä FROM ERÄ WHERE Eränumero >= 700;"),
+                         [("integer", 12.5), ("integer", None)])
+        self.assertEqual(self.db.get_table("TUOTETIEDOT", "Erämäärä", ("Tuotenumero",), (3,), ("=",)), [(1,)])
+
+    def test_rows_rejected(self):
+        pallets = self.write("lava", "Tyyppi,Sijainti,Lavanumero\n"
+                                     "FIN,3,30\n"     # imported
+                                     "EUR,1,kolme\n"  # not a number
+                                     "EUR,9,40\n"     # no such location
+                                     "XXX,,50\n"      # not a pallet type
+                                     "EUR,,10\n"      # already exists
+                                     "EUR,,60,1\n"    # too many values
+                                     ",,70\n")        # NULL type
+        result, = self.db.import_files([("LAVA", pallets)], chunk_size=3)
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([rejection.line for rejection in result.rejected], [3, 4, 5, 6, 7, 8])
+        self.assertIn("SIJAINTI(STunniste) = 9", result.rejected[1].reason)
+        self.assertIn("LAVA.Lavanumero", result.rejected[3].reason)
+        self.assertEqual(self.db._query("SELECT Lavanumero FROM PAIKKAVARAUS WHERE Sijainti = 3;"), [(30,)])
+
+    def test_errors_roll_back(self):
+        products = self.write("tuote", "Tuotenumero;Nimi\n3;Mansikkajäätelö\n")
+        for files in ([("TUOTE", products), ("SIJAINTI", products)], [("TUOTE", products), ("ERÄ", "puuttuu.csv")],
+                      [("TUOTE", self.write("muu", "Tuotenumero;Hinta\n5;1,50\n"))]):
+            with self.subTest(files=files), self.assertRaises(ValueError):
+                self.db.import_files(files)
+        self.assertEqual(self.db._query("SELECT COUNT(*) FROM TUOTE;"), [(2,)])
+
+    def test_bulk_import(self):
+        batches = self.write("erä", "Eränumero;Tuotenumero;PE_pvm;Ltk_määrä\n"
+                                    "700;1;2027-02-01;2\n"
+                                    "800;2;2027-03-01;3\n"
+                                    "500;1;2027-04-01;4\n"  # already exists
+                                    "900;2;2027-05-01;5\n")
+        query = "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name;"
+        triggers = self.db._query(query)
+        with self.db._conn as conn:
+            changes = varastoskeema.change_counts(conn, ("ERÄ",))
+        with mock.patch.object(varastotuonti, "BULK_ROWS", 2):
+            result, = self.db.import_files([("ERÄ", batches)], chunk_size=3)
+        self.assertEqual((result.imported, [rejection.line for rejection in result.rejected]), (3, [4]))
+        # The suspended triggers are back and the search and summary tables have the imported batches
+        self.assertEqual(self.db._query(query), triggers)
+        self.assertEqual(self.db.search("TUOTEERÄT", "2027", select="Eränumero", limit=None),
+                         [(700,), (800,), (900,)])
+        self.assertEqual(self.db.check_summaries(), {table: [] for table in varastoskeema.SUMMARIES})
+        with self.db._conn as conn:
+            self.assertNotEqual(varastoskeema.change_counts(conn, ("ERÄ",)), changes)
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow"), "pyarrow on asennettu")
+    def test_parquet_needs_pyarrow(self):
+        with self.assertRaises(ValueError):
+            self.db.import_files([("TUOTE", "tuotteet.parquet")])
+
+    def test_command_line(self):
+        products = self.write("tuote", "Tuotenumero;Nimi\n3;Mansikkajäätelö\n1;Kaksoiskappale\n")
+        self.db.close()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastotuonti.main([self.db_path, "TUOTE={}".format(products)])
+        self.assertIn("TUOTE: tuotu 1 riviä, hylätty 1", output.getvalue())
+        self.assertIn("rivi 3: Tietue on jo olemassa", output.getvalue())
+
+    def test_command_line_old_schema(self):
+        # The views of the database shipped with the repository compute the location codes with SIJAINTI_STR
+        self.db.close()
+        shutil.copyfile("varasto.db", self.db_path)
+        products = self.write("tuote", "Tuotenumero;Nimi\n999;Mansikkajäätelö\n")
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastotuonti.main([self.db_path, "TUOTE={}".format(products)])
+        self.assertIn("TUOTE: tuotu 1 riviä, hylätty 0", output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
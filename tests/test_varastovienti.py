@@ -0,0 +1,88 @@
+import contextlib
+import csv
+import importlib.util
+import io
+import json
+import os
+import shutil
+import unittest
+
+import varastologiikka as vl
+import varastovienti
+from test_varastologiikka import create_test_db
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = "test.db"
+        create_test_db(self.db_path)
+        self.db = vl.Database(self.db_path, concurrent=True)
+        self.paths = []
+
+    def tearDown(self):
+        self.db.close()
+        for path in [self.db_path] + self.paths:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def path(self, name: str) -> str:
+        self.paths.append(name)
+        return name
+
+    def test_csv_and_json_lines(self):
+        products, locations = self.path("test_tuote.csv"), self.path("test_lavapaikat.jsonl")
+        results = self.db.export([("tuote", products), ("LAVAPAIKAT", locations)], batch_size=2)
+        self.assertEqual([(result.relation, result.rows) for result in results], [("TUOTE", 2), ("LAVAPAIKAT", 3)])
+        with open(products, newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file, delimiter=";"))
+        self.assertEqual(rows[0], ["Tuotenumero", "Nimi", "Valmistaja", "Tuoteryhmä", "Säilytyslt"])
+        self.assertEqual(rows[1], ["1", "Pingviini vaniljajäätelö", "Froneri", "Muut", "21"])
+        with open(locations, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(rows[1]["Sijainti"], "RU941")
+        self.assertEqual([row["Lavanumero"] for row in rows], [10, 20, None])
+
+    def test_unknown_relation_or_format(self):
+        for exports in ([("MUU", self.path("test_muu.csv"))], [("TUOTE", self.path("test_tuote.xlsx"))]):
+            with self.subTest(exports=exports), self.assertRaises(ValueError):
+                self.db.export(exports)
+        self.assertFalse(os.path.exists("test_muu.csv"))
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow"), "pyarrow on asennettu")
+    def test_parquet_needs_pyarrow(self):
+        with self.assertRaises(ValueError):
+            self.db.export([("TUOTE", self.path("test_tuote.parquet"))])
+
+    def test_snapshot_does_not_block_writers(self):
+        # An uncommitted move of another connection neither blocks the snapshot nor is in it
+        self.assertEqual(len(self.db.get_table("LAVA")), 2)
+        with vl._Connection(self.db_path) as writer:
+            writer.execute("BEGIN IMMEDIATE;")
+            writer.execute("UPDATE LAVA SET Sijainti = 3 WHERE Lavanumero = 10;")
+            self.assertGreater(self.db.snapshot(self.path("test_kopio.db")), 0)
+            writer.commit()
+        with vl._Connection("test_kopio.db") as conn:
+            self.assertEqual(conn.execute("SELECT Sijainti FROM LAVA WHERE Lavanumero = 10;").fetchone(), (1,))
+            self.assertEqual(conn.execute("PRAGMA integrity_check;").fetchone(), ("ok",))
+
+    def test_command_line(self):
+        self.db.close()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastovienti.main([self.db_path, "LAVATIEDOT={}".format(self.path("test_lavat.csv")),
+                                "--backup", self.path("test_kopio.db")])
+        self.assertIn("LAVATIEDOT: 2 riviä", output.getvalue())
+        self.assertIn("Tietokanta kopioitu", output.getvalue())
+
+    def test_command_line_old_schema(self):
+        # The views of the database shipped with the repository compute the location codes with SIJAINTI_STR
+        self.db.close()
+        shutil.copyfile("varasto.db", self.db_path)
+        with vl._Connection(self.db_path) as conn:
+            expected = conn.execute("SELECT COUNT(*) FROM LAVAPAIKAT;").fetchone()[0]
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            varastovienti.main([self.db_path, "LAVAPAIKAT={}".format(self.path("test_lavapaikat.csv"))])
+        self.assertIn("LAVAPAIKAT: {} riviä".format(expected), output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
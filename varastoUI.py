@@ -1,10 +1,12 @@
+import sys
 import varastologiikka as vl
+import varastomittaus
 
 # Muokkaa tietoja
 def edit_info(db: vl.Database):
     while True:
         print("Muokkaa:")
-        options = ("Siirrä lava",)
+        options = ("Siirrä lava", "Kerää tuotetta")
         choice = vl.handle_input(options)
         
         if choice == "0" or choice == "": # Takaisin
@@ -27,14 +29,10 @@ def edit_info(db: vl.Database):
             if to_location == "": # Peruuta
                 continue
             to_location = db.sanitize(to_location)
-            location_id = db.get_table(
-                "LAVAPAIKAT", "Sijainti_ID", ("Sijainti", "Varasto"), (to_location, varasto),
-                comparators=("=", "="), logicals=("AND",)
-                )
-            if not location_id:
+            location_id = db.location_id(to_location, varasto)
+            if location_id is None:
                 print("Sijaintia {} ei löytynyt.".format(to_location))
                 continue
-            location_id = int(location_id[0][0])
             try:
                 occupant = db.location_is_free(location_id)
             except ValueError as e:
@@ -45,6 +43,31 @@ def edit_info(db: vl.Database):
                 print("Lava siirretty sijaintiin {}.".format(to_location))
             else:
                 print("Lavaa ei voitu siirtää. Sijainti {} on jo varattu lavalle {}.".format(to_location, occupant))
+                free = db.recommend_locations(int(varasto), pallet_id, 5)
+                if free:
+                    print("Suositellut vapaat sijainnit: {}".format(", ".join(slot.code for slot in free)))
+        elif choice == "2": # Kerää tuotetta, ensin vanhenevat erät ensin
+            product = db.sanitize(input("Tuotenumero: "))
+            if product == "": # Peruuta
+                continue
+            quantity = db.sanitize(input("Määrä (myyntierää): "))
+            if quantity == "": # Peruuta
+                continue
+            try:
+                lines = db.pick_fefo(int(product), int(quantity))
+            except ValueError as e:
+                print(e)
+                continue
+            if not lines:
+                print("Tuotetta {} ei ole varastossa.".format(product))
+                continue
+            for line in lines:
+                print("Erä {} (PE {}): {} kpl lavoilta {}".format(
+                    line.batch, line.expiry or "-", line.quantity,
+                    ", ".join("{} ({})".format(pallet, location) for pallet, location in line.pallets)))
+            picked = sum(line.quantity for line in lines)
+            if picked < int(quantity):
+                print("Varastossa on vain {} kpl.".format(picked))
 
 # Haku
 def search_db(db: vl.Database):
@@ -74,30 +97,69 @@ def search_db(db: vl.Database):
             db.search_and_print("LAVASIIRROT", search_term)
         input("Paina Enter jatkaaksesi...")
 
+# Selaa taulua sivu kerrallaan
+def browse(db: vl.Database, table_name: str, page_size: int=20):
+    start = 0
+    for columns, rows in db.iter_pages(table_name, page_size=page_size):
+        db.print_rows(columns, rows, start)
+        start += len(rows)
+        if input("Enter: seuraava sivu, 0: lopeta: ") == "0":
+            return
+    if start == 0:
+        print("Ei tuloksia.")
+    else:
+        print("Ei enempää rivejä.")
+
 # Selaa tietoja
 def scroll_info(db: vl.Database):
     while True: 
         print("Selaa:")
-        options = ("Tuotteet", "Erät", "Lavapaikat", "Lavat", "Varastot")
+        options = ("Tuotteet", "Erät", "Lavapaikat", "Lavat", "Varastot", "Vanhenevat erät", "Täyttöasteet")
         choice = vl.handle_input(options)
         
         if choice == "0" or choice == "": # Takaisin
             return
         elif choice == "1": # Tuotteet
-            db.print_table("TUOTETIEDOT")
+            browse(db, "TUOTETIEDOT")
         elif choice == "2": # Erät
-            db.print_table("TUOTEERÄT")
+            browse(db, "TUOTEERÄT")
         elif choice == "3": # Lavapaikat
-            db.print_table("LAVAPAIKAT")
+            browse(db, "LAVAPAIKAT")
         elif choice == "4": # Lavat
-            db.print_table("LAVATIEDOT")
+            browse(db, "LAVATIEDOT")
         elif choice == "5": # Varastot
-            db.print_table("VARASTOTIEDOT")
+            browse(db, "VARASTOTIEDOT")
+        elif choice == "6": # Vanhenevat erät
+            days = db.sanitize(input("Päiviä: "))
+            if days == "": # Peruuta
+                continue
+            try:
+                rows = db.expiring_batches(int(days))
+            except ValueError as e:
+                print(e)
+                continue
+            db.print_rows(("PE_pvm", "Eränumero", "Tuotenumero", "Nimi", "Lavanumero", "Sijainti", "Varasto"), rows)
+        elif choice == "7": # Täyttöasteet hyllyväleittäin ja kerroksittain, kuormaruudut hyllyvälinä -1
+            varasto = db.sanitize(input("Varasto (tyhjä: kaikki): "))
+            try:
+                occupancy = db.occupancy(("warehouse", "aisle", "floor"), int(varasto) if varasto else None)
+            except ValueError as e:
+                print(e)
+                continue
+            db.print_rows(("Varasto", "Hyllyväli", "Kerros", "Paikat", "Varatut", "Lavat", "Täyttöaste %"),
+                          occupancy.rows())
         input("Paina Enter jatkaaksesi...")
 
 def main():
     print("\nTervetuloa varastonhallintajärjestelmään!\n")
-    db = vl.Database("varasto.db")
+    # Taulukot tulostetaan pandasilla vain pyydettäessä, koska sen lataus hidastaa käynnistystä
+    renderer = "pandas" if "--pandas" in sys.argv[1:] else "text"
+    # Kyselyjen kestot ja hitaat kyselyt kirjataan pyydettäessä ja tallennetaan lopuksi tiedostoon
+    metrics = varastomittaus.Metrics() if "--metrics" in sys.argv[1:] else None
+    # Useampi pääte voi käyttää samaa tietokantaa yhtä aikaa
+    # Toistuvien hakujen tulokset pidetään muistissa, kunnes taulut muuttuvat
+    db = vl.Database("varasto.db", pool_size=1, renderer=renderer, concurrent=True, cache_bytes=16 * 2**20,
+                     metrics=metrics)
     while True:
         options = ("Haku", "Selaa tietoja", "Muokkaa tietoja")
         choice = vl.handle_input(options, back_label="Poistu")
@@ -111,6 +173,13 @@ def main():
         elif choice == "3": # Muokkaa tietoja
             edit_info(db)
         
+    db.close()
+    if metrics is not None:
+        with open("varasto_mittarit.prom", "w", encoding="utf-8") as file:
+            file.write(metrics.to_prometheus())
+        with open("varasto_mittarit.json", "w", encoding="utf-8") as file:
+            file.write(metrics.to_json(indent=2))
+        print("Mittarit tallennettu tiedostoihin varasto_mittarit.prom ja varasto_mittarit.json.")
     print("Järjestelmä suljetaan.")
 
 if __name__ == "__main__":
@@ -0,0 +1,359 @@
+"""
+Warehouse-wide occupancy analytics on a snapshot of the locations and pallets kept in NumPy arrays.
+
+The locations of SIJAINTI are loaded once into arrays sorted by (warehouse, aisle, section, floor), with the
+number of pallets in each location, and the pallets of LAVA into arrays of their type and location. Floor
+units (Kuormaruutu) have no aisle, section or floor, which are FLOOR_UNIT in the snapshot. Every coordinate
+is also kept as a dense code, so the locations are grouped by any of the DIMENSIONS by combining the codes
+into one integer and counting with numpy.bincount: an aggregate over millions of locations takes a few
+milliseconds and no sorting.
+
+The snapshot follows the movement log SIIRTOTAPAHTUMA: refresh() applies the movements recorded after the
+previous refresh, also those of other processes, with vectorized updates of the counts. Other changes to
+SIJAINTI and LAVA are only seen when the snapshot is loaded again, which Database.occupancy_snapshot() does
+when the change counters of the tables (varastoskeema.CHANGE_COUNTERS) show changes.
+"""
+import sqlite3 as sql
+import threading
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+# The coordinates the locations can be grouped by, and the columns of SIJAINTI they come from
+DIMENSIONS = ("warehouse", "aisle", "section", "floor")
+_COLUMNS = ("Varasto", "Hyllyväli", "Sektio", "Kerros")
+
+# The coordinate of floor units and of missing values
+FLOOR_UNIT = -1
+
+# Pallet types of LAVA.Tyyppi, in the order of their codes
+PALLET_TYPES = ("EUR", "FIN", "TEH")
+
+# The coordinates of a group are combined into one integer and counted with numpy.bincount while there are at
+# most this many combinations, or this many per location, and numbered with numpy.unique beyond that
+_MIN_DENSE_GROUPS = 1 << 16
+_DENSE_GROUPS_PER_LOCATION = 4
+
+class Occupancy(NamedTuple):
+    """
+    The locations and their occupancy grouped by some of the DIMENSIONS, in ascending order of the keys.
+
+    Attributes:
+        by (tuple[str, ...]): The dimensions grouped by.
+        keys (numpy.ndarray): The coordinates of each group, shape (groups, len(by)).
+        slots (numpy.ndarray): The number of locations in each group.
+        occupied (numpy.ndarray): The number of locations holding at least one pallet in each group.
+        pallets (numpy.ndarray): The number of pallets in the locations of each group.
+    """
+    by: tuple[str, ...]
+    keys: np.ndarray
+    slots: np.ndarray
+    occupied: np.ndarray
+    pallets: np.ndarray
+
+    @property
+    def fill_rate(self) -> np.ndarray:
+        """
+        numpy.ndarray: The share of occupied locations in each group, from 0 to 1.
+        """
+        return self.occupied / np.maximum(self.slots, 1)
+
+    def rows(self) -> list[tuple]:
+        """
+        Returns the groups as rows, eg. for Database.print_rows().
+
+        Returns:
+            list[tuple]: The coordinates, locations, occupied locations and pallets of each group, and the fill
+                         rate as a percentage rounded to one decimal.
+        """
+        rates = np.round(self.fill_rate * 100, 1).tolist()
+        return [(*key, slots, occupied, pallets, rate) for key, slots, occupied, pallets, rate
+                in zip(self.keys.tolist(), self.slots.tolist(), self.occupied.tolist(), self.pallets.tolist(),
+                       rates)]
+
+class Heatmap(NamedTuple):
+    """
+    The fill rate of the locations of a warehouse by two of the DIMENSIONS.
+
+    Attributes:
+        rows (numpy.ndarray): The coordinates of the rows.
+        columns (numpy.ndarray): The coordinates of the columns.
+        fill_rate (numpy.ndarray): The fill rate of each cell from 0 to 1, NaN where there are no locations,
+                                   shape (len(rows), len(columns)).
+    """
+    rows: np.ndarray
+    columns: np.ndarray
+    fill_rate: np.ndarray
+
+class PalletMix(NamedTuple):
+    """
+    The number of pallets of each type in the locations of each warehouse.
+
+    Attributes:
+        warehouses (numpy.ndarray): The IDs of the warehouses in ascending order.
+        counts (numpy.ndarray): The pallets of each type of PALLET_TYPES in each warehouse,
+                                shape (len(warehouses), len(PALLET_TYPES)).
+    """
+    warehouses: np.ndarray
+    counts: np.ndarray
+
+class OccupancySnapshot:
+    """
+    The locations and pallets of a warehouse database in NumPy arrays for occupancy analytics. Thread safe.
+
+    Attributes:
+        last_movement (int): The rowid of the last applied movement of SIIRTOTAPAHTUMA.
+        locations (numpy.ndarray): The IDs of the locations (STunniste), sorted by their coordinates.
+        coordinates (dict[str, numpy.ndarray]): The coordinates of the locations by dimension.
+        pallets_at (numpy.ndarray): The number of pallets in each location.
+    """
+    # The tables the snapshot is built from, besides the movements
+    TABLES = ("SIJAINTI", "LAVA")
+
+    def __init__(self):
+        self.last_movement = 0
+        self.locations = np.empty(0, np.int64)
+        self.coordinates = {dimension: np.empty(0, np.int32) for dimension in DIMENSIONS}
+        self.pallets_at = np.empty(0, np.int32)
+        # The dense code of each coordinate of the locations and the coordinates of the codes
+        self._codes = {dimension: np.empty(0, np.int32) for dimension in DIMENSIONS}
+        self._labels = {dimension: np.empty(0, np.int32) for dimension in DIMENSIONS}
+        # dimensions -> the group of each location and the coordinates of the groups, see _groups()
+        self._grouped = {}
+        # The order of the locations by ID, to find a location by its ID with numpy.searchsorted
+        self._by_id = np.empty(0, np.int64)
+        # The pallets by ID, and their type and location as an index of the location arrays, or -1 if the
+        # pallet is not in a known location
+        self._pallets = np.empty(0, np.int64)
+        self._pallet_types = np.empty(0, np.int8)
+        self._pallet_slots = np.empty(0, np.int32)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, connection: sql.Connection) -> "OccupancySnapshot":
+        """
+        Builds the snapshot from the locations, pallets and movements of a database in one read transaction.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the warehouse database.
+
+        Returns:
+            OccupancySnapshot: The snapshot.
+        """
+        snapshot = cls()
+        snapshot._load(connection)
+        return snapshot
+
+    def _load(self, connection: sql.Connection):
+        began = not connection.in_transaction
+        if began:
+            connection.execute("BEGIN;")
+        try:
+            slots = np.fromiter(connection.execute(
+                "SELECT STunniste, {} FROM SIJAINTI;".format(
+                    ", ".join("IFNULL({}, {})".format(column, FLOOR_UNIT) for column in _COLUMNS))),
+                dtype=[("location", np.int64)] + [(dimension, np.int32) for dimension in DIMENSIONS])
+            pallets = np.fromiter(connection.execute("""
+                SELECT Lavanumero, IFNULL(Sijainti, -1),
+                       CASE UPPER(Tyyppi) {} ELSE 0 END
+                FROM LAVA;
+                """.format(" ".join("WHEN '{}' THEN {}".format(name, code)
+                                    for code, name in enumerate(PALLET_TYPES)))),
+                dtype=[("pallet", np.int64), ("location", np.int64), ("type", np.int8)])
+            last_movement = connection.execute("SELECT IFNULL(MAX(rowid), 0) FROM SIIRTOTAPAHTUMA;").fetchone()[0]
+        finally:
+            if began:
+                connection.rollback()
+        slots = slots[np.lexsort([slots[dimension] for dimension in reversed(DIMENSIONS)])]
+        pallets = pallets[np.argsort(pallets["pallet"], kind="stable")]
+        self.locations = slots["location"].copy()
+        self.coordinates = {dimension: slots[dimension].copy() for dimension in DIMENSIONS}
+        self._codes, self._labels, self._grouped = {}, {}, {}
+        for dimension in DIMENSIONS:
+            self._labels[dimension], codes = np.unique(slots[dimension], return_inverse=True)
+            self._codes[dimension] = codes.astype(np.int32)
+        self._by_id = np.argsort(self.locations, kind="stable")
+        self._pallets = pallets["pallet"].copy()
+        self._pallet_types = pallets["type"].copy()
+        self._pallet_slots = self._slot_indexes(pallets["location"])
+        self.pallets_at = np.bincount(self._pallet_slots[self._pallet_slots >= 0],
+                                      minlength=len(self.locations)).astype(np.int32)
+        self.last_movement = last_movement
+
+    def _slot_indexes(self, locations: np.ndarray) -> np.ndarray:
+        """
+        Finds locations by their IDs.
+
+        Args:
+            locations (numpy.ndarray): The IDs of the locations.
+
+        Returns:
+            numpy.ndarray: The index of each location in the location arrays, or -1 if there is no such location.
+        """
+        sorted_ids = self.locations[self._by_id]
+        if not len(sorted_ids):
+            return np.full(len(locations), -1, np.int32)
+        found = np.minimum(np.searchsorted(sorted_ids, locations), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == locations, self._by_id[found], -1).astype(np.int32)
+
+    def refresh(self, connection: sql.Connection) -> int:
+        """
+        Applies the movements recorded in SIIRTOTAPAHTUMA after the last applied one. If a movement concerns a
+        pallet or a location not in the snapshot, the snapshot is loaded again instead.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the warehouse database.
+
+        Returns:
+            int: The number of applied movements.
+        """
+        with self._lock:
+            rows = np.fromiter(connection.execute(
+                "SELECT rowid, Lavanumero, IFNULL(Sijainti, -1) FROM SIIRTOTAPAHTUMA WHERE rowid > ? "
+                "ORDER BY rowid;", (self.last_movement,)),
+                dtype=[("movement", np.int64), ("pallet", np.int64), ("location", np.int64)])
+            if not len(rows):
+                return 0
+            # Only the last movement of each pallet decides where it is
+            _, last = np.unique(rows["pallet"][::-1], return_index=True)
+            moved = rows[len(rows) - 1 - last]
+            pallets = np.minimum(np.searchsorted(self._pallets, moved["pallet"]), len(self._pallets) - 1)
+            slots = self._slot_indexes(moved["location"])
+            known = len(self._pallets) > 0 and np.all(self._pallets[pallets] == moved["pallet"])
+            if not known or np.any((slots < 0) & (moved["location"] >= 0)):
+                self._load(connection)
+                return len(rows)
+            previous = self._pallet_slots[pallets]
+            np.subtract.at(self.pallets_at, previous[previous >= 0], 1)
+            np.add.at(self.pallets_at, slots[slots >= 0], 1)
+            self._pallet_slots[pallets] = slots
+            self.last_movement = int(rows["movement"][-1])
+            return len(rows)
+
+    def _check_dimensions(self, dimensions: Sequence[str]):
+        for dimension in dimensions:
+            if dimension not in DIMENSIONS:
+                raise ValueError("Tuntematon ulottuvuus '{}'.".format(dimension))
+
+    def occupancy(self, by: Sequence[str]=("warehouse",), warehouse: int|None=None) -> Occupancy:
+        """
+        Counts the locations, the occupied locations and the pallets by some of the DIMENSIONS.
+
+        Args:
+            by (Sequence[str], optional): The dimensions to group by, eg. ("warehouse", "aisle", "floor") for the
+                                          fill rate per aisle and floor. Defaults to ("warehouse",).
+            warehouse (int|None, optional): Only count the locations of this warehouse. Defaults to None.
+
+        Returns:
+            Occupancy: The counts of the groups that have locations.
+
+        Raises:
+            ValueError: If a dimension is unknown.
+        """
+        by = tuple(by)
+        self._check_dimensions(by)
+        with self._lock:
+            key, keys = self._groups(by)
+            pallets_at = self.pallets_at
+            if warehouse is not None:
+                selected = self.coordinates["warehouse"] == warehouse
+                key, pallets_at = key[selected], pallets_at[selected]
+            slots = np.bincount(key, minlength=len(keys))
+            occupied = np.bincount(key, weights=pallets_at > 0, minlength=len(keys)).astype(np.int64)
+            pallets = np.bincount(key, weights=pallets_at, minlength=len(keys)).astype(np.int64)
+        present = slots > 0
+        return Occupancy(by, keys[present], slots[present], occupied[present], pallets[present])
+
+    def _groups(self, by: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Numbers the groups of the locations by some of the DIMENSIONS. The numbering only changes when the
+        snapshot is loaded again, so it is cached.
+
+        Args:
+            by (tuple[str, ...]): The dimensions.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The group of each location, and the coordinates of the groups in
+                                                 ascending order, shape (groups, len(by)).
+        """
+        cached = self._grouped.get(by)
+        if cached is not None:
+            return cached
+        shape = tuple(len(self._labels[dimension]) for dimension in by)
+        size = np.prod(shape, dtype=np.float64)
+        if size <= max(_MIN_DENSE_GROUPS, _DENSE_GROUPS_PER_LOCATION * len(self.locations)):
+            # The codes are combined into one integer and the combinations in use numbered without sorting
+            key = np.zeros(len(self.locations), np.int64)
+            for dimension, length in zip(by, shape):
+                key *= length
+                key += self._codes[dimension]
+            present = np.bincount(key, minlength=int(size)) > 0
+            key = (np.cumsum(present) - 1)[key]
+            codes = np.unravel_index(np.flatnonzero(present), shape)
+        else:
+            unique, key = np.unique(np.stack([self._codes[dimension] for dimension in by], axis=1), axis=0,
+                                    return_inverse=True)
+            key = key.reshape(-1)
+            codes = tuple(unique.T)
+        keys = np.stack([self._labels[dimension][code] for dimension, code in zip(by, codes)], axis=1) \
+            if by else np.empty((min(len(self.locations), 1), 0), np.int32)
+        self._grouped[by] = key, keys
+        return key, keys
+
+    def heatmap(self, warehouse: int, rows: str="aisle", columns: str="floor") -> Heatmap:
+        """
+        Returns the fill rate of the locations of a warehouse by two dimensions, eg. per aisle and floor.
+
+        Args:
+            warehouse (int): The ID of the warehouse.
+            rows (str, optional): The dimension of the rows. Defaults to "aisle".
+            columns (str, optional): The dimension of the columns. Defaults to "floor".
+
+        Returns:
+            Heatmap: The fill rates.
+
+        Raises:
+            ValueError: If a dimension is unknown.
+        """
+        occupancy = self.occupancy((rows, columns), warehouse)
+        row_labels = np.unique(occupancy.keys[:, 0])
+        column_labels = np.unique(occupancy.keys[:, 1])
+        values = np.full((len(row_labels), len(column_labels)), np.nan)
+        values[np.searchsorted(row_labels, occupancy.keys[:, 0]),
+               np.searchsorted(column_labels, occupancy.keys[:, 1])] = occupancy.fill_rate
+        return Heatmap(row_labels, column_labels, values)
+
+    def empty(self, by: Sequence[str]=("warehouse", "aisle", "section"), warehouse: int|None=None) -> np.ndarray:
+        """
+        Returns the groups of locations that hold no pallets, eg. the empty sections. The floor units of a
+        warehouse form a group of their own, with FLOOR_UNIT as their aisle, section and floor.
+
+        Args:
+            by (Sequence[str], optional): The dimensions to group by.
+                                          Defaults to ("warehouse", "aisle", "section").
+            warehouse (int|None, optional): Only look at the locations of this warehouse. Defaults to None.
+
+        Returns:
+            numpy.ndarray: The coordinates of the empty groups, shape (groups, len(by)).
+
+        Raises:
+            ValueError: If a dimension is unknown.
+        """
+        occupancy = self.occupancy(by, warehouse)
+        return occupancy.keys[occupancy.occupied == 0]
+
+    def pallet_mix(self) -> PalletMix:
+        """
+        Counts the pallets of each type in the locations of each warehouse. Pallets outside the locations are
+        not counted.
+
+        Returns:
+            PalletMix: The counts.
+        """
+        with self._lock:
+            placed = self._pallet_slots >= 0
+            codes = self._codes["warehouse"][self._pallet_slots[placed]].astype(np.int64)
+            labels = self._labels["warehouse"]
+            counts = np.bincount(codes * len(PALLET_TYPES) + self._pallet_types[placed],
+                                 minlength=len(labels) * len(PALLET_TYPES)).reshape(len(labels), len(PALLET_TYPES))
+        return PalletMix(labels.copy(), counts)
@@ -0,0 +1,150 @@
+"""
+Archive of the movement history. Movements older than the retention period are moved from SIIRTOTAPAHTUMA
+to an archive database next to the warehouse database (eg. varasto_arkisto.db), so that the views showing
+the current state only read the recent history. The archive is attached to a connection as "arkisto" and the
+temporary view SIIRTOHISTORIA shows the whole history for audits. The rollups in varastoskeema.ROLLUPS cover
+the archived movements too.
+
+The archiving can be run from the command line, eg. once a night:
+    python varastoarkisto.py varasto.db [--days N] [--archive PATH]
+"""
+import argparse
+import datetime
+import os
+import sqlite3 as sql
+
+# Days of movement history kept in the warehouse database by default
+RETENTION_DAYS = 365
+
+# The name of the attached archive database
+SCHEMA = "arkisto"
+
+# The archive has the columns and key of SIIRTOTAPAHTUMA, and an index for the history of a pallet
+ARCHIVE = (
+    """
+    CREATE TABLE IF NOT EXISTS {0}.SIIRTOARKISTO
+        (Siirto_ID INTEGER PRIMARY KEY,
+         Siirtoaika VARCHAR(26) NOT NULL,
+         Lavanumero INTEGER NOT NULL,
+         Sijainti INTEGER NOT NULL );
+    """.format(SCHEMA),
+    "CREATE INDEX IF NOT EXISTS {0}.SIIRTOARKISTOLAVAIX ON SIIRTOARKISTO(Lavanumero, Siirtoaika);".format(SCHEMA),
+)
+# The whole movement history of the connection, recent and archived
+HISTORY_VIEW = """
+    CREATE TEMP VIEW IF NOT EXISTS SIIRTOHISTORIA AS
+    SELECT Siirto_ID, Siirtoaika, Lavanumero, Sijainti FROM main.SIIRTOTAPAHTUMA
+    UNION ALL
+    SELECT Siirto_ID, Siirtoaika, Lavanumero, Sijainti FROM {0}.SIIRTOARKISTO;
+    """.format(SCHEMA)
+
+def archive_path(db_path: str) -> str:
+    """
+    Returns the default path of the archive of a database.
+
+    Args:
+        db_path (str): The path to the warehouse database (eg. varasto.db).
+
+    Returns:
+        str: The path to the archive (eg. varasto_arkisto.db).
+    """
+    root, extension = os.path.splitext(db_path)
+    return "{}_arkisto{}".format(root, extension or ".db")
+
+def attach(connection: sql.Connection, path: str):
+    """
+    Attaches the archive to a connection, creating it if needed, and creates the history view. Does nothing
+    if the archive is already attached. Must not be called inside a transaction.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        path (str): The path to the archive.
+
+    Returns:
+        None
+    """
+    attached = [row[1] for row in connection.execute("PRAGMA database_list;")]
+    if SCHEMA in attached:
+        return
+    connection.execute("ATTACH DATABASE ? AS {};".format(SCHEMA), (path,))
+    for statement in ARCHIVE:
+        connection.execute(statement)
+    connection.execute(HISTORY_VIEW)
+    connection.commit()
+
+def cutoff(retention_days: int, now: datetime.datetime|None=None) -> str:
+    """
+    Returns the time before which movements are archived.
+
+    Args:
+        retention_days (int): Days of history to keep.
+        now (datetime.datetime|None, optional): The current time. Defaults to None for datetime.now().
+
+    Returns:
+        str: The time in the format of Siirtoaika.
+    """
+    if retention_days < 0:
+        raise ValueError("Säilytysajan on oltava vähintään 0 päivää.")
+    now = datetime.datetime.now() if now is None else now
+    return (now - datetime.timedelta(days=retention_days)).isoformat(" ", "seconds")
+
+def archive(connection: sql.Connection, path: str, retention_days: int=RETENTION_DAYS,
+            now: datetime.datetime|None=None) -> int:
+    """
+    Moves the movements older than the retention period to the archive in one transaction. Movements that
+    are already in the archive are not copied twice, so an interrupted run can simply be repeated. The
+    movements must have the Siirto_ID of varastoskeema.MOVEMENTS, see varastoskeema.upgrade().
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        path (str): The path to the archive.
+        retention_days (int, optional): Days of history to keep. Defaults to RETENTION_DAYS.
+        now (datetime.datetime|None, optional): The current time. Defaults to None for datetime.now().
+
+    Returns:
+        int: The number of archived movements.
+
+    Raises:
+        ValueError: If the retention period is negative or the movements have no Siirto_ID.
+    """
+    before = cutoff(retention_days, now)
+    columns = [row[1] for row in connection.execute("PRAGMA table_xinfo(SIIRTOTAPAHTUMA);")]
+    if "Siirto_ID" not in columns:
+        raise ValueError("Siirtotapahtumilla ei ole tunnisteita. Päivitä tietokanta komennolla "
+                         "create_db.py --upgrade.")
+    attach(connection, path)
+    try:
+        connection.execute("BEGIN IMMEDIATE;")
+        connection.execute("""
+                           INSERT OR IGNORE INTO {}.SIIRTOARKISTO (Siirto_ID, Siirtoaika, Lavanumero, Sijainti)
+                           SELECT Siirto_ID, Siirtoaika, Lavanumero, Sijainti FROM main.SIIRTOTAPAHTUMA
+                           WHERE Siirtoaika < ?;
+                           """.format(SCHEMA), (before,))
+        count = connection.execute("DELETE FROM main.SIIRTOTAPAHTUMA WHERE Siirtoaika < ?;", (before,)).rowcount
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return count
+
+def main(args: list[str]|None=None):
+    parser = argparse.ArgumentParser(description="Siirtää vanhat siirtotapahtumat arkistotietokantaan.")
+    parser.add_argument("db", help="Varastotietokanta.")
+    parser.add_argument("-d", "--days", type=int, default=RETENTION_DAYS,
+                        help="Tietokantaan jätettävän siirtohistorian pituus päivinä (oletus {}).".format(RETENTION_DAYS))
+    parser.add_argument("-a", "--archive", default=None, help="Arkistotietokanta (oletus <tietokanta>_arkisto.db).")
+    options = parser.parse_args(args)
+
+    path = options.archive or archive_path(options.db)
+    connection = sql.connect(options.db)
+    try:
+        count = archive(connection, path, options.days)
+    except ValueError as error:
+        print("Virhe: {}".format(error))
+        return
+    finally:
+        connection.close()
+    print("Arkistoitu {} siirtotapahtumaa tiedostoon {}.".format(count, path))
+
+if __name__ == "__main__":
+    main()
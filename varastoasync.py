@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from typing import Iterable
+import varastologiikka as vl
+import varastomittaus
+
+class _Job:
+    """
+    A single Database call run on an executor thread. Remembers the connection while the call runs, so that
+    a cancelled call can be interrupted without touching a connection that has moved on to another call.
+
+    Args:
+        db (vl.Database): The database to call.
+        name (str): The name of the Database method.
+        args (tuple): Positional arguments of the method.
+        kwargs (dict): Keyword arguments of the method.
+    """
+    def __init__(self, db: vl.Database, name: str, args: tuple, kwargs: dict):
+        self.db = db
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self._connection = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def run(self):
+        # The pool hands the same connection to the nested contexts of the method in this thread
+        with self.db._conn as connection:
+            with self._lock:
+                if self._cancelled:
+                    raise concurrent.futures.CancelledError()
+                self._connection = connection
+            try:
+                return getattr(self.db, self.name)(*self.args, **self.kwargs)
+            finally:
+                with self._lock:
+                    self._connection = None
+
+    def interrupt(self):
+        with self._lock:
+            self._cancelled = True
+            if self._connection is not None:
+                self._connection.interrupt()
+
+class AsyncDatabase:
+    """
+    An asyncio facade for Database. The operations run as coroutines on threads so that they do not block
+    the event loop: writes one at a time on a dedicated writer thread and reads in parallel on a pool of
+    reader threads. Both use the concurrency mode of Database, so reads are not blocked by the writer.
+
+    A call that is cancelled or times out is interrupted with sqlite3.Connection.interrupt(), which stops the
+    running statement and rolls back an unfinished write. A call still waiting for a thread is not run at all.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        readers (int, optional): The number of reader threads. Defaults to 4.
+        pragmas (dict|None, optional): Pragma names and values to apply to every connection. Defaults to None.
+        timeout (float|None, optional): The default timeout of every call in seconds, or None for no timeout.
+                                        Defaults to None.
+        metrics (varastomittaus.Metrics|None, optional): Metrics shared by the reader and writer connections,
+                                                         or None not to collect them. Defaults to None.
+
+    Methods:
+        get_table(), location_is_free(), free_locations(), recommend_locations(), pick_fefo(),
+        expiring_batches(), stock_by_group(), check_summaries(), occupancy(), location_id(), search(),
+        search_and_print(), query(): Read operations, run on the reader threads.
+        move_pallet(), move_pallets(), add_entry(), delete_entry(): Write operations, run on the writer thread.
+        close(): Waits for the running calls and closes the connections.
+
+    Every operation takes the arguments of the Database method of the same name and an optional timeout
+    keyword argument overriding the default timeout.
+    """
+    def __init__(self, db_path: str, readers: int=4, pragmas: dict|None=None, timeout: float|None=None,
+                 metrics: varastomittaus.Metrics|None=None):
+        self.timeout = timeout
+        self.metrics = metrics
+        self._reader = vl.Database(db_path, pool_size=readers, pragmas=pragmas, concurrent=True, metrics=metrics)
+        self._writer = vl.Database(db_path, pool_size=1, pragmas=pragmas, concurrent=True, metrics=metrics)
+        self._read_executor = concurrent.futures.ThreadPoolExecutor(readers, thread_name_prefix="varasto-lukija")
+        self._write_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="varasto-kirjoittaja")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Waits for the running calls to finish and closes the threads and connections.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._read_executor.shutdown, cancel_futures=True))
+        await loop.run_in_executor(None, functools.partial(self._write_executor.shutdown, cancel_futures=True))
+        self._reader.close()
+        self._writer.close()
+
+    async def _call(self, write: bool, name: str, *args, timeout: float|None=None, **kwargs):
+        """
+        Runs a Database method on the writer or a reader thread.
+
+        Args:
+            write (bool): Whether the method writes to the database.
+            name (str): The name of the method.
+            *args: Positional arguments of the method.
+            timeout (float|None, optional): Seconds to wait, or None to use the default timeout.
+            **kwargs: Keyword arguments of the method.
+
+        Returns:
+            Any: The return value of the method.
+
+        Raises:
+            asyncio.TimeoutError: If the call did not finish in time.
+            asyncio.CancelledError: If the awaiting task was cancelled.
+        """
+        if write:
+            job, executor = _Job(self._writer, name, args, kwargs), self._write_executor
+        else:
+            job, executor = _Job(self._reader, name, args, kwargs), self._read_executor
+        future = asyncio.get_running_loop().run_in_executor(executor, job.run)
+        try:
+            return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            job.interrupt()
+            raise
+
+    async def get_table(self, table_name: str, *args, timeout: float|None=None, **kwargs) -> list:
+        return await self._call(False, "get_table", table_name, *args, timeout=timeout, **kwargs)
+
+    async def location_is_free(self, location: int, timeout: float|None=None) -> int|None:
+        return await self._call(False, "location_is_free", location, timeout=timeout)
+
+    async def free_locations(self, warehouse: int, count: int=10, timeout: float|None=None) -> list[tuple[int, str]]:
+        return await self._call(False, "free_locations", warehouse, count, timeout=timeout)
+
+    async def recommend_locations(self, warehouse: int, pallet: int|None=None, count: int=5,
+                                  timeout: float|None=None) -> list:
+        return await self._call(False, "recommend_locations", warehouse, pallet, count, timeout=timeout)
+
+    async def pick_fefo(self, product: int, quantity: int, *args, timeout: float|None=None, **kwargs) -> list:
+        return await self._call(False, "pick_fefo", product, quantity, *args, timeout=timeout, **kwargs)
+
+    async def expiring_batches(self, days: int, *args, timeout: float|None=None, **kwargs) -> list:
+        return await self._call(False, "expiring_batches", days, *args, timeout=timeout, **kwargs)
+
+    async def stock_by_group(self, warehouse: int|None=None, timeout: float|None=None) -> list:
+        return await self._call(False, "stock_by_group", warehouse, timeout=timeout)
+
+    async def check_summaries(self, timeout: float|None=None) -> dict:
+        return await self._call(False, "check_summaries", timeout=timeout)
+
+    async def occupancy(self, by: tuple[str, ...]=("warehouse",), warehouse: int|None=None,
+                        timeout: float|None=None):
+        return await self._call(False, "occupancy", by, warehouse, timeout=timeout)
+
+    async def location_id(self, location: str, warehouse: int|str, timeout: float|None=None) -> int|None:
+        return await self._call(False, "location_id", location, warehouse, timeout=timeout)
+
+    async def search(self, table_name: str, search_term: str, *args, timeout: float|None=None, **kwargs) -> list:
+        return await self._call(False, "search", table_name, search_term, *args, timeout=timeout, **kwargs)
+
+    async def search_and_print(self, table_name: str, search_term: str, *args, timeout: float|None=None,
+                               **kwargs):
+        return await self._call(False, "search_and_print", table_name, search_term, *args, timeout=timeout,
+                                **kwargs)
+
+    async def query(self, query: str, params: dict|tuple=(), timeout: float|None=None) -> list:
+        """
+        Runs a read-only query on a reader thread.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (tuple|dict, optional): The parameters to use in the query. Defaults to ().
+            timeout (float|None, optional): Seconds to wait, or None to use the default timeout.
+
+        Returns:
+            list: The result set of the query.
+        """
+        return await self._call(False, "_query", query, params, timeout=timeout)
+
+    async def move_pallet(self, pallet: int, move_to: int, timeout: float|None=None):
+        return await self._call(True, "move_pallet", pallet, move_to, timeout=timeout)
+
+    async def move_pallets(self, moves: Iterable[tuple[int, int]], check_occupancy: bool=True,
+                           timeout: float|None=None) -> list[vl.MoveResult]:
+        # Materialized here, as a generator must not be consumed on another thread
+        return await self._call(True, "move_pallets", list(moves), check_occupancy, timeout=timeout)
+
+    async def add_entry(self, table_name: str, values: tuple, timeout: float|None=None):
+        return await self._call(True, "add_entry", table_name, values, timeout=timeout)
+
+    async def delete_entry(self, table_name: str, key: str, value: str, timeout: float|None=None):
+        return await self._call(True, "delete_entry", table_name, key, value, timeout=timeout)
@@ -0,0 +1,511 @@
+"""
+Builds the SQL statements of Database from table and column names checked against a catalog of the schema.
+Values are always bound as parameters, so the statement texts depend only on the tables and columns used and
+the prepared statements cached by sqlite3 are reused.
+"""
+import collections
+import re
+import sqlite3 as sql
+from typing import NamedTuple, Sequence
+
+# Comparison operators and logical operators allowed in WHERE clauses
+COMPARATORS = ("=", "==", "!=", "<>", "<", "<=", ">", ">=", "LIKE", "GLOB", "IS", "IS NOT")
+LOGICALS = ("AND", "OR")
+
+# Column affinities compared with = instead of LIKE when searching for a number
+NUMERIC_AFFINITIES = ("INTEGER", "REAL", "NUMERIC")
+
+# Names that may be written without quotes, unless they are keywords
+_PLAIN_NAME = re.compile(r"[^\W\d]\w*")
+
+# Keywords of SQLite, quoted when used as names
+KEYWORDS = frozenset("""
+ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH AUTOINCREMENT BEFORE BEGIN BETWEEN BY
+CASCADE CASE CAST CHECK COLLATE COLUMN COMMIT CONFLICT CONSTRAINT CREATE CROSS CURRENT CURRENT_DATE
+CURRENT_TIME CURRENT_TIMESTAMP DATABASE DEFAULT DEFERRABLE DEFERRED DELETE DESC DETACH DISTINCT DO DROP EACH
+ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE EXISTS EXPLAIN FAIL FILTER FIRST FOLLOWING FOR FOREIGN FROM FULL
+GENERATED GLOB GROUP GROUPS HAVING IF IGNORE IMMEDIATE IN INDEX INDEXED INITIALLY INNER INSERT INSTEAD
+INTERSECT INTO IS ISNULL JOIN KEY LAST LEFT LIKE LIMIT MATCH MATERIALIZED NATURAL NO NOT NOTHING NOTNULL
+NULL NULLS OF OFFSET ON OR ORDER OTHERS OUTER OVER PARTITION PLAN PRAGMA PRECEDING PRIMARY QUERY RAISE RANGE
+RECURSIVE REFERENCES REGEXP REINDEX RELEASE RENAME REPLACE RESTRICT RETURNING RIGHT ROLLBACK ROW ROWS
+SAVEPOINT SELECT SET TABLE TEMP TEMPORARY THEN TIES TO TRANSACTION TRIGGER UNBOUNDED UNION UNIQUE UPDATE
+USING VACUUM VALUES VIEW VIRTUAL WHEN WHERE WINDOW WITH WITHOUT""".split())
+
+class Column(NamedTuple):
+    """
+    A column of a table or view.
+
+    Attributes:
+        name (str): The name as declared.
+        type (str): The declared type, "" if there is none (eg. an expression in a view).
+        affinity (str): The type affinity of the column: INTEGER, TEXT, BLOB, REAL or NUMERIC.
+        pk (int): The position of the column in the primary key starting from 1, or 0 if not in it.
+        generated (bool): Whether the column is generated, so that no value is inserted into it.
+    """
+    name: str
+    type: str = ""
+    affinity: str = "BLOB"
+    pk: int = 0
+    generated: bool = False
+
+class ForeignKey(NamedTuple):
+    """
+    A foreign key of a table.
+
+    Attributes:
+        columns (tuple[str, ...]): The referencing columns.
+        table (str): The referenced table.
+        references (tuple[str, ...]): The referenced columns.
+    """
+    columns: tuple[str, ...]
+    table: str
+    references: tuple[str, ...]
+
+def affinity(declared_type: str) -> str:
+    """
+    Returns the type affinity SQLite gives to a column with the given declared type.
+
+    Args:
+        declared_type (str): The declared type (eg. "VARCHAR(50)").
+
+    Returns:
+        str: INTEGER, TEXT, BLOB, REAL or NUMERIC.
+    """
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if "BLOB" in declared_type or not declared_type:
+        return "BLOB"
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+class SchemaCatalog:
+    """
+    The tables and views of a database with their columns and keys, loaded once so that identifiers and
+    types can be checked without querying the database.
+
+    Args:
+        relations (dict[str, Sequence[Column]]): Table and view names mapped to their columns.
+        foreign_keys (dict[str, Sequence[ForeignKey]]|None, optional): Table names mapped to their foreign
+                                                                       keys. Defaults to None.
+        version (int|None, optional): The schema_version of the database the catalog was loaded from.
+                                      Defaults to None.
+
+    Methods:
+        load(connection): Loads the catalog of a database.
+        relation(name): Returns the name of a table or view as declared in the schema.
+        columns(relation): Returns the columns of a table or view.
+        column(relation, name): Returns the name of a column as declared in the schema.
+        column_info(relation, name): Returns a column of a table or view.
+        primary_key(relation): Returns the primary key columns of a table.
+        foreign_keys(relation): Returns the foreign keys of a table.
+        convert(relation, name, value): Converts a value for a column.
+        sql_name(name): Returns a declared name as written in SQL statements.
+    """
+    def __init__(self, relations: dict[str, Sequence[Column]],
+                 foreign_keys: dict[str, Sequence[ForeignKey]]|None=None, version: int|None=None):
+        self.version = version
+        # Names are matched case-insensitively like in SQL
+        self._relations = {name.upper(): (name, tuple(columns)) for name, columns in relations.items()}
+        self._columns = {name.upper(): {column.name.upper(): column for column in columns}
+                         for name, columns in relations.items()}
+        self._foreign_keys = {name.upper(): tuple(keys) for name, keys in (foreign_keys or {}).items()}
+
+    @classmethod
+    def load(cls, connection: sql.Connection) -> "SchemaCatalog":
+        """
+        Loads the tables and views of a database with their columns, including generated columns, and keys.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the database.
+
+        Returns:
+            SchemaCatalog: The catalog.
+        """
+        version = connection.execute("PRAGMA schema_version").fetchone()[0]
+        names = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'")]
+        relations, foreign_keys = {}, {}
+        for name in names:
+            # Hidden columns of virtual tables (hidden = 1) are left out, generated columns (2 and 3) are kept
+            relations[name] = [Column(column, declared_type, affinity(declared_type), pk, hidden > 1)
+                               for column, declared_type, pk, hidden in connection.execute(
+                                   "SELECT name, type, pk, hidden FROM pragma_table_xinfo(?) WHERE hidden != 1 "
+                                   "ORDER BY cid", (name,))]
+            keys = collections.defaultdict(list)
+            for key, column, table, reference in connection.execute(
+                    'SELECT id, "from", "table", "to" FROM pragma_foreign_key_list(?) ORDER BY id, seq', (name,)):
+                keys[key].append((column, table, reference))
+            foreign_keys[name] = [ForeignKey(tuple(column for column, _, _ in key), key[0][1],
+                                             tuple(reference for _, _, reference in key))
+                                  for key in keys.values()]
+        return cls(relations, foreign_keys, version)
+
+    def relation(self, name: str) -> str:
+        """
+        Returns the name of a table or view as declared in the schema.
+
+        Args:
+            name (str): The name in any case.
+
+        Returns:
+            str: The declared name.
+
+        Raises:
+            ValueError: If there is no such table or view.
+        """
+        try:
+            return self._relations[name.strip().upper()][0]
+        except KeyError:
+            raise ValueError("Taulua tai näkymää '{}' ei ole olemassa.".format(name)) from None
+
+    def columns(self, relation: str) -> tuple[Column, ...]:
+        """
+        Returns the columns of a table or view.
+
+        Args:
+            relation (str): The name of the table or view.
+
+        Returns:
+            tuple[Column, ...]: The columns in order.
+
+        Raises:
+            ValueError: If there is no such table or view.
+        """
+        return self._relations[self.relation(relation).upper()][1]
+
+    def column(self, relation: str, name: str) -> str:
+        """
+        Returns the name of a column as declared in the schema. The rowid of tables is accepted as well.
+
+        Args:
+            relation (str): The name of the table or view.
+            name (str): The name of the column in any case.
+
+        Returns:
+            str: The declared name.
+
+        Raises:
+            ValueError: If there is no such table, view or column.
+        """
+        return self.column_info(relation, name).name
+
+    def column_info(self, relation: str, name: str) -> Column:
+        """
+        Returns a column of a table or view. The rowid of tables is accepted as well.
+
+        Args:
+            relation (str): The name of the table or view.
+            name (str): The name of the column in any case.
+
+        Returns:
+            Column: The column.
+
+        Raises:
+            ValueError: If there is no such table, view or column.
+        """
+        columns = self._columns[self.relation(relation).upper()]
+        name = name.strip()
+        if name.upper() in columns:
+            return columns[name.upper()]
+        if name.lower() == "rowid":
+            return Column("rowid", "INTEGER", "INTEGER")
+        raise ValueError("Saraketta '{}' ei ole taulussa {}.".format(name, self.relation(relation)))
+
+    def primary_key(self, relation: str) -> tuple[str, ...]:
+        """
+        Returns the primary key columns of a table.
+
+        Args:
+            relation (str): The name of the table.
+
+        Returns:
+            tuple[str, ...]: The columns in key order, empty for views and tables keyed by rowid only.
+        """
+        return tuple(column.name for column in sorted(self.columns(relation), key=lambda column: column.pk)
+                     if column.pk)
+
+    def foreign_keys(self, relation: str) -> tuple[ForeignKey, ...]:
+        """
+        Returns the foreign keys of a table.
+
+        Args:
+            relation (str): The name of the table.
+
+        Returns:
+            tuple[ForeignKey, ...]: The foreign keys, empty for views.
+        """
+        return self._foreign_keys.get(self.relation(relation).upper(), ())
+
+    def convert(self, relation: str, name: str, value):
+        """
+        Converts a value for a column by its affinity, so that eg. a number typed into the UI is stored and
+        compared as a number. Decimal commas are accepted. An empty string is NULL in a numeric column.
+
+        Args:
+            relation (str): The name of the table or view.
+            name (str): The name of the column.
+            value (Any): The value.
+
+        Returns:
+            Any: The converted value.
+
+        Raises:
+            ValueError: If the value is text that is not a number and the column is numeric.
+        """
+        return self.converter(relation, name)(value)
+
+    def converter(self, relation: str, name: str):
+        """
+        Returns the conversion of convert() for a column as a function, so that many values can be converted
+        without looking up the column for each.
+
+        Args:
+            relation (str): The name of the table or view.
+            name (str): The name of the column.
+
+        Returns:
+            Callable[[Any], Any]: The conversion.
+        """
+        column = self.column_info(relation, name)
+        if column.affinity not in NUMERIC_AFFINITIES:
+            return lambda value: value
+        def convert(value):
+            if not isinstance(value, str):
+                return value
+            text = value.strip()
+            if not text:
+                return None
+            try:
+                return int(text)
+            except ValueError:
+                pass
+            try:
+                number = float(text.replace(",", "."))
+            except ValueError:
+                raise ValueError("Arvo '{}' ei ole luku, sarake {} on tyyppiä {}.".format(
+                    value, column.name, column.type)) from None
+            return int(number) if column.affinity == "INTEGER" and number.is_integer() else number
+        return convert
+
+    def sql_name(self, name: str) -> str:
+        """
+        Returns a declared name as written in SQL statements: plain names as they are, so that statements
+        match the ones written by hand, and other names and keywords quoted.
+
+        Args:
+            name (str): The declared name.
+
+        Returns:
+            str: The name for SQL (eg. ERÄ or "Hyllyväli 1").
+        """
+        if _PLAIN_NAME.fullmatch(name) and name.upper() not in KEYWORDS:
+            return name
+        return quote(name)
+
+def quote(identifier: str) -> str:
+    """
+    Quotes an identifier for SQL.
+
+    Args:
+        identifier (str): The identifier (eg. ERÄ).
+
+    Returns:
+        str: The quoted identifier (eg. "ERÄ").
+    """
+    return '"{}"'.format(identifier.replace('"', '""'))
+
+class QueryBuilder:
+    """
+    Builds SQL statements from table and column names checked against a schema catalog. Every value is
+    left as a placeholder to bind, and names are written as declared, so equal requests give equal texts.
+
+    Args:
+        catalog (SchemaCatalog): The catalog to check the names against.
+
+    Raises:
+        ValueError: From every method, if a name is not in the catalog or an operator is not allowed.
+    """
+    def __init__(self, catalog: SchemaCatalog):
+        self.catalog = catalog
+
+    def relation(self, name: str) -> str:
+        """
+        Returns the quoted name of a table or view.
+
+        Args:
+            name (str): The name in any case.
+
+        Returns:
+            str: The name as declared, quoted if needed.
+        """
+        return self.catalog.sql_name(self.catalog.relation(name))
+
+    def column(self, relation: str, name: str) -> str:
+        """
+        Returns the quoted name of a column of a table or view.
+
+        Args:
+            relation (str): The name of the table or view.
+            name (str): The name of the column in any case.
+
+        Returns:
+            str: The name as declared, quoted if needed.
+        """
+        return self.catalog.sql_name(self.catalog.column(relation, name))
+
+    def select_list(self, relation: str, select: str|Sequence[str]="*") -> str:
+        """
+        Builds the column list of a SELECT statement.
+
+        Args:
+            relation (str): The table or view selected from.
+            select (str|Sequence[str], optional): "*", column names separated by commas or a sequence of column
+                                                  names. Defaults to "*".
+
+        Returns:
+            str: The column list (eg. "Lavanumero, Sijainti").
+        """
+        if isinstance(select, str):
+            if select.strip() == "*":
+                return "*"
+            select = select.split(",")
+        return ", ".join(self.column(relation, column) for column in select)
+
+    def where(self, relation: str, columns: Sequence[str], comparators: Sequence[str],
+              logicals: Sequence[str]=()) -> str:
+        """
+        Builds the conditions of a WHERE clause comparing columns to placeholders.
+
+        Args:
+            relation (str): The table or view the columns belong to.
+            columns (Sequence[str]): The compared columns.
+            comparators (Sequence[str]): The operator of each comparison (eg. "=" or "LIKE").
+            logicals (Sequence[str], optional): The operators between the comparisons, one less than there are
+                                                comparisons (eg. "AND"). Defaults to ().
+
+        Returns:
+            str: The conditions (eg. "(Lavanumero = ?) AND (Tyyppi = ?)").
+        """
+        if len(columns) != len(comparators) or len(logicals) != len(columns) - 1:
+            raise ValueError("Vertailuja, vertailuoperaattoreita ja loogisia operaattoreita on väärä määrä.")
+        comparators = [comparator.strip().upper() for comparator in comparators]
+        logicals = [logical.strip().upper() for logical in logicals]
+        for operator in comparators:
+            if operator not in COMPARATORS:
+                raise ValueError("Vertailuoperaattori '{}' ei ole sallittu.".format(operator))
+        for operator in logicals:
+            if operator not in LOGICALS:
+                raise ValueError("Looginen operaattori '{}' ei ole sallittu.".format(operator))
+        conditions = ["({} {} ?)".format(self.column(relation, column), comparator)
+                      for column, comparator in zip(columns, comparators)]
+        where = conditions[0] if conditions else ""
+        for logical, condition in zip(logicals, conditions[1:]):
+            where += " {} {}".format(logical, condition)
+        return where
+
+    def select(self, relation: str, select: str|Sequence[str]="*", where: str="") -> str:
+        """
+        Builds a SELECT statement.
+
+        Args:
+            relation (str): The table or view to select from.
+            select (str|Sequence[str], optional): The columns to select, see select_list(). Defaults to "*".
+            where (str, optional): Conditions built with where(), or "" to select every row. Defaults to "".
+
+        Returns:
+            str: The statement.
+        """
+        query = "SELECT {} FROM {}".format(self.select_list(relation, select), self.relation(relation))
+        return query + " WHERE " + where if where else query
+
+    def search(self, relation: str, select: str|Sequence[str]="*", search_term: str="") -> tuple[str, dict]:
+        """
+        Builds a statement matching a search term against every column of a table or view by the column
+        affinities. Text columns are matched with LIKE. Numeric columns are compared with = when the term is
+        a number, left out when the term has no digits and so cannot be part of a number, and matched with
+        LIKE otherwise. Terms of the same kind give the same statement text.
+
+        Args:
+            relation (str): The table or view to search in.
+            select (str|Sequence[str], optional): The columns to select, see select_list(). Defaults to "*".
+            search_term (str, optional): The search term. Defaults to "".
+
+        Returns:
+            tuple[str, dict]: The statement and its parameters.
+        """
+        search_term = search_term.strip()
+        numeric = search_term.isdecimal()
+        digits = any(character.isdigit() for character in search_term)
+        conditions = []
+        for column in self.catalog.columns(relation):
+            if column.affinity in NUMERIC_AFFINITIES and numeric:
+                conditions.append("({} = :luku)".format(self.catalog.sql_name(column.name)))
+            elif column.affinity not in NUMERIC_AFFINITIES or digits:
+                conditions.append("({} LIKE :haku ESCAPE '\\')".format(self.catalog.sql_name(column.name)))
+        pattern = "%{}%".format(search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+        return (self.select(relation, select, " OR ".join(conditions) or "0"),
+                {"haku": pattern, "luku": int(search_term) if numeric else None})
+
+    def insert(self, relation: str, count: int, columns: Sequence[str]|None=None) -> str:
+        """
+        Builds an INSERT statement for a whole row, or for the given columns so that the rest get their
+        defaults. Generated columns get no value.
+
+        Args:
+            relation (str): The table to insert into.
+            count (int): The number of values in the row.
+            columns (Sequence[str]|None, optional): The columns of the values. Defaults to None for all columns.
+
+        Returns:
+            str: The statement.
+
+        Raises:
+            ValueError: If the number of values does not match the columns, or a column is not in the table or
+                        is generated.
+        """
+        if columns is not None:
+            names = [self.catalog.column(relation, name) for name in columns]
+            for name in names:
+                if self.catalog.column_info(relation, name).generated:
+                    raise ValueError("Sarakkeen {} arvo lasketaan, sitä ei voi lisätä.".format(name))
+            if count != len(names):
+                raise ValueError("Tauluun {} lisätään {} arvoa, annettiin {}.".format(
+                    self.catalog.relation(relation), len(names), count))
+            return "INSERT INTO {} ({}) VALUES ({})".format(
+                self.relation(relation), ", ".join(map(self.catalog.sql_name, names)), ", ".join("?" * count))
+        columns = [column for column in self.catalog.columns(relation) if not column.generated]
+        if count != len(columns):
+            raise ValueError("Tauluun {} lisätään {} arvoa, annettiin {}.".format(
+                self.catalog.relation(relation), len(columns), count))
+        return "INSERT INTO {} VALUES ({})".format(self.relation(relation), ", ".join("?" * count))
+
+    def row(self, relation: str, values: Sequence) -> tuple:
+        """
+        Converts the values of a whole row for the columns of a table, see SchemaCatalog.convert().
+
+        Args:
+            relation (str): The table to insert into.
+            values (Sequence): The values in column order, without generated columns.
+
+        Returns:
+            tuple: The converted values.
+        """
+        columns = [column for column in self.catalog.columns(relation) if not column.generated]
+        return tuple(self.catalog.convert(relation, column.name, value) for column, value in zip(columns, values))
+
+    def delete(self, relation: str, key: str) -> str:
+        """
+        Builds a DELETE statement for the rows with a given key value.
+
+        Args:
+            relation (str): The table to delete from.
+            key (str): The key column.
+
+        Returns:
+            str: The statement.
+        """
+        return "DELETE FROM {} WHERE {} = ?".format(self.relation(relation), self.column(relation, key))
@@ -1,9 +1,86 @@
+import collections
+import contextlib
 import datetime
-from typing import Sequence
-import pandas as pd
+import functools
+import itertools
+import json
+import os
+from typing import Iterable, NamedTuple, Sequence
 import random
 import re
 import sqlite3 as sql
+import sys
+import threading
+import time
+import varastoarkisto
+import varastokysely
+import varastomittaus
+import varastosijoitus
+import varastoskeema
+import varastotuonti
+import varastovienti
+
+# Records a movement, see varastoskeema.MOVEMENTS. Siirto_ID is assigned by the database.
+_MOVEMENT_INSERT = "INSERT INTO SIIRTOTAPAHTUMA (Siirtoaika, Lavanumero, Sijainti) VALUES (?, ?, ?)"
+
+class MoveResult(NamedTuple):
+    """
+    The result of a single move in Database.move_pallets().
+
+    Attributes:
+        pallet (int): The ID of the pallet.
+        location (int): The ID of the target location.
+        moved (bool): Whether the pallet was moved.
+        reason (str|None): The reason the move was rejected, or None if it was applied.
+    """
+    pallet: int
+    location: int
+    moved: bool
+    reason: str|None
+
+class PickLine(NamedTuple):
+    """
+    A batch to pick from in Database.pick_fefo().
+
+    Attributes:
+        batch (int): The ID of the batch (Eränumero).
+        expiry (str|None): The best before date of the batch (PE_pvm), or None if it has none.
+        quantity (int): The number of sales units to pick from the batch.
+        pallets (list[tuple[int, str]]): The pallets the batch is on and their locations.
+    """
+    batch: int
+    expiry: str|None
+    quantity: int
+    pallets: list[tuple[int, str]]
+
+def _open_connection(db_path: str, pragmas: dict|None=None, check_same_thread: bool=True,
+                     metrics: varastomittaus.Metrics|None=None):
+    """
+    Opens a new SQLite connection with the SIJAINTI_STR function registered and the given pragmas applied.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        pragmas (dict|None, optional): Pragma names and values to apply to the connection. Defaults to None.
+        check_same_thread (bool, optional): Passed on to sqlite3.connect(). Defaults to True.
+        metrics (varastomittaus.Metrics|None, optional): Metrics to record the opening time and the statements
+                                                         of the connection in. Defaults to None.
+
+    Returns:
+        sqlite3.Connection: The opened connection.
+    """
+    if metrics is None:
+        connection = sql.connect(db_path, check_same_thread=check_same_thread)
+    else:
+        start = time.perf_counter()
+        connection = sql.connect(db_path, check_same_thread=check_same_thread,
+                                 factory=varastomittaus.MeasuredConnection)
+    connection.create_function("SIJAINTI_STR", 4, location_to_str, deterministic=True)
+    for name, value in (pragmas or {}).items():
+        connection.execute("PRAGMA {} = {}".format(name, value))
+    if metrics is not None:
+        metrics.install(connection)
+        metrics.connection_opened(time.perf_counter() - start)
+    return connection
 
 class _Connection:
     """
@@ -11,45 +88,834 @@ class _Connection:
 
     Args:
         db_path (str): The path to the SQLite database file.
+        pragmas (dict|None, optional): Pragma names and values to apply to every connection. Defaults to None.
+        metrics (varastomittaus.Metrics|None, optional): Metrics to record the connections in. Defaults to None.
 
     Attributes:
         db_path (str): The path to the SQLite database file.
+        pragmas (dict): Pragma names and values applied to every connection.
+        metrics (varastomittaus.Metrics|None): Metrics the connections are recorded in.
         _connection (sqlite3.Connection): The connection object to the database.
 
     Methods:
         __enter__(): Enters the context and returns the connection object.
         __exit__(exc_type, exc_val, exc_tb): Exits the context and closes the connection.
+        close(): Does nothing, as connections are closed when the context exits.
     """
-    def __init__(self, db_path):
+    def __init__(self, db_path, pragmas: dict|None=None, metrics: varastomittaus.Metrics|None=None):
         self.db_path = db_path
+        self.pragmas = dict(pragmas or {})
+        self.metrics = metrics
         self._connection = None
 
     def __enter__(self):
-        self._connection = sql.connect(self.db_path)
-        self._connection.create_function("SIJAINTI_STR", 4, location_to_str, deterministic=True)
+        self._connection = _open_connection(self.db_path, self.pragmas, metrics=self.metrics)
         return self._connection
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._connection is not None:
+            if self.metrics is not None:
+                self.metrics.finish(self._connection)
             self._connection.close()
             self._connection = None
 
+    def close(self):
+        pass
+
+class _ConnectionPool:
+    """
+    A bounded pool of reusable SQLite connections. Can be used as a context manager in place of _Connection.
+
+    Connections are opened lazily up to max_size and returned to the pool when the context exits. Any
+    transaction left open is rolled back on return, so uncommitted changes are discarded just like when a
+    one-shot connection is closed. A thread holds at most one connection at a time: nested contexts in the
+    same thread get the connection the thread already holds. Connections that have been idle longer than
+    health_check_interval are checked with a trivial query before being handed out and replaced if broken.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        max_size (int, optional): The maximum number of open connections. Defaults to 4.
+        pragmas (dict|None, optional): Pragma names and values to apply to every connection. Defaults to None.
+        timeout (float|None, optional): Seconds to wait for a free connection, or None to wait indefinitely.
+                                        Defaults to None.
+        health_check_interval (float, optional): Idle seconds after which a connection is checked before
+                                                 use. Defaults to 30.0.
+        metrics (varastomittaus.Metrics|None, optional): Metrics to record the connections in. Defaults to None.
+
+    Methods:
+        __enter__(): Checks out a connection for the current thread and returns it.
+        __exit__(exc_type, exc_val, exc_tb): Returns the connection to the pool when the outermost context exits.
+        close(): Closes all connections and refuses further checkouts.
+    """
+    def __init__(self, db_path, max_size: int=4, pragmas: dict|None=None, timeout: float|None=None,
+                 health_check_interval: float=30.0, metrics: varastomittaus.Metrics|None=None):
+        if max_size < 1:
+            raise ValueError("The pool size must be at least 1.")
+        self.db_path = db_path
+        self.max_size = max_size
+        self.pragmas = dict(pragmas or {})
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.metrics = metrics
+        # (connection, last_used) pairs, most recently used last
+        self._idle = collections.deque()
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self._local = threading.local()
+
+    def __enter__(self):
+        local = self._local
+        if getattr(local, "depth", 0):
+            local.depth += 1
+            return local.connection
+        local.connection = self._checkout()
+        local.depth = 1
+        return local.connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        local = self._local
+        local.depth -= 1
+        if local.depth == 0:
+            connection = local.connection
+            local.connection = None
+            self._checkin(connection)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                connection.close()
+                self._size -= 1
+            self._lock.notify_all()
+
+    def _checkout(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise sql.ProgrammingError("Cannot operate on a closed connection pool.")
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, last_used = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No free database connection available.")
+                self._lock.wait(remaining)
+        if connection is not None:
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(connection):
+                return connection
+            connection.close()
+        try:
+            return _open_connection(self.db_path, self.pragmas, check_same_thread=False, metrics=self.metrics)
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+    def _checkin(self, connection):
+        try:
+            if self.metrics is not None:
+                self.metrics.finish(connection)
+            if connection.in_transaction:
+                connection.rollback()
+        except sql.Error:
+            connection.close()
+            connection = None
+        with self._lock:
+            if connection is None or self._closed:
+                if connection is not None:
+                    connection.close()
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @staticmethod
+    def _is_healthy(connection):
+        try:
+            connection.execute("SELECT 1").fetchall()
+        except sql.Error:
+            return False
+        return True
+
+class _StatementInfo(NamedTuple):
+    """
+    The tables a statement reads and writes, including those used through views and triggers.
+
+    Attributes:
+        cacheable (bool): Whether the results of the statement may be cached.
+        reads (frozenset[str]): The tables read, in upper case.
+        writes (frozenset[str]): The tables written, in upper case.
+    """
+    cacheable: bool
+    reads: frozenset
+    writes: frozenset
+
+# Authorizer actions allowed in a cacheable statement, and the functions whose results differ between calls
+_READ_ACTIONS = {sql.SQLITE_SELECT, sql.SQLITE_READ, sql.SQLITE_FUNCTION, sql.SQLITE_RECURSIVE}
+_WRITE_ACTIONS = {sql.SQLITE_INSERT, sql.SQLITE_UPDATE, sql.SQLITE_DELETE}
+_VOLATILE_FUNCTIONS = {"random", "randomblob", "changes", "total_changes", "last_insert_rowid"}
+
+# Whitespace outside string literals and quoted identifiers
+_WHITESPACE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+
+class _QueryCache:
+    """
+    A least recently used cache of query results, bounded by the estimated memory use of the results.
+
+    Results are keyed by the query with its whitespace normalized and the parameters. The tables a query reads,
+    also through views, are found with an authorizer when the query is first seen. Writes invalidate the
+    results that read the written tables, including tables written by triggers. Changes committed by other
+    connections are detected with PRAGMA data_version, which clears the whole cache; this only sees changes
+    made while the connection used for the lookup stays open, so it is only done for pooled connections.
+
+    Args:
+        max_bytes (int): The maximum estimated size of the cached results in bytes.
+        track_data_version (bool, optional): Whether to clear the cache when PRAGMA data_version shows changes
+                                             by other connections. Defaults to False.
+        metrics (varastomittaus.Metrics|None, optional): Metrics to record the rows of the executed queries in.
+                                                         Defaults to None.
+
+    Attributes:
+        max_bytes (int): The maximum estimated size of the cached results in bytes.
+        hits (int): The number of results served from the cache.
+        misses (int): The number of queries executed on the database.
+        evictions (int): The number of results evicted to stay within max_bytes.
+        invalidations (int): The number of results removed because of writes.
+    """
+    def __init__(self, max_bytes: int, track_data_version: bool=False, metrics: varastomittaus.Metrics|None=None):
+        self.max_bytes = max_bytes
+        self.track_data_version = track_data_version
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # key -> (columns, rows, size, reads), least recently used first
+        self._entries = collections.OrderedDict()
+        # table -> keys of the entries reading it
+        self._readers = collections.defaultdict(set)
+        # table -> number of times invalidated, to drop results that were read during a write
+        self._versions = collections.Counter()
+        self._statements = {}
+        self._data_versions = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return _WHITESPACE.sub(lambda match: match.group(1) or " ", query).strip().rstrip(";").rstrip()
+
+    @staticmethod
+    def _estimate_size(columns: list, rows: list) -> int:
+        size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+        for row in rows:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        return size
+
+    def statement(self, conn: sql.Connection, query: str, params: dict|Sequence=()) -> _StatementInfo:
+        """
+        Returns the tables a statement reads and writes. The statement is compiled, but not run, with EXPLAIN
+        while an authorizer records the tables it uses, and the result is remembered.
+
+        Args:
+            conn (sqlite3.Connection): The connection to use.
+            query (str): The statement.
+            params (tuple|dict, optional): The parameters of the statement. Defaults to ().
+
+        Returns:
+            _StatementInfo: The tables the statement reads and writes.
+        """
+        normalized = self.normalize(query)
+        info = self._statements.get(normalized)
+        if info is not None:
+            return info
+        actions = []
+        def authorize(action, arg1, arg2, db_name, source):
+            actions.append((action, arg1, arg2))
+            return sql.SQLITE_OK
+        conn.set_authorizer(authorize)
+        try:
+            conn.execute("EXPLAIN " + normalized, params).fetchall()
+        finally:
+            conn.set_authorizer(None)
+        cacheable = all(action in _READ_ACTIONS for action, _, _ in actions) and not any(
+            action == sql.SQLITE_FUNCTION and arg2.lower() in _VOLATILE_FUNCTIONS for action, _, arg2 in actions)
+        info = _StatementInfo(
+            cacheable,
+            frozenset(arg1.upper() for action, arg1, _ in actions if action == sql.SQLITE_READ),
+            frozenset(arg1.upper() for action, arg1, _ in actions if action in _WRITE_ACTIONS),
+        )
+        with self._lock:
+            self._statements[normalized] = info
+        return info
+
+    def execute(self, conn: sql.Connection, query: str, params: dict|Sequence=()) -> tuple[list, list]:
+        """
+        Returns the result of a query from the cache, or executes it and caches the result.
+
+        Args:
+            conn (sqlite3.Connection): The connection to use.
+            query (str): The query.
+            params (tuple|dict, optional): The parameters of the query. Defaults to ().
+
+        Returns:
+            tuple[list, list]: The column names and the rows of the result.
+        """
+        if self.track_data_version:
+            self._check_data_version(conn)
+        frozen = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        key = (self.normalize(query), frozen)
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], list(entry[1])
+            self.misses += 1
+        info = self.statement(conn, query, params)
+        with self._lock:
+            versions = {table: self._versions[table] for table in info.reads}
+        cur = conn.execute(query, params)
+        rows = cur.fetchall()
+        if self.metrics is not None:
+            self.metrics.finish(conn, len(rows))
+        columns = [description[0] for description in cur.description or ()]
+        if key is not None and info.cacheable:
+            self._put(key, columns, rows, info.reads, versions)
+        return columns, rows
+
+    def _put(self, key: tuple, columns: list, rows: list, reads: frozenset, versions: dict):
+        size = self._estimate_size(columns, rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # A write committed while the query ran may have made the result stale
+            if any(self._versions[table] != version for table, version in versions.items()):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (columns, rows, size, reads)
+            self._size += size
+            for table in reads:
+                self._readers[table].add(key)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: tuple):
+        _, _, size, reads = self._entries.pop(key)
+        self._size -= size
+        for table in reads:
+            self._readers[table].discard(key)
+
+    def invalidate(self, tables: Iterable[str]):
+        """
+        Removes the cached results that read any of the given tables.
+
+        Args:
+            tables (Iterable[str]): The changed tables.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for table in tables:
+                table = table.upper()
+                self._versions[table] += 1
+                for key in list(self._readers.pop(table, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self, schema_changed: bool=False):
+        """
+        Removes every cached result.
+
+        Args:
+            schema_changed (bool, optional): Whether to also forget the tables used by the statements, as views
+                                             may have been redefined. Defaults to False.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.invalidations += len(self._entries)
+            for table in self._readers:
+                self._versions[table] += 1
+            self._entries.clear()
+            self._readers.clear()
+            self._size = 0
+            if schema_changed:
+                self._statements.clear()
+
+    def _check_data_version(self, conn: sql.Connection):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        previous = self._data_versions.get(id(conn))
+        self._data_versions[id(conn)] = version
+        if previous is not None and previous != version:
+            self.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of the cache.
+
+        Returns:
+            dict: The hits, misses, evictions and invalidations, the number of cached results and their
+                  estimated size in bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+# The maximum number of rows returned by a full-text search unless a limit is given, like print_query()
+SEARCH_LIMIT = 100
+# The matches of each full-text search table that are ranked when the results are limited. Scoring a match
+# counts every match of the term, so when a term such as "1" matches more documents of a table than this, its
+# first matches in the order of their keys are returned unranked, after the ranked matches of the other tables.
+SEARCH_CANDIDATES = 1000
+
+# How the matches of an FTS5 query (bound as :haku) in a search table H lead to the keys of a view column
+# Match: (search table, key expression, joins from H, which SQLite keeps in this order)
+_MATCH_PRODUCTS = ("HAKU_TUOTE", "H.Avain", "")
+_MATCH_BATCHES = ("HAKU_ERÄ", "H.Avain", "")
+_MATCH_PALLETS = ("HAKU_LAVA", "H.Avain", "")
+_MATCH_LOCATIONS = ("HAKU_SIJAINTI", "H.Avain", "")
+_MATCH_PRODUCT_PALLETS = ("HAKU_TUOTE", "EL.Lavanumero", "CROSS JOIN ERÄ E ON E.Tuotenumero = H.Avain "
+                          "CROSS JOIN ERÄ_LAVALLA EL ON EL.Eränumero = E.Eränumero")
+_MATCH_BATCH_PALLETS = ("HAKU_ERÄ", "EL.Lavanumero", "CROSS JOIN ERÄ_LAVALLA EL ON EL.Eränumero = H.Avain")
+_MATCH_LOCATION_PALLETS = ("HAKU_SIJAINTI", "L.Lavanumero", "CROSS JOIN LAVA L ON L.Sijainti = H.Avain")
+_PALLET_PATHS = (
+    ("Lavanumero", _MATCH_PALLETS), ("Lavanumero", _MATCH_LOCATION_PALLETS),
+    ("Lavanumero", _MATCH_PRODUCT_PALLETS), ("Lavanumero", _MATCH_BATCH_PALLETS),
+    )
+# How the searchable views are searched with the full-text search tables
+# View: ((view column, match), ...)
+_SEARCH_PATHS = {
+    "TUOTETIEDOT": (("Tuotenumero", _MATCH_PRODUCTS),),
+    "TUOTEERÄT": (
+        ("Tuotenumero", _MATCH_PRODUCTS), ("Eränumero", _MATCH_BATCHES),
+        ("Lavanumero", _MATCH_PALLETS), ("Lavanumero", _MATCH_LOCATION_PALLETS),
+        ),
+    "LAVAPAIKAT": (
+        ("Sijainti_ID", _MATCH_LOCATIONS), ("Lavanumero", _MATCH_PALLETS),
+        ("Lavanumero", _MATCH_PRODUCT_PALLETS), ("Lavanumero", _MATCH_BATCH_PALLETS),
+        ),
+    "LAVATIEDOT": _PALLET_PATHS,
+    "LAVASIIRROT": _PALLET_PATHS,
+}
+
+def _search_query(paths: Sequence[tuple[str, tuple[str, str, str]]], limited: bool) -> str:
+    """
+    Returns the query ranking the keys of a view that match an FTS5 query in one statement: the best rank of
+    each (path, key) over the search paths, best first. Bind :haku to the FTS5 query, :raja to the number of
+    keys and, if limited, :ehdokkaat to SEARCH_CANDIDATES.
+
+    Args:
+        paths (Sequence[tuple]): The search paths of the view, see _SEARCH_PATHS.
+        limited (bool): Whether to rank at most the first :ehdokkaat matches of each search table.
+
+    Returns:
+        str: The query returning the index of the path, the key and its rank.
+    """
+    matches = []
+    for i, (_, (table, key, joins)) in enumerate(paths):
+        rank, candidates, documents = "H.rank", "", ""
+        if limited:
+            first = "SELECT rowid FROM {0} WHERE {0} MATCH :haku LIMIT :ehdokkaat + 1".format(table)
+            # The rank of a term with more matches than candidates is never computed
+            rank = "CASE WHEN (SELECT COUNT(*) FROM ({})) > :ehdokkaat THEN 0 ELSE H.rank END".format(first)
+            candidates = "AND H.rowid <= (SELECT MAX(rowid) FROM ({} - 1))".format(first)
+            documents = "LIMIT :ehdokkaat"
+        # The ranked documents are the outer loop of the joins, so a product matching thousands of pallets
+        # stops at the limit instead of sorting them all
+        matches.append("SELECT * FROM (SELECT {} AS Polku, {} AS Avain, H.Sija FROM (SELECT H.Avain, {} AS Sija "
+                       "FROM {} H WHERE {} MATCH :haku {} ORDER BY Sija, H.rowid {}) H {} LIMIT :raja)"
+                       .format(i, key, rank, table, table, candidates, documents, joins))
+    return ("SELECT Polku, Avain, MIN(Sija) AS Sija FROM ({}) WHERE Avain IS NOT NULL "
+            "GROUP BY Polku, Avain ORDER BY Sija LIMIT :raja".format(" UNION ALL ".join(matches)))
+
+# Key the rows of each view are ordered and paged by in Database.iter_pages(), and the table and column the
+# keys of a page are read from. The keys are never null and the views can seek on them.
+# View: (view column, key table, key column)
+_PAGE_KEYS = {
+    "TUOTETIEDOT": ("Tuotenumero", "TUOTE", "Tuotenumero"),
+    "TUOTEERÄT": ("Eränumero", "ERÄ", "Eränumero"),
+    "LAVAPAIKAT": ("Sijainti_ID", "SIJAINTI", "STunniste"),
+    "LAVATIEDOT": ("Lavanumero", "LAVA", "Lavanumero"),
+    "VARASTOTIEDOT": ("Tunniste", "VARASTO", "VTunniste"),
+    "LAVASIIRROT": ("Lavanumero", "LAVA", "Lavanumero"),
+}
+
+def format_table(columns: Sequence[str], rows: Sequence[tuple], start: int=0) -> str:
+    """
+    Formats rows as a plain text table with a row number column. Numbers are aligned to the right and
+    other values to the left.
+
+    Args:
+        columns (Sequence[str]): The column names.
+        rows (Sequence[tuple]): The rows to format.
+        start (int, optional): The number of the first row. Defaults to 0.
+
+    Returns:
+        str: The formatted table.
+    """
+    index = [str(i) for i in range(start, start + len(rows))]
+    cells = [["" if value is None else str(value) for value in row] for row in rows]
+    numeric = [all(isinstance(row[i], (int, float)) or row[i] is None for row in rows)
+               for i in range(len(columns))]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    index_width = max(len(i) for i in index) if index else 0
+    
+    def line(first: str, values: Sequence[str]) -> str:
+        return "  ".join([first.ljust(index_width)] + [
+            value.rjust(width) if right else value.ljust(width)
+            for value, width, right in zip(values, widths, numeric)]).rstrip()
+    
+    return "\n".join([line("", columns)] + [line(i, row) for i, row in zip(index, cells)])
+
+def _format_pandas(columns: Sequence[str], rows: Sequence[tuple], start: int=0) -> str:
+    """
+    Formats rows as a table using pandas, which is only imported on first use.
+
+    Args:
+        columns (Sequence[str]): The column names.
+        rows (Sequence[tuple]): The rows to format.
+        start (int, optional): The number of the first row. Defaults to 0.
+
+    Returns:
+        str: The formatted table.
+    """
+    import pandas as pd
+    return str(pd.DataFrame(rows, columns=columns, index=range(start, start + len(rows))))
+
+# Table formatters selectable with the renderer argument of Database
+RENDERERS = {
+    "text": format_table,
+    "pandas": _format_pandas,
+}
+
+# Pragmas of the concurrency mode. WAL lets readers work alongside a writer, synchronous=NORMAL is safe in WAL
+# mode while skipping a sync on every commit, and busy_timeout makes a blocked writer wait for the lock.
+CONCURRENT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+}
+
+# Retries and backoff in seconds for operations that fail with SQLITE_BUSY in the concurrency mode
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+BUSY_BACKOFF_MAX = 1.0
+
+def _is_busy(error: sql.OperationalError) -> bool:
+    """
+    Checks whether an error was caused by another connection holding a lock on the database.
+
+    Args:
+        error (sqlite3.OperationalError): The error.
+
+    Returns:
+        bool: True for SQLITE_BUSY and SQLITE_LOCKED errors.
+    """
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (sql.SQLITE_BUSY, sql.SQLITE_LOCKED)
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+def _retry_busy(method):
+    """
+    Decorates a Database method to be retried with exponential backoff and jitter while the database is busy.
+    The method must leave nothing behind when it fails, which holds as uncommitted changes are rolled back
+    when the connection is closed or returned to the pool.
+
+    Args:
+        method (Callable): The method to decorate.
+
+    Returns:
+        Callable: The decorated method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except sql.OperationalError as error:
+                if attempt >= self.busy_retries or not _is_busy(error):
+                    raise
+            time.sleep(min(BUSY_BACKOFF * 2 ** attempt, BUSY_BACKOFF_MAX) * random.uniform(0.5, 1.5))
+            attempt += 1
+    return wrapper
+
+def _measured(method):
+    """
+    Decorates a Database method to record its duration as an operation in the metrics of the database, when it
+    collects them. Outside any retries, so that the time spent waiting for a busy database is included.
+
+    Args:
+        method (Callable): The method to decorate.
+
+    Returns:
+        Callable: The decorated method.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = method(self, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self.metrics.operation(name, time.perf_counter() - start, failed)
+    return wrapper
+
 class Database:
     """
     A class representing a SQLite database.
 
     Attributes:
-        _conn (_Connection): The connection to the SQLite database.
+        _conn (_Connection|_ConnectionPool): The connection to the SQLite database.
+        busy_retries (int): How many times an operation is retried when the database is busy.
+        metrics (varastomittaus.Metrics|None): The metrics of the statements and operations, or None if they
+                                               are not collected.
     """
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int|None=None, pragmas: dict|None=None, renderer: str="text",
+                 concurrent: bool=False, cache_bytes: int=0, metrics: varastomittaus.Metrics|None=None):
         """
         Initializes a new instance of the Database class.
 
         Args:
             db_path (str): The path to the SQLite database file.
+            pool_size (int|None, optional): The number of reusable connections to keep open, or None to open
+                                            a new connection for every operation. Defaults to None.
+            pragmas (dict|None, optional): Pragma names and values to apply to every connection.
+                                           Defaults to None.
+            renderer (str, optional): The table formatter used by the print methods, one of RENDERERS.
+                                      Defaults to "text".
+            concurrent (bool, optional): Whether to use the concurrency mode for several processes sharing the
+                                         database: WAL journaling with CONCURRENT_PRAGMAS, which the given
+                                         pragmas override, and retries with backoff when the database is busy.
+                                         Defaults to False.
+            cache_bytes (int, optional): The memory bound in bytes of a cache of query results, or 0 to disable
+                                         the cache. Defaults to 0.
+            metrics (varastomittaus.Metrics|None, optional): Metrics to record the latency, rows and steps of
+                                                             every statement, the cost of opening connections,
+                                                             the duration of the operations and the slow
+                                                             statements in, or None not to collect them.
+                                                             Defaults to None.
+
+        Raises:
+            ValueError: If the renderer is unknown.
+        """
+        if renderer not in RENDERERS:
+            raise ValueError("Tuntematon tulostustapa '{}'.".format(renderer))
+        self._format = RENDERERS[renderer]
+        if concurrent:
+            pragmas = {**CONCURRENT_PRAGMAS, **(pragmas or {})}
+        self.busy_retries = BUSY_RETRIES if concurrent else 0
+        self.metrics = metrics
+        if pool_size is None:
+            self._conn = _Connection(db_path, pragmas, metrics)
+        else:
+            self._conn = _ConnectionPool(db_path, pool_size, pragmas, metrics=metrics)
+        # Names of the tables, views, indexes and triggers in the database, loaded on first use
+        self._relations = None
+        # Builds statements from names and types checked against the schema catalog of the database, loaded on
+        # first use and again whenever the schema_version of the database changes
+        self._builder = None
+        self._cache = _QueryCache(cache_bytes, pool_size is not None, metrics) if cache_bytes > 0 else None
+        # The change counts of the tables the putaway index of free locations is built from and the index, loaded
+        # on first use and again when the tables have changed other than by movements, see _change_counts()
+        self._putaway = None
+        # The change counts of SIJAINTI and LAVA and the snapshot of the locations and pallets in NumPy arrays for
+        # analytics, loaded like the putaway index
+        self._occupancy = None
+    
+    def close(self):
+        """
+        Closes the pooled connections of the database. Does nothing in one-shot connection mode.
+
+        Returns:
+            None
+        """
+        self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    @_measured
+    def upgrade_schema(self):
+        """
+        Adds the missing indexes and other schema extensions to the database.
+
+        Returns:
+            None
         """
-        self._conn = _Connection(db_path)
+        with self._conn as conn:
+            varastoskeema.upgrade(conn)
+        self._relations = None
+        self._builder = None
+        self._putaway = None
+        self._occupancy = None
+        if self._cache is not None:
+            self._cache.clear(schema_changed=True)
+    
+    def cache_stats(self) -> dict|None:
+        """
+        Returns the statistics of the query result cache.
+
+        Returns:
+            dict|None: The hits, misses, evictions and invalidations, the number of cached results and their
+                       estimated size in bytes, or None if the cache is disabled.
+        """
+        return None if self._cache is None else self._cache.stats()
+    
+    def clear_cache(self):
+        """
+        Empties the query result cache, eg. after the database has been changed outside this Database.
+
+        Returns:
+            None
+        """
+        if self._cache is not None:
+            self._cache.clear()
+    
+    def _changed(self, conn: sql.Connection, query: str, params: dict|Sequence=()):
+        """
+        Invalidates the cached results that read the tables written by a committed statement.
+
+        Args:
+            conn (sqlite3.Connection): The connection the statement was run on.
+            query (str): The statement.
+            params (tuple|dict, optional): The parameters of the statement. Defaults to ().
+
+        Returns:
+            None
+        """
+        if self._cache is not None:
+            self._cache.invalidate(self._cache.statement(conn, query, params).writes)
+    
+    def _tables_changed(self, *tables: str):
+        """
+        Drops the putaway index and the occupancy snapshot if they were built from a changed table, so that they
+        are built again on next use. Movements are applied to them from the movement log instead.
+
+        Args:
+            *tables (str): The names of the changed tables as declared.
+
+        Returns:
+            None
+        """
+        if any(table in varastosijoitus.TABLES for table in tables):
+            self._putaway = None
+        if self._occupancy is not None and any(table in self._occupancy[1].TABLES for table in tables):
+            self._occupancy = None
+    
+    def _change_counts(self, conn: sql.Connection, tables: tuple[str, ...]) -> tuple[int, ...]|None:
+        """
+        Reads the change counters of tables, which show the changes made through any connection or process.
+        An index built from the tables is loaded again when the counters read before loading it differ.
+
+        Args:
+            conn (sqlite3.Connection): The connection to read the counters with.
+            tables (tuple[str, ...]): The tables, see varastoskeema.CHANGE_COUNTERS.
+
+        Returns:
+            tuple[int, ...]|None: The number of changes of each table, or None if the database has no change
+                                  counters, in which case only the changes made through this Database are seen.
+        """
+        if not self._has_relations("TAULUMUUTOKSET"):
+            return None
+        return varastoskeema.change_counts(conn, tables)
+
+    def _location_code(self, alias: str) -> str:
+        """
+        Returns the SQL expression of the location code of SIJAINTI: the stored Sijaintikoodi, or the
+        SIJAINTI_STR function in databases whose schema has not been upgraded yet.
+
+        Args:
+            alias (str): The alias of SIJAINTI in the query.
+
+        Returns:
+            str: The expression, eg. "S.Sijaintikoodi".
+        """
+        if self._has_relations("SIJKOODITA"):
+            return "{}.Sijaintikoodi".format(alias)
+        return "SIJAINTI_STR({0}.Hyllyväli, {0}.Sektio, {0}.Kerros, {0}.Kuormaruutu)".format(alias)
+
+    def _has_relations(self, *names: str) -> bool:
+        """
+        Checks whether all the given tables, views, indexes or triggers exist in the database.
+
+        Args:
+            *names (str): The names to check.
+
+        Returns:
+            bool: True if every name exists.
+        """
+        if self._relations is None:
+            self._relations = {row[0] for row in self._query("SELECT name FROM sqlite_master")}
+        return all(name in self._relations for name in names)
+    
+    def _query_builder(self, conn: sql.Connection|None=None) -> varastokysely.QueryBuilder:
+        """
+        Returns the query builder. Its schema catalog is loaded on first use and reloaded when the schema has
+        been changed, also by another connection, which is seen from PRAGMA schema_version.
+
+        Args:
+            conn (sqlite3.Connection|None, optional): The connection of the running operation, so that no other
+                                                      connection is needed. Defaults to None.
+
+        Returns:
+            varastokysely.QueryBuilder: The query builder.
+        """
+        with self._conn if conn is None else contextlib.nullcontext(conn) as conn:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if self._builder is None or self._builder.catalog.version != version:
+                self._builder = varastokysely.QueryBuilder(varastokysely.SchemaCatalog.load(conn))
+                self._relations = None
+        return self._builder
+    
+    def query_plan(self, query: str, params: dict|Sequence=()) -> list[str]:
+        """
+        Returns the steps of the query plan SQLite would use for the given query.
+
+        Args:
+            query (str): The SQL query to explain.
+            params (tuple|dict, optional): The parameters to use in the query. Defaults to ().
+
+        Returns:
+            list[str]: The detail column of each EXPLAIN QUERY PLAN row (eg. "SCAN S").
+        """
+        return [row[3] for row in self._query("EXPLAIN QUERY PLAN " + query, params)]
     
     @staticmethod
     def sanitize(string: str):
@@ -76,47 +942,149 @@ class Database:
         Returns:
             list: The result set of the query.
         """
+        return self._execute(query, params)[1]
+    
+    @_retry_busy
+    def _execute(self, query: str, params: dict|Sequence=(), conn: sql.Connection|None=None) -> tuple[list, list]:
+        """
+        Executes the given SQL query with the given parameters, using the result cache if it is enabled.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (tuple|dict, optional): The parameters to use in the query. Defaults to ().
+            conn (sqlite3.Connection|None, optional): The connection to use, or None to open one.
+                                                      Defaults to None.
+
+        Returns:
+            tuple[list, list]: The column names and the rows of the result.
+        """
+        with self._conn if conn is None else contextlib.nullcontext(conn) as conn:
+            if self._cache is not None:
+                return self._cache.execute(conn, query, params)
+            cur = conn.execute(query, params)
+            rows = cur.fetchall()
+            if self.metrics is not None:
+                self.metrics.finish(conn, len(rows))
+            return [description[0] for description in cur.description or ()], rows
+    
+    @staticmethod
+    def fts_query(search_term: str) -> str:
+        """
+        Converts a search term into an FTS5 query matching every word of the term as a prefix.
+
+        Args:
+            search_term (str): The search term (eg. "vanilja jää" or "12-3-4").
+
+        Returns:
+            str: The FTS5 query (eg. '"vanilja"* "jää"*'), or an empty string if the term has no words.
+        """
+        words = [word for word in search_term.split() if re.search(r"\w", word)]
+        return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+    
+    def has_search_index(self) -> bool:
+        """
+        Checks whether the database has the full-text search tables created by upgrade_schema().
+
+        Returns:
+            bool: True if all the search tables exist.
+        """
+        return self._has_relations(*varastoskeema.SEARCH_TABLES)
+    
+    def _search(self, table_name: str, search_term: str, select: str="*", limit: int|None=SEARCH_LIMIT):
+        """
+        Searches a view through the full-text search tables and ranks the matching rows. The keys of the best
+        matches are ranked in one statement and the rows of the view are then read by key, as the views with
+        GROUP BY would be read whole if joined.
+
+        Args:
+            table_name (str): The name of the view to search in. Must be one of _SEARCH_PATHS.
+            search_term (str): The search term to search for.
+            select (str, optional): The columns to select. Defaults to "*".
+            limit (int|None, optional): The maximum number of rows to return, or None for all. Defaults to
+                                        SEARCH_LIMIT.
+
+        Returns:
+            tuple: The column names and the matching rows, best match first.
+        """
+        paths = _SEARCH_PATHS[table_name.upper()]
+        fts_query = self.fts_query(search_term)
+        if not fts_query:
+            return [], []
+        params = {"haku": fts_query, "raja": -1 if limit is None else limit}
+        if limit is not None:
+            params["ehdokkaat"] = SEARCH_CANDIDATES
         with self._conn as conn:
-            cur = conn.cursor()
-            cur.execute(query, params)
-            return cur.fetchall()
+            builder = self._query_builder(conn)
+            lookup = "SELECT {} FROM {} WHERE {{}} = ? LIMIT ?".format(builder.select_list(table_name, select),
+                                                                       builder.relation(table_name))
+            columns = []
+            rows = {}
+            for path, key, rank in self._execute(_search_query(paths, limit is not None), params, conn)[1]:
+                if limit is not None and len(rows) >= limit:
+                    break
+                # One equality lookup per key, as IN lists are not pushed into the outer joins of the views
+                # A product matches all its batches, so read only as many rows as are still missing
+                columns, key_rows = self._execute(lookup.format(builder.column(table_name, paths[path][0])),
+                                                  (key, -1 if limit is None else limit - len(rows)), conn)
+                for row in key_rows:
+                    rows.setdefault(row, rank)
+        return columns, list(rows)[:limit]
     
-    def search_and_print(self, table_name: str, search_term: str, select: str="*"):
+    @_measured
+    def search(self, table_name: str, search_term: str, select: str="*", limit: int|None=SEARCH_LIMIT) -> list:
+        """
+        Searches a view with the full-text search index. Every word of the search term is matched as a prefix
+        of the words in products, batches, pallets and locations, and the rows of the view related to the
+        matches are returned best match first.
+
+        Args:
+            table_name (str): The name of the view to search in.
+            search_term (str): The search term to search for.
+            select (str, optional): The columns to select. Defaults to "*".
+            limit (int|None, optional): The maximum number of rows to return, or None for all. Defaults to
+                                        SEARCH_LIMIT.
+
+        Returns:
+            list: A list of tuples containing the search results.
+
+        Raises:
+            ValueError: If the view cannot be searched with the full-text search index.
+        """
+        if table_name.upper() not in _SEARCH_PATHS or not self.has_search_index():
+            raise ValueError("Näkymää {} ei voi hakea hakuindeksillä.".format(table_name))
+        return self._search(table_name, search_term, select, limit)[1]
+    
+    @_measured
+    def search_and_print(self, table_name: str, search_term: str, select: str="*", use_index: bool=True,
+                         limit: int|None=SEARCH_LIMIT):
         """
         Search for a given search term in the specified table in the database.
 
+        The full-text search index is used when the database has one and the table is one of the searchable
+        views. Otherwise every column of the table is compared with the search term using LIKE.
+
         Args:
             table_name (str): The name of the table to search in.
             search_term (str): The search term to search for.
             select (str, optional): The columns to select. Defaults to "*".
+            use_index (bool, optional): Whether to use the full-text search index when possible.
+                                        Defaults to True.
+            limit (int|None, optional): The maximum number of rows to print when the full-text search index
+                                        is used, or None for all. Defaults to SEARCH_LIMIT.
 
         Returns:
-            list: A list of tuples containing the search results.
+            None
         """
-        table_name = self.sanitize(table_name)
-        search_term = self.sanitize(search_term)
-        select = self.sanitize(select)
-        # cols is [(cid, col_name, data_type, not_null, default_value, pk)]
-        cols = self._query("PRAGMA table_info({});".format(table_name))
-        keys = ("cid", "col_name", "data_type", "not_null", "default_value", "pk")
-        # Convert cols to a list of dictionaries with keys
-        attrs = [dict(zip(keys, col)) for col in cols]
-        num_types = ("INT", "REAL", "FLOAT", "DOUBLE", "NUMERIC", "DECIMAL")
+        if use_index and table_name.upper() in _SEARCH_PATHS and self.has_search_index():
+            columns, rows = self._search(table_name, search_term, select, limit)
+            self.print_rows(columns, rows)
+            if limit is not None and len(rows) >= limit:
+                print("Näytetään {} parasta osumaa.".format(limit))
+            print()
+            return
         
-        # Build the query, making sure data types are handled correctly
-        query = "SELECT {} FROM {} WHERE ".format(select, table_name)
-        for attr in attrs:
-            if search_term.isdecimal():
-                for num_type in num_types:
-                    if attr["data_type"] in num_type:
-                        # Numeric types are compared with = instead of LIKE
-                        query += "({} = {}) OR ".format(attr["col_name"], search_term)
-                        break
-                else:
-                    query += "({} LIKE '%{}%') OR ".format(attr["col_name"], search_term)
-            else:
-                query += "({} LIKE '%{}%') OR ".format(attr["col_name"], search_term)
-        self.print_query(query[:-4] + ";")
+        # The columns are compared by their types, see QueryBuilder.search()
+        self.print_query(*self._query_builder().search(table_name, select, search_term))
     
     @staticmethod
     def build_where(compare_attrs: Sequence, comparators: tuple[str,...], logicals: tuple[str,...]):
@@ -145,6 +1113,7 @@ class Database:
         where += "({} {} ?)".format(compare_attrs[-1], comparators[-1])
         return where
     
+    @_measured
     def get_table(
         self, table_name: str, select: str="*", compare_attrs: Sequence=(), compare_to: Sequence=(),
         comparators: tuple[str,...]=(), logicals: tuple[str,...]=()
@@ -155,62 +1124,430 @@ class Database:
         Args:
             table_name (str): The name of the table to retrieve data from.
             select (str, optional): The columns to retrieve. Defaults to "*".
+            compare_attrs (Sequence, optional): The columns to compare. Defaults to ().
+            compare_to (Sequence, optional): The values to compare the columns to. Defaults to ().
+            comparators (tuple[str,...], optional): The operator of each comparison (eg. "="). Defaults to ().
+            logicals (tuple[str,...], optional): The operators between the comparisons (eg. "AND").
+                                                 Defaults to ().
 
         Returns:
             list: A list of tuples containing the retrieved data.
+
+        Raises:
+            ValueError: If a table or column does not exist or an operator is not allowed.
+        """
+        with self._conn as conn:
+            builder = self._query_builder(conn)
+            where = builder.where(table_name, compare_attrs, comparators, logicals) if compare_attrs else ""
+            return self._execute(builder.select(table_name, select, where), tuple(compare_to) if where else (),
+                                 conn)[1]
+    
+    def iter_pages(self, table_name: str, select: str="*", page_size: int=100, key: str|None=None):
+        """
+        Iterates over the rows of a table or view one page at a time using keyset pagination.
+
+        The keys of the next page are read from the table the key comes from by seeking past the last key
+        of the previous page, and the page is then fetched with a range query on those keys. Fetching a page
+        therefore takes the same time and memory wherever it is in the table, and no read transaction is
+        kept open between pages. Rows that share a key are always returned on the same page, so pages of
+        views with several rows per key are longer than page_size.
+
+        Args:
+            table_name (str): The name of the table or view.
+            select (str, optional): The columns to select. Defaults to "*".
+            page_size (int, optional): The number of keys per page. Defaults to 100.
+            key (str|None, optional): A non-null column to order and page the rows by. Defaults to the key
+                                      in _PAGE_KEYS for views and the rowid for tables. Views not in
+                                      _PAGE_KEYS must be given a key.
+
+        Yields:
+            tuple: The column names and a list of the rows of the page.
+        """
+        builder = self._query_builder()
+        if key is None:
+            key, key_table, key_column = _PAGE_KEYS.get(table_name.upper(), ("rowid", table_name, "rowid"))
+        else:
+            key_table, key_column = table_name, key
+        column = builder.column(table_name, key)
+        key_column = builder.column(key_table, key_column)
+        key_table = builder.relation(key_table)
+        select = builder.select_list(table_name, select)
+        table_name = builder.relation(table_name)
+        first_keys = "SELECT DISTINCT {1} FROM {0} ORDER BY {1} LIMIT ?".format(key_table, key_column)
+        next_keys = "SELECT DISTINCT {1} FROM {0} WHERE {1} > ? ORDER BY {1} LIMIT ?".format(key_table, key_column)
+        page = "SELECT {} FROM {} WHERE {} BETWEEN ? AND ? ORDER BY {}".format(select, table_name, column, column)
+        last = None
+        while True:
+            with self._conn as conn:
+                if last is None:
+                    keys = self._execute(first_keys, (page_size,), conn)[1]
+                else:
+                    keys = self._execute(next_keys, (last, page_size), conn)[1]
+                if not keys:
+                    return
+                columns, rows = self._execute(page, (keys[0][0], keys[-1][0]), conn)
+            if rows:
+                yield columns, rows
+            if len(keys) < page_size:
+                return
+            last = keys[-1][0]
+    
+    def iter_rows(self, table_name: str, select: str="*", page_size: int=100, key: str|None=None):
+        """
+        Iterates over the rows of a table or view, fetching them a page at a time with iter_pages().
+
+        Args:
+            table_name (str): The name of the table or view.
+            select (str, optional): The columns to select. Defaults to "*".
+            page_size (int, optional): The number of rows fetched at a time. Defaults to 100.
+            key (str|None, optional): A non-null column to order and page the rows by. Defaults to None.
+
+        Yields:
+            tuple: The rows of the table.
+        """
+        for _, rows in self.iter_pages(table_name, select, page_size, key):
+            yield from rows
+    
+    def print_rows(self, columns: Sequence[str], rows: Sequence[tuple], start: int=0):
+        """
+        Prints rows as a table.
+
+        Args:
+            columns (Sequence[str]): The column names.
+            rows (Sequence[tuple]): The rows to print.
+            start (int, optional): The number of the first row. Defaults to 0.
+
+        Returns:
+            None
         """
-        table_name = self.sanitize(table_name)
-        select = self.sanitize(select)
-        if len(compare_attrs) >= 2 and len(compare_to) >= 2:
-            placeholders = self.build_where(compare_attrs, comparators, logicals)
-            return self._query(
-                "SELECT {} FROM {} WHERE {}".format(select, table_name, placeholders), compare_to
-                )
-        return self._query("SELECT {} FROM {}".format(select, table_name))
+        if not rows:
+            print("Ei tuloksia.")
+        else:
+            print(self._format(columns, rows, start))
     
-    def print_table(self, table_name: str, select="*"):
+    @_measured
+    def print_table(self, table_name: str, select="*", max_rows: int=100):
         """
-        Prints the contents of a table.
+        Prints the first rows of a table. Only the printed rows are fetched from the database.
 
         Args:
             table_name (str): The name of the table to print.
             select (str, optional): The columns to select. Defaults to "*".
+            max_rows (int, optional): The number of rows to print. Defaults to 100.
 
         Returns:
             None
         """
-        table_name = self.sanitize(table_name)
-        select = self.sanitize(select)
-        with self._conn as conn:
-            print(pd.read_sql_query("SELECT {} FROM {}".format(select, table_name), conn))
+        pages = self.iter_pages(table_name, select, max_rows)
+        columns, rows = next(pages, ([], []))
+        self.print_rows(columns, rows)
+        if next(pages, None) is not None:
+            print("Näytetään {} ensimmäistä riviä.".format(len(rows)))
         print()
     
-    def print_query(self, query: str, params: tuple|dict=()):
+    @_measured
+    @_retry_busy
+    def print_query(self, query: str, params: tuple|dict=(), max_rows: int=100):
         """
-        Prints the result of a query.
+        Prints the first rows of the result of a query. Only the printed rows are fetched from the database.
 
         Args:
             query (str): The query to execute.
             params (tuple|dict, optional): The parameters to use in the query. Defaults to ().
+            max_rows (int, optional): The number of rows to print. Defaults to 100.
 
         Returns:
             None
         """
         with self._conn as conn:
-            res = pd.read_sql_query(query, conn, params=params)
-            if res.empty:
-                print("Ei tuloksia.")
-            else:
-                print(res)
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchmany(max_rows + 1)
+            if self.metrics is not None:
+                self.metrics.finish(conn, len(rows))
+            columns = [description[0] for description in cur.description]
+        self.print_rows(columns, rows[:max_rows])
+        if len(rows) > max_rows:
+            print("Näytetään {} ensimmäistä riviä.".format(max_rows))
         print()
     
+    @_measured
     def location_is_free(self, location: int) -> int|None:
-        res = self._query("SELECT Lavanumero FROM LAVAPAIKAT WHERE Sijainti_ID = ?", (location,))
+        """
+        Returns the pallet occupying a location, using the occupancy table when the database has one.
+
+        Args:
+            location (int): The ID of the location.
+
+        Returns:
+            int|None: The ID of the pallet in the location, or None if the location is free.
+
+        Raises:
+            ValueError: If the location does not exist.
+        """
+        if self._has_relations("PAIKKAVARAUS"):
+            res = self._query("SELECT Lavanumero FROM PAIKKAVARAUS WHERE Sijainti = ?", (location,))
+        else:
+            res = self._query("SELECT Lavanumero FROM LAVAPAIKAT WHERE Sijainti_ID = ?", (location,))
         if not res:
             raise ValueError("Sijaintia ei ole olemassa.")
         return res[0][0]
     
+    @_measured
+    def free_locations(self, warehouse: int, count: int=10) -> list[tuple[int, str]]:
+        """
+        Lists free locations in a warehouse, for example to choose where to put away a pallet.
+
+        Args:
+            warehouse (int): The ID of the warehouse.
+            count (int, optional): The maximum number of locations to list. Defaults to 10.
+
+        Returns:
+            list[tuple[int, str]]: The IDs and string representations of the free locations.
+        """
+        if self._has_relations("PAIKKAVARAUS"):
+            return self._query("""
+                               SELECT P.Sijainti, S.Sijaintikoodi
+                               FROM PAIKKAVARAUS P JOIN SIJAINTI S ON S.STunniste = P.Sijainti
+                               WHERE P.Varasto = ? AND P.Lavanumero IS NULL
+                               ORDER BY P.Sijainti LIMIT ?
+                               """, (warehouse, count))
+        return self._query("""
+                           SELECT S.STunniste, SIJAINTI_STR(S.Hyllyväli, S.Sektio, S.Kerros, S.Kuormaruutu)
+                           FROM SIJAINTI S
+                           WHERE S.Varasto = ? AND NOT EXISTS (SELECT 1 FROM LAVA L WHERE L.Sijainti = S.STunniste)
+                           ORDER BY S.STunniste LIMIT ?
+                           """, (warehouse, count))
+    
+    @_measured
+    def recommend_locations(self, warehouse: int, pallet: int|None=None,
+                            count: int=5) -> list[varastosijoitus.Recommendation]:
+        """
+        Recommends free locations of a warehouse to put away a pallet, ranked by the distance from the dock,
+        the level and the product groups of the aisles, see varastosijoitus. The index of free locations is
+        built on first use and brought up to date with the recorded movements on every call. It is built again
+        when the locations, pallets, batches or products have changed, also through other connections.
+
+        Args:
+            warehouse (int): The ID of the warehouse.
+            pallet (int|None, optional): The pallet to put away. Defaults to None.
+            count (int, optional): The maximum number of locations. Defaults to 5.
+
+        Returns:
+            list[varastosijoitus.Recommendation]: The locations, best first.
+        """
+        with self._conn as conn:
+            changes = self._change_counts(conn, varastosijoitus.TABLES)
+            loaded = self._putaway
+            if loaded is None or loaded[0] != changes:
+                putaway = varastosijoitus.PutawayIndex.load(conn)
+                self._putaway = (changes, putaway)
+            else:
+                putaway = loaded[1]
+                putaway.refresh(conn)
+        return putaway.recommend(warehouse, count, pallet)
+
+    @_measured
+    def pick_fefo(self, product: int, quantity: int, warehouse: int|None=None,
+                  today: datetime.date|None=None) -> list[PickLine]:
+        """
+        Chooses the batches to pick a quantity of a product from, first expired first out: the batches on
+        pallets in the warehouse are taken in the order of their best before date, skipping the expired ones,
+        and the batches without a date come last. The batches are read in order from the index ERÄTUOTEPEIX,
+        and the batches without a date only if the dated ones do not cover the quantity.
+
+        Args:
+            product (int): The ID of the product (Tuotenumero).
+            quantity (int): The number of sales units (Myyntierät) to pick.
+            warehouse (int|None, optional): The warehouse to pick from. Defaults to None for any warehouse.
+            today (datetime.date|None, optional): The date of the picking. Defaults to None for today.
+
+        Returns:
+            list[PickLine]: The batches and the quantity to pick from each, in picking order. The quantities
+                            add up to less than requested if there is not enough of the product.
+
+        Raises:
+            ValueError: If the quantity is less than 1.
+        """
+        if quantity < 1:
+            raise ValueError("Määrän on oltava vähintään 1.")
+        today = (today or datetime.date.today()).isoformat()
+        query = """
+                SELECT E.Eränumero, E.PE_pvm, E.Myyntierät, EL.Lavanumero, {}
+                FROM ERÄ E CROSS JOIN ERÄ_LAVALLA EL ON EL.Eränumero = E.Eränumero
+                JOIN LAVA L ON L.Lavanumero = EL.Lavanumero
+                JOIN SIJAINTI S ON S.STunniste = L.Sijainti
+                WHERE E.Tuotenumero = ? AND {} AND E.Myyntierät > 0 {}
+                ORDER BY E.PE_pvm, E.Eränumero
+                """
+        code = self._location_code("S")
+        in_warehouse, extra = ("", ()) if warehouse is None else ("AND S.Varasto = ?", (warehouse,))
+        lines = []
+        with self._conn as conn:
+            for expiry, params in (("E.PE_pvm >= ?", (product, today)), ("E.PE_pvm IS NULL", (product,))):
+                rows = self._execute(query.format(code, expiry, in_warehouse), params + extra, conn)[1]
+                for (batch, expiry_date, units), pallets in itertools.groupby(rows, lambda row: row[:3]):
+                    take = min(quantity, units)
+                    lines.append(PickLine(batch, expiry_date, take, sorted(row[3:] for row in pallets)))
+                    quantity -= take
+                    if quantity == 0:
+                        return lines
+        return lines
+
+    @_measured
+    def expiring_batches(self, days: int, warehouse: int|None=None, today: datetime.date|None=None,
+                         include_expired: bool=False) -> list[tuple]:
+        """
+        Lists the batches whose best before date is within the given number of days, soonest first. The
+        batches are found with a range scan of the index ERÄPEIX, not by reading the whole TUOTEERÄT view.
+
+        Args:
+            days (int): The number of days from today, 0 for the batches expiring today.
+            warehouse (int|None, optional): Only the batches on pallets in this warehouse. Defaults to None for
+                                            all batches.
+            today (datetime.date|None, optional): The date to count from. Defaults to None for today.
+            include_expired (bool, optional): Whether to also list the batches that have already expired.
+                                              Defaults to False.
+
+        Returns:
+            list[tuple]: PE_pvm, Eränumero, Tuotenumero, Nimi, Lavanumero, Sijainti and Varasto of every batch
+                         and pallet, the pallet columns None if the batch is not on a pallet in a warehouse.
+
+        Raises:
+            ValueError: If the number of days is negative.
+        """
+        if days < 0:
+            raise ValueError("Päivien määrä ei voi olla negatiivinen.")
+        today = today or datetime.date.today()
+        start = "" if include_expired else today.isoformat()
+        end = (today + datetime.timedelta(days=days)).isoformat()
+        in_warehouse = "" if warehouse is None else "AND S.Varasto = ?"
+        return self._query("""
+                           SELECT E.PE_pvm, E.Eränumero, T.Tuotenumero, T.Nimi, L.Lavanumero, {}, S.Varasto
+                           FROM ERÄ E JOIN TUOTE T ON T.Tuotenumero = E.Tuotenumero
+                           LEFT OUTER JOIN ERÄ_LAVALLA EL ON EL.Eränumero = E.Eränumero
+                           LEFT OUTER JOIN LAVA L ON L.Lavanumero = EL.Lavanumero
+                           LEFT OUTER JOIN SIJAINTI S ON S.STunniste = L.Sijainti
+                           WHERE E.PE_pvm BETWEEN ? AND ? {}
+                           ORDER BY E.PE_pvm, E.Eränumero, L.Lavanumero
+                           """.format(self._location_code("S"), in_warehouse),
+                           (start, end) if warehouse is None else (start, end, warehouse))
+
+    @_measured
+    def stock_by_group(self, warehouse: int|None=None) -> list[tuple[int, str, float]]:
+        """
+        Returns the stock (the sum of Ltk_määrä of the batches on pallets) of each product group in each
+        warehouse from the summary table kept up to date by triggers. On a database not yet upgraded with the
+        summary table the stock is computed from the batches on the pallets.
+
+        Args:
+            warehouse (int|None, optional): Only this warehouse. Defaults to None for all warehouses.
+
+        Returns:
+            list[tuple[int, str, float]]: Varasto, Tuoteryhmä and Ltk_määrä of the groups in stock.
+        """
+        summary = ""
+        if not self._has_relations("SALDOT_RYHMITTÄIN"):
+            summary = "WITH SALDOT_RYHMITTÄIN(Varasto, Tuoteryhmä, Erät, Ltk_määrä) AS ({}) ".format(
+                varastoskeema.SUMMARIES["SALDOT_RYHMITTÄIN"][2].strip())
+        if warehouse is None:
+            return self._query(summary + "SELECT Varasto, Tuoteryhmä, Ltk_määrä FROM SALDOT_RYHMITTÄIN "
+                               "WHERE Erät > 0 ORDER BY Varasto, Tuoteryhmä")
+        return self._query(summary + "SELECT Varasto, Tuoteryhmä, Ltk_määrä FROM SALDOT_RYHMITTÄIN "
+                           "WHERE Varasto = ? AND Erät > 0 ORDER BY Tuoteryhmä", (warehouse,))
+
+    @_measured
+    def check_summaries(self) -> dict[str, list[tuple]]:
+        """
+        Compares the summary tables behind VARASTOTIEDOT, TUOTETIEDOT and stock_by_group() against a full
+        recomputation from the data, see varastoskeema.check_summaries().
+
+        Returns:
+            dict[str, list[tuple]]: The keys of the differing rows of each summary table, all empty if the
+                                    tables are up to date.
+
+        Raises:
+            ValueError: If the database has not been upgraded with the summary tables.
+        """
+        if not self._has_relations(*varastoskeema.SUMMARIES):
+            raise ValueError("Tietokannassa ei ole yhteenvetotauluja. Päivitä se komennolla create_db.py --upgrade.")
+        with self._conn as conn:
+            # Read in one transaction, or in the one already open when called within another operation
+            began = not conn.in_transaction
+            if began:
+                conn.execute("BEGIN;")
+            try:
+                return varastoskeema.check_summaries(conn)
+            finally:
+                if began:
+                    conn.rollback()
+
+    def occupancy_snapshot(self) -> "varastoanalytiikka.OccupancySnapshot":
+        """
+        Returns the snapshot of the locations and pallets in NumPy arrays for warehouse-wide analytics, see
+        varastoanalytiikka. The snapshot is loaded on first use and brought up to date with the recorded
+        movements on every call. It is loaded again when the locations or pallets have changed, also through
+        other connections. NumPy is only imported on first use, as it slows down the start.
+
+        Returns:
+            varastoanalytiikka.OccupancySnapshot: The snapshot.
+        """
+        import varastoanalytiikka
+        with self._conn as conn:
+            changes = self._change_counts(conn, varastoanalytiikka.OccupancySnapshot.TABLES)
+            loaded = self._occupancy
+            if loaded is None or loaded[0] != changes:
+                snapshot = varastoanalytiikka.OccupancySnapshot.load(conn)
+                self._occupancy = (changes, snapshot)
+            else:
+                snapshot = loaded[1]
+                snapshot.refresh(conn)
+        return snapshot
+
+    @_measured
+    def occupancy(self, by: Sequence[str]=("warehouse",), warehouse: int|None=None) -> "varastoanalytiikka.Occupancy":
+        """
+        Counts the locations, the occupied locations and the pallets grouped by some of warehouse, aisle,
+        section and floor, from the occupancy snapshot.
+
+        Args:
+            by (Sequence[str], optional): The dimensions to group by, see varastoanalytiikka.DIMENSIONS.
+                                          Defaults to ("warehouse",).
+            warehouse (int|None, optional): Only count the locations of this warehouse. Defaults to None.
+
+        Returns:
+            varastoanalytiikka.Occupancy: The counts and fill rates of the groups.
+
+        Raises:
+            ValueError: If a dimension is unknown.
+        """
+        return self.occupancy_snapshot().occupancy(by, warehouse)
+
+    def _movement_time(self, conn: sql.Connection) -> str:
+        """
+        Returns the time to record for a movement. In databases with Siirto_ID the time has microseconds and
+        is later than every recorded movement, even if the clock has been turned back or another process
+        recorded a movement within the same microsecond. Older databases get the time in whole seconds,
+        which their movement table requires. Must be called in the write transaction of the movement.
+
+        Args:
+            conn (sqlite3.Connection): The connection of the movement.
+
+        Returns:
+            str: The time of the movement.
+        """
+        columns = [column.name for column in self._query_builder(conn).catalog.columns("SIIRTOTAPAHTUMA")]
+        now = datetime.datetime.now()
+        if "Siirto_ID" not in columns:
+            return now.isoformat(" ", "seconds")
+        latest = conn.execute("SELECT MAX(Siirtoaika) FROM SIIRTOTAPAHTUMA").fetchone()[0]
+        if latest is not None:
+            now = max(now, datetime.datetime.fromisoformat(latest) + datetime.timedelta(microseconds=1))
+        return now.isoformat(" ", "microseconds")
+    
     # TODO: Make use of _query()
+    @_measured
+    @_retry_busy
     def move_pallet(self, pallet: int, move_to: int):
         """
         Moves a pallet to a new location in the warehouse and records the transaction in the database.
@@ -224,11 +1561,96 @@ class Database:
         """
         with self._conn as conn:
             cur = conn.cursor()
+            # The update takes the write lock, so the time is read after every earlier movement is committed
             cur.execute("UPDATE LAVA SET Sijainti = ? WHERE Lavanumero = ?", (move_to, pallet))
-            cur.execute("INSERT INTO SIIRTOTAPAHTUMA VALUES (?, ?, ?)",
-                        (datetime.datetime.now().isoformat(" ", "seconds"), pallet, move_to))
+            moved_at = self._movement_time(conn)
+            cur.execute(_MOVEMENT_INSERT, (moved_at, pallet, move_to))
+            conn.commit()
+            self._changed(conn, "UPDATE LAVA SET Sijainti = ? WHERE Lavanumero = ?", (move_to, pallet))
+            self._changed(conn, _MOVEMENT_INSERT, (moved_at, pallet, move_to))
+    
+    @_measured
+    @_retry_busy
+    def move_pallets(self, moves: Iterable[tuple[int, int]], check_occupancy: bool=True) -> list[MoveResult]:
+        """
+        Moves many pallets in a single transaction and records the transactions in the database.
+
+        The moves are checked in order against the current pallet locations and the moves accepted before
+        them, so a pallet moving out frees its location for a later move in the same batch. Rejected moves
+        are skipped and the rest are applied with executemany() and committed once.
+
+        Args:
+            moves (Iterable[tuple[int, int]]): (pallet, location) pairs to move.
+            check_occupancy (bool, optional): Whether to reject moves to missing or occupied locations.
+                                              Defaults to True.
+
+        Returns:
+            list[MoveResult]: The result of each move, in the order given.
+        """
+        moves = [(int(pallet), int(location)) for pallet, location in moves]
+        if not moves:
+            return []
+        with self._conn as conn:
+            cur = conn.cursor()
+            # Take the write lock before reading, so that no other process moves the pallets in between
+            if not conn.in_transaction:
+                cur.execute("BEGIN IMMEDIATE")
+            pallet_ids = json.dumps(sorted({pallet for pallet, _ in moves}))
+            location_ids = json.dumps(sorted({location for _, location in moves}))
+            pallet_at = dict(cur.execute(
+                "SELECT Lavanumero, Sijainti FROM LAVA WHERE Lavanumero IN (SELECT value FROM json_each(?))",
+                (pallet_ids,)
+                ).fetchall())
+            occupants = {}
+            existing = set()
+            if check_occupancy:
+                occupants = {location: pallet for location, pallet in cur.execute(
+                    "SELECT Sijainti, Lavanumero FROM LAVA WHERE Sijainti IN (SELECT value FROM json_each(?))",
+                    (location_ids,)
+                    )}
+                # Moving pallets may free their current locations for later moves in the batch
+                occupants.update((location, pallet) for pallet, location in pallet_at.items()
+                                 if location is not None)
+                existing = {row[0] for row in cur.execute(
+                    "SELECT STunniste FROM SIJAINTI WHERE STunniste IN (SELECT value FROM json_each(?))",
+                    (location_ids,)
+                    )}
+            
+            results = []
+            accepted = []
+            moved = set()
+            for pallet, location in moves:
+                reason = None
+                if pallet not in pallet_at:
+                    reason = "Lavaa {} ei ole olemassa.".format(pallet)
+                elif pallet in moved:
+                    reason = "Lava {} on jo siirretty tässä erässä.".format(pallet)
+                elif check_occupancy and location not in existing:
+                    reason = "Sijaintia ei ole olemassa."
+                elif check_occupancy and occupants.get(location, pallet) != pallet:
+                    reason = "Sijainti on jo varattu lavalle {}.".format(occupants[location])
+                if reason is None:
+                    if occupants.get(pallet_at[pallet]) == pallet:
+                        del occupants[pallet_at[pallet]]
+                    occupants[location] = pallet
+                    pallet_at[pallet] = location
+                    moved.add(pallet)
+                    accepted.append((pallet, location))
+                results.append(MoveResult(pallet, location, reason is None, reason))
+            
+            timestamp = self._movement_time(conn)
+            cur.executemany("UPDATE LAVA SET Sijainti = ? WHERE Lavanumero = ?",
+                            ((location, pallet) for pallet, location in accepted))
+            cur.executemany(_MOVEMENT_INSERT, ((timestamp, pallet, location) for pallet, location in accepted))
             conn.commit()
+            if accepted:
+                pallet, location = accepted[0]
+                self._changed(conn, "UPDATE LAVA SET Sijainti = ? WHERE Lavanumero = ?", (location, pallet))
+                self._changed(conn, _MOVEMENT_INSERT, (timestamp, pallet, location))
+        return results
     
+    @_measured
+    @_retry_busy
     def add_entry(self, table_name: str, values: tuple):
         """
         Adds a new entry to the specified table in the database.
@@ -240,20 +1662,31 @@ class Database:
         Returns:
             None
         """
-        table_name = self.sanitize(table_name)
-        values = tuple(self.sanitize(str(value)) for value in values)
+        values = tuple(values)
         try:
             with self._conn as conn:
+                builder = self._query_builder(conn)
+                query = builder.insert(table_name, len(values))
+                values = builder.row(table_name, values)
                 cur = conn.cursor()
-                cur.execute("INSERT INTO {} VALUES ({})".format(table_name, ", ".join("?"*len(values))), values)
+                cur.execute(query, values)
+                # Committed before the connection is closed or returned to the pool, which would roll back
+                conn.commit()
+                self._changed(conn, query, values)
+                self._tables_changed(builder.catalog.relation(table_name))
         except sql.IntegrityError:
             print("Virhe: Tietue on jo olemassa.")
-        except sql.OperationalError:
+        except sql.OperationalError as error:
+            if _is_busy(error) and self.busy_retries:
+                raise
             print("Virhe: Tietueen lisääminen ei onnistunut.")
+        except ValueError as error:
+            print("Virhe: {}".format(error))
         else:
-            conn.commit()
-            print("{} lisätty tauluun {}.".format(", ".join(values), table_name.upper()))
+            print("{} lisätty tauluun {}.".format(", ".join(map(str, values)), table_name.upper()))
     
+    @_measured
+    @_retry_busy
     def delete_entry(self, table_name: str, key: str, value: str):
         """
         Deletes an entry from the specified table in the database.
@@ -266,19 +1699,188 @@ class Database:
         Returns:
             None
         """
-        table_name = self.sanitize(table_name)
-        key = self.sanitize(key)
-        value = self.sanitize(value)
         try:
             with self._conn as conn:
+                builder = self._query_builder(conn)
+                query = builder.delete(table_name, key)
+                value = builder.catalog.convert(table_name, key, value)
                 cur = conn.cursor()
-                cur.execute("DELETE FROM {} WHERE {} = ?".format(table_name, key), (value,))
-        except sql.OperationalError:
+                cur.execute(query, (value,))
+                conn.commit()
+                self._changed(conn, query, (value,))
+                self._tables_changed(builder.catalog.relation(table_name))
+        except sql.OperationalError as error:
+            if _is_busy(error) and self.busy_retries:
+                raise
             print("Virhe: Tietueen poistaminen ei onnistunut.")
+        except ValueError as error:
+            print("Virhe: {}".format(error))
         else:
-            conn.commit()
             print("Tietue poistettu taulusta {}.".format(table_name.upper()))
     
+    @_measured
+    @_retry_busy
+    def import_files(self, files: Iterable[tuple[str, str]], chunk_size: int=varastotuonti.CHUNK_SIZE,
+                     delimiter: str|None=None) -> list[varastotuonti.ImportResult]:
+        """
+        Imports CSV or Parquet files into TUOTE, ERÄ, LAVA and ERÄ_LAVALLA in one transaction, see
+        varastotuonti.import_files().
+
+        Args:
+            files (Iterable[tuple[str, str]]): (table, path) pairs.
+            chunk_size (int, optional): Rows per insert statement. Defaults to varastotuonti.CHUNK_SIZE.
+            delimiter (str|None, optional): The field separator of CSV files. Defaults to None to detect it.
+
+        Returns:
+            list[varastotuonti.ImportResult]: The imported and rejected rows of each file.
+
+        Raises:
+            ValueError: If a table or column is unknown or a file cannot be read.
+        """
+        files = list(files)
+        with self._conn as conn:
+            builder = self._query_builder(conn)
+            results = varastotuonti.import_files(conn, files, chunk_size, builder.catalog, delimiter)
+            for result in results:
+                if result.imported:
+                    self._changed(conn, "INSERT INTO {} DEFAULT VALUES".format(builder.relation(result.table)))
+                    self._tables_changed(result.table)
+        return results
+    
+    @_measured
+    @_retry_busy
+    def export(self, exports: Iterable[tuple[str, str]],
+               batch_size: int=varastovienti.EXPORT_BATCH) -> list[varastovienti.ExportResult]:
+        """
+        Writes tables and views to CSV, JSON Lines or Parquet files from one consistent state of the database,
+        see varastovienti.export_relations().
+
+        Args:
+            exports (Iterable[tuple[str, str]]): (table or view, path) pairs.
+            batch_size (int, optional): Rows fetched at a time. Defaults to varastovienti.EXPORT_BATCH.
+
+        Returns:
+            list[varastovienti.ExportResult]: The number of exported rows of each relation.
+
+        Raises:
+            ValueError: If a relation does not exist or a format is not supported.
+        """
+        exports = list(exports)
+        with self._conn as conn:
+            return varastovienti.export_relations(conn, exports, batch_size, self._query_builder(conn).catalog)
+    
+    @_measured
+    @_retry_busy
+    def snapshot(self, path: str) -> int:
+        """
+        Copies the database to a file with the backup API without blocking writers in the concurrency mode,
+        see varastovienti.snapshot().
+
+        Args:
+            path (str): The path to the copy.
+
+        Returns:
+            int: The size of the copy in pages.
+        """
+        with self._conn as conn:
+            return varastovienti.snapshot(conn, path)
+    
+    @_measured
+    @_retry_busy
+    def archive_movements(self, retention_days: int=varastoarkisto.RETENTION_DAYS,
+                          archive_path: str|None=None) -> int:
+        """
+        Moves the movements older than the retention period from SIIRTOTAPAHTUMA to the archive database,
+        see varastoarkisto.archive().
+
+        Args:
+            retention_days (int, optional): Days of movement history to keep. Defaults to
+                                            varastoarkisto.RETENTION_DAYS.
+            archive_path (str|None, optional): The path to the archive. Defaults to None for the archive next
+                                               to the database.
+
+        Returns:
+            int: The number of archived movements.
+
+        Raises:
+            ValueError: If the retention period is negative or the database has not been upgraded.
+        """
+        path = archive_path or varastoarkisto.archive_path(self._conn.db_path)
+        with self._conn as conn:
+            count = varastoarkisto.archive(conn, path, retention_days)
+        if count and self._cache is not None:
+            self._cache.invalidate(("SIIRTOTAPAHTUMA", "SIIRTOARKISTO"))
+        return count
+    
+    @_measured
+    def last_movement(self, pallet: int) -> tuple[str, int]|None:
+        """
+        Returns the latest movement of a pallet from the per-pallet movement rollup, which is a single seek
+        and also covers archived movements. Falls back to the newest row of SIIRTOTAPAHTUMA in databases
+        without the rollup.
+
+        Args:
+            pallet (int): The ID of the pallet.
+
+        Returns:
+            tuple[str, int]|None: The time of the movement and the location the pallet was moved to, or None
+                                  if the pallet has never been moved.
+        """
+        if self._has_relations("SIIRROT_LAVOITTAIN"):
+            res = self._query("SELECT Viimeisin, Viimeisin_sijainti FROM SIIRROT_LAVOITTAIN WHERE Lavanumero = ?",
+                              (pallet,))
+        else:
+            res = self._query("SELECT Siirtoaika, Sijainti FROM SIIRTOTAPAHTUMA WHERE Lavanumero = ? "
+                              "ORDER BY Siirtoaika DESC LIMIT 1", (pallet,))
+        return res[0] if res else None
+    
+    @_measured
+    def movement_history(self, pallet: int, archive_path: str|None=None) -> list[tuple[str, int]]:
+        """
+        Returns every movement of a pallet, including the archived ones, oldest first.
+
+        Args:
+            pallet (int): The ID of the pallet.
+            archive_path (str|None, optional): The path to the archive. Defaults to None for the archive next
+                                               to the database.
+
+        Returns:
+            list[tuple[str, int]]: The time of each movement and the location the pallet was moved to.
+        """
+        path = archive_path or varastoarkisto.archive_path(self._conn.db_path)
+        with self._conn as conn:
+            if not os.path.exists(path):
+                return self._execute("SELECT Siirtoaika, Sijainti FROM SIIRTOTAPAHTUMA WHERE Lavanumero = ? "
+                                     "ORDER BY Siirtoaika", (pallet,), conn)[1]
+            varastoarkisto.attach(conn, path)
+            return self._execute("SELECT Siirtoaika, Sijainti FROM SIIRTOHISTORIA WHERE Lavanumero = ? "
+                                 "ORDER BY Siirtoaika", (pallet,), conn)[1]
+    
+    @_measured
+    def location_id(self, location: str, warehouse: int|str) -> int|None:
+        """
+        Finds the ID of a location from its string representation.
+
+        Args:
+            location (str): The location, in the format "aisle-section-floor" or "floor_unit" (eg. "RU1234").
+            warehouse (int|str): The ID of the warehouse the location is in.
+
+        Returns:
+            int|None: The ID of the location, or None if there is no such location.
+        """
+        location = self.sanitize(location).upper()
+        if not self.is_location_format(location)[0]:
+            return None
+        if self._has_relations("SIJKOODITA"):
+            res = self._query("SELECT STunniste FROM SIJAINTI WHERE Sijaintikoodi = ? AND Varasto = ?",
+                              (location, warehouse))
+        else:
+            res = self._query("""
+                              SELECT STunniste FROM SIJAINTI
+                              WHERE SIJAINTI_STR(Hyllyväli, Sektio, Kerros, Kuormaruutu) = ? AND Varasto = ?
+                              """, (location, warehouse))
+        return res[0][0] if res else None
+    
     @staticmethod
     def is_location_format(location: str):
         """
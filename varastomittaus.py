@@ -0,0 +1,424 @@
+"""
+Metrics of the statements run on SQLite connections: latency histograms, rows returned, virtual machine steps
+and the cost of opening connections, with a log of the slow statements and their query plans.
+
+A trace callback sees every statement when it starts to run and a progress handler counts the virtual machine
+instructions executed, progress_steps at a time. The trace callback only reports starts, so a statement is
+finished when the next statement on the same connection starts or when finish() is called, which Database
+does after fetching the rows of a query and before a connection is closed or returned to the pool. The time
+of a statement therefore includes the time spent fetching its rows. Trigger programs report the statement
+that fired them again and are counted as part of it.
+
+Statements are keyed by their text with the literals replaced by ? and the whitespace collapsed, so the
+executions of a statement with different parameters share their counters. The query plan of a slow statement
+is captured with EXPLAIN QUERY PLAN once the connection is free again, so it is the plan for the schema and
+statistics at that time. The metrics can be read as a dict, JSON or the Prometheus text exposition format.
+"""
+import bisect
+import collections
+import itertools
+import json
+import re
+import sqlite3 as sql
+import threading
+import time
+from typing import NamedTuple
+
+# Upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+# Virtual machine instructions between calls of the progress handler
+PROGRESS_STEPS = 1000
+
+# Statements taking at least this many seconds are logged with their query plan
+SLOW_QUERY_SECONDS = 0.1
+SLOW_LOG_SIZE = 100
+# Longer statement texts are cut in the slow log
+SLOW_TEXT_LENGTH = 2000
+
+# Distinct statements counted separately; the rest are counted together under OTHER_STATEMENTS
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "(other)"
+# Statements as run whose normalized text is remembered, so that statements without parameters, such as
+# BEGIN and COMMIT, are normalized only once
+_NORMALIZED_SIZE = 1024
+
+# String and blob literals, numbers not part of a name, and IN lists of any length. The expressions are kept
+# simple, as every statement is normalized while it runs.
+_STRINGS = re.compile(r"'[^']*(?:''[^']*)*'")
+_NUMBERS = re.compile(r"(?a)\b[0-9]+(?:\.[0-9]*)?(?:[eE][+-]?[0-9]+)?\b")
+_IN_LISTS = re.compile(r"\bIN \(\?(?: ?, ?\?)+\)", re.IGNORECASE)
+
+def normalize(statement: str) -> str:
+    """
+    Replaces the literals of a statement with ? and collapses its whitespace and IN lists.
+
+    Args:
+        statement (str): The statement, eg. as reported by a trace callback with its parameters expanded.
+
+    Returns:
+        str: The normalized statement, eg. "SELECT * FROM LAVA WHERE Lavanumero IN (?, ...)".
+    """
+    statement = " ".join(_NUMBERS.sub("?", _STRINGS.sub("?", statement)).split())
+    if "?," in statement:
+        statement = _IN_LISTS.sub("IN (?, ...)", statement)
+    return statement
+
+class SlowQuery(NamedTuple):
+    """
+    A statement that took at least the slow query threshold.
+
+    Attributes:
+        statement (str): The normalized statement.
+        text (str): The statement as run, with its parameters, cut to SLOW_TEXT_LENGTH characters.
+        seconds (float): The time from the start of the statement until it was finished.
+        rows (int|None): The number of rows fetched, or None if not known.
+        steps (int): The virtual machine instructions executed, in multiples of the progress steps.
+        plan (list[str]): The detail column of each EXPLAIN QUERY PLAN row, empty for statements without a plan.
+        at (float): The time the statement finished as seconds since the epoch.
+    """
+    statement: str
+    text: str
+    seconds: float
+    rows: int|None
+    steps: int
+    plan: list[str]
+    at: float
+
+class Histogram:
+    """
+    Counts of observed values in buckets by their upper bounds, and the sum of the values. Not thread safe.
+
+    Args:
+        bounds (tuple[float, ...], optional): The upper bounds of the buckets in ascending order, to which one
+                                              for all larger values is added. Defaults to LATENCY_BUCKETS.
+
+    Attributes:
+        count (int): The number of observed values.
+        sum (float): The sum of the observed values.
+    """
+    def __init__(self, bounds: tuple[float, ...]=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def buckets(self) -> dict[str, int]:
+        """
+        Returns the cumulative counts of the buckets.
+
+        Returns:
+            dict[str, int]: The number of values at most each upper bound, keyed by the bound as in Prometheus
+                            le labels, ending with "+Inf".
+        """
+        labels = [repr(bound) for bound in self.bounds] + ["+Inf"]
+        return dict(zip(labels, itertools.accumulate(self.counts)))
+
+class _StatementStats:
+    __slots__ = ("latency", "rows", "steps")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.latency = Histogram(bounds)
+        self.rows = 0
+        self.steps = 0
+
+class _Tracer:
+    """
+    The statement running on a connection. Used only by the thread holding the connection.
+
+    Attributes:
+        text (str|None): The running statement as reported by the trace callback, or None.
+        started (float): The time.perf_counter() value when the statement started.
+        steps (int): The virtual machine instructions executed by the statement so far.
+        paused (bool): Whether the callbacks ignore the statements, while a query plan is captured.
+        pending (list[SlowQuery]): Slow statements whose plan is captured when the connection is free.
+    """
+    __slots__ = ("text", "started", "steps", "paused", "pending")
+
+    def __init__(self):
+        self.text = None
+        self.started = 0.0
+        self.steps = 0
+        self.paused = False
+        self.pending = []
+
+class MeasuredConnection(sql.Connection):
+    """
+    A SQLite connection that keeps the running statement for Metrics. Pass as the factory argument of
+    sqlite3.connect(), as plain connections take no attributes.
+    """
+    tracer = None
+
+class Metrics:
+    """
+    Collects the metrics of the statements run on the connections it is installed on. Thread safe, so one
+    instance can be shared by the connections of several pools.
+
+    Args:
+        slow_query_seconds (float, optional): The time from which a statement is logged as slow.
+                                              Defaults to SLOW_QUERY_SECONDS.
+        slow_log_size (int, optional): The number of latest slow statements kept. Defaults to SLOW_LOG_SIZE.
+        progress_steps (int, optional): The virtual machine instructions between calls of the progress
+                                        handler, or 0 not to count them. Defaults to PROGRESS_STEPS.
+        bounds (tuple[float, ...], optional): The upper bounds of the latency buckets in seconds.
+                                              Defaults to LATENCY_BUCKETS.
+
+    Attributes:
+        slow_queries (collections.deque[SlowQuery]): The latest slow statements, oldest first.
+    """
+    def __init__(self, slow_query_seconds: float=SLOW_QUERY_SECONDS, slow_log_size: int=SLOW_LOG_SIZE,
+                 progress_steps: int=PROGRESS_STEPS, bounds: tuple[float, ...]=LATENCY_BUCKETS):
+        self.slow_query_seconds = slow_query_seconds
+        self.progress_steps = progress_steps
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._normalized = {}
+        self.reset(slow_log_size)
+
+    def reset(self, slow_log_size: int|None=None):
+        """
+        Discards the collected metrics.
+
+        Args:
+            slow_log_size (int|None, optional): A new size of the slow query log, or None to keep the size.
+                                                Defaults to None.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if slow_log_size is None:
+                slow_log_size = self.slow_queries.maxlen
+            self._statements = {}
+            self._operations = {}
+            self._operation_errors = collections.Counter()
+            self._connections = Histogram(self.bounds)
+            self.slow_queries = collections.deque(maxlen=slow_log_size)
+            self.slow_total = 0
+
+    def install(self, connection: MeasuredConnection):
+        """
+        Sets the trace callback and the progress handler of a connection to collect its metrics. Any earlier
+        callbacks of the connection are replaced.
+
+        Args:
+            connection (MeasuredConnection): The connection, opened with MeasuredConnection as its factory.
+
+        Returns:
+            None
+        """
+        tracer = _Tracer()
+        connection.tracer = tracer
+        steps = self.progress_steps
+
+        def trace(text):
+            # A trigger program reports the statement that fired it again, and the statements run by virtual
+            # tables such as FTS5 are reported as comments
+            if tracer.paused or text == tracer.text or text.startswith("--"):
+                return
+            now = time.perf_counter()
+            if tracer.text is not None:
+                self._finish(tracer, now, None)
+            tracer.text = text
+            tracer.started = now
+
+        def progress():
+            if not tracer.paused:
+                tracer.steps += steps
+
+        connection.set_trace_callback(trace)
+        if steps > 0:
+            connection.set_progress_handler(progress, steps)
+
+    def finish(self, connection: sql.Connection, rows: int|None=None):
+        """
+        Finishes the running statement of a connection and captures the query plans of its slow statements.
+        Must not be called from a callback of the connection. Does nothing if the metrics are not installed.
+
+        Args:
+            connection (sqlite3.Connection): The connection.
+            rows (int|None, optional): The number of rows fetched by the statement, or None if not known.
+                                       Defaults to None.
+
+        Returns:
+            None
+        """
+        tracer = getattr(connection, "tracer", None)
+        if tracer is None:
+            return
+        if tracer.text is not None:
+            self._finish(tracer, time.perf_counter(), rows)
+        if tracer.pending:
+            self._capture_plans(connection, tracer)
+
+    def _finish(self, tracer: _Tracer, now: float, rows: int|None):
+        seconds = now - tracer.started
+        statement = self._normalized.get(tracer.text)
+        if statement is None:
+            if len(self._normalized) >= _NORMALIZED_SIZE:
+                self._normalized.clear()
+            statement = self._normalized[tracer.text] = normalize(tracer.text)
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    statement = OTHER_STATEMENTS
+                    stats = self._statements.get(statement)
+                if stats is None:
+                    stats = self._statements[statement] = _StatementStats(self.bounds)
+            stats.latency.observe(seconds)
+            stats.rows += rows or 0
+            stats.steps += tracer.steps
+        if seconds >= self.slow_query_seconds:
+            tracer.pending.append(SlowQuery(statement, tracer.text, seconds, rows, tracer.steps, [], time.time()))
+        tracer.text = None
+        tracer.steps = 0
+
+    def _capture_plans(self, connection: sql.Connection, tracer: _Tracer):
+        pending, tracer.pending = tracer.pending, []
+        entries = []
+        tracer.paused = True
+        try:
+            for entry in pending:
+                try:
+                    plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + entry.text)]
+                except sql.Error:
+                    plan = []
+                entries.append(entry._replace(text=entry.text[:SLOW_TEXT_LENGTH], plan=plan))
+        finally:
+            tracer.paused = False
+        with self._lock:
+            self.slow_queries.extend(entries)
+            self.slow_total += len(entries)
+
+    def connection_opened(self, seconds: float):
+        """
+        Records the time it took to open a connection and prepare it for use.
+
+        Args:
+            seconds (float): The time in seconds.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connections.observe(seconds)
+
+    def operation(self, name: str, seconds: float, failed: bool=False):
+        """
+        Records the duration of an operation made of any number of statements, eg. a Database method.
+
+        Args:
+            name (str): The name of the operation.
+            seconds (float): The time in seconds.
+            failed (bool, optional): Whether the operation raised an exception. Defaults to False.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            histogram = self._operations.get(name)
+            if histogram is None:
+                histogram = self._operations[name] = Histogram(self.bounds)
+            histogram.observe(seconds)
+            if failed:
+                self._operation_errors[name] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns the collected metrics.
+
+        Returns:
+            dict: "statements" maps each normalized statement to its count, total seconds, rows, steps and
+                  cumulative latency buckets; "operations" maps each operation to its count, errors, total
+                  seconds and buckets; "connections" has the count, total seconds and buckets of the opened
+                  connections; "slow_queries" lists the logged slow statements as dicts, oldest first, and
+                  "slow_total" counts every slow statement including those no longer logged.
+        """
+        with self._lock:
+            return {
+                "statements": {
+                    statement: {"count": stats.latency.count, "seconds": stats.latency.sum, "rows": stats.rows,
+                                "steps": stats.steps, "buckets": stats.latency.buckets()}
+                    for statement, stats in self._statements.items()
+                },
+                "operations": {
+                    name: {"count": histogram.count, "errors": self._operation_errors[name],
+                           "seconds": histogram.sum, "buckets": histogram.buckets()}
+                    for name, histogram in self._operations.items()
+                },
+                "connections": {"count": self._connections.count, "seconds": self._connections.sum,
+                                "buckets": self._connections.buckets()},
+                "slow_queries": [entry._asdict() for entry in self.slow_queries],
+                "slow_total": self.slow_total,
+            }
+
+    def to_json(self, indent: int|None=None) -> str:
+        """
+        Returns the collected metrics as JSON, see snapshot().
+
+        Args:
+            indent (int|None, optional): Passed on to json.dumps(). Defaults to None.
+
+        Returns:
+            str: The JSON document.
+        """
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self, prefix: str="varasto") -> str:
+        """
+        Returns the collected metrics in the Prometheus text exposition format. The slow query log is only
+        counted, as its statements and plans do not fit in metrics.
+
+        Args:
+            prefix (str, optional): The prefix of the metric names. Defaults to "varasto".
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def header(name, kind, description):
+            lines.append("# HELP {}_{} {}".format(prefix, name, description))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+        def histogram(name, label, values):
+            for key, value in values.items():
+                labels = ['{}="{}"'.format(label, _escape(key))] if label else []
+                for bound, count in value["buckets"].items():
+                    bucket = ",".join(labels + ['le="{}"'.format(bound)])
+                    lines.append("{}_{}_bucket{{{}}} {}".format(prefix, name, bucket, count))
+                labels = "{" + labels[0] + "}" if labels else ""
+                lines.append("{}_{}_sum{} {!r}".format(prefix, name, labels, value["seconds"]))
+                lines.append("{}_{}_count{} {}".format(prefix, name, labels, value["count"]))
+
+        def counter(name, label, values, field):
+            for key, value in values.items():
+                lines.append('{}_{}{{{}="{}"}} {}'.format(prefix, name, label, _escape(key), value[field]))
+
+        statements = snapshot["statements"]
+        header("statement_seconds", "histogram", "Time from the start of a statement until it was finished.")
+        histogram("statement_seconds", "statement", statements)
+        header("statement_rows_total", "counter", "Rows fetched by the statements.")
+        counter("statement_rows_total", "statement", statements, "rows")
+        header("statement_steps_total", "counter", "SQLite virtual machine instructions executed by the statements.")
+        counter("statement_steps_total", "statement", statements, "steps")
+        header("operation_seconds", "histogram", "Duration of the database operations.")
+        histogram("operation_seconds", "operation", snapshot["operations"])
+        header("operation_errors_total", "counter", "Database operations that raised an exception.")
+        counter("operation_errors_total", "operation", snapshot["operations"], "errors")
+        header("connection_open_seconds", "histogram", "Time to open a connection and prepare it for use.")
+        histogram("connection_open_seconds", None, {"": snapshot["connections"]})
+        header("slow_statements_total", "counter", "Statements that took at least the slow query threshold.")
+        lines.append("{}_slow_statements_total {}".format(prefix, snapshot["slow_total"]))
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,253 @@
+"""
+Putaway recommendations: the free locations of a warehouse ranked for a pallet from an index kept in memory.
+
+The cost of a free shelf location is
+    AISLE_WEIGHT * |Hyllyväli - dock aisle| + LEVEL_WEIGHT * (Kerros - 1) + SECTION_WEIGHT * (Sektio - 1)
+less CLUSTER_BONUS if the aisle already holds a pallet of the same product group (Tuoteryhmä). Floor units
+(Kuormaruutu) have no aisle and cost FLOOR_UNIT_COST, so they are offered when the nearby shelves are full.
+
+The free locations are kept in buckets by aisle and level, the buckets sorted by their cost and the
+locations of a bucket by section. A recommendation visits the buckets cheapest first and stops as soon as
+no later bucket can beat the locations found, so it only looks at a few buckets however large the
+warehouse is. The index follows the movement log SIIRTOTAPAHTUMA: refresh() applies the movements
+recorded after the previous refresh, also those of other processes.
+"""
+import bisect
+import collections
+import heapq
+import sqlite3 as sql
+import threading
+from typing import NamedTuple
+
+# Aisle the pallets arrive to, unless given for the warehouse
+DOCK_AISLE = 1
+
+# Weights of the cost of a location
+AISLE_WEIGHT = 1.0
+LEVEL_WEIGHT = 2.0
+SECTION_WEIGHT = 0.1
+CLUSTER_BONUS = 5.0
+FLOOR_UNIT_COST = 100.0
+
+# The tables the index is built from, besides the movements
+TABLES = ("SIJAINTI", "LAVA", "ERÄ_LAVALLA", "ERÄ", "TUOTE")
+
+# The bucket of the floor units of a warehouse
+_FLOOR_UNITS = (None, None)
+
+class Recommendation(NamedTuple):
+    """
+    A free location recommended for a pallet.
+
+    Attributes:
+        location (int): The ID of the location (STunniste).
+        code (str): The string representation of the location, eg. "12-3-4" or "RU941".
+        cost (float): The cost of the location, lower is better.
+    """
+    location: int
+    code: str
+    cost: float
+
+class _Slot(NamedTuple):
+    warehouse: int
+    aisle: int|None
+    section: int
+    level: int|None
+    code: str
+
+class PutawayIndex:
+    """
+    An in-memory index of the free locations of every warehouse for putaway recommendations. Thread safe.
+
+    Args:
+        docks (dict[int, int]|None, optional): The dock aisle of each warehouse. Defaults to None for
+                                               DOCK_AISLE in every warehouse.
+
+    Attributes:
+        last_movement (int): The rowid of the last applied movement of SIIRTOTAPAHTUMA.
+    """
+    def __init__(self, docks: dict[int, int]|None=None):
+        self.docks = dict(docks or {})
+        self.last_movement = 0
+        self._slots = {}
+        # location -> pallets in it
+        self._occupants = collections.defaultdict(set)
+        # pallet -> location, product group
+        self._pallet_at = {}
+        self._pallet_group = {}
+        # warehouse -> bucket -> sorted [(section, location)] of the free locations
+        self._free = collections.defaultdict(dict)
+        # warehouse -> sorted [(cost, bucket)] of every bucket
+        self._buckets = {}
+        # warehouse -> aisle -> product group -> pallets
+        self._groups = collections.defaultdict(lambda: collections.defaultdict(collections.Counter))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, connection: sql.Connection, docks: dict[int, int]|None=None) -> "PutawayIndex":
+        """
+        Builds the index from the locations, pallets and movements of a database in one read transaction.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the warehouse database.
+            docks (dict[int, int]|None, optional): The dock aisle of each warehouse. Defaults to None for
+                                                   DOCK_AISLE.
+
+        Returns:
+            PutawayIndex: The index.
+        """
+        index = cls(docks)
+        began = not connection.in_transaction
+        if began:
+            connection.execute("BEGIN;")
+        try:
+            for location, warehouse, aisle, section, level, code in connection.execute("""
+                    SELECT STunniste, Varasto, Hyllyväli, Sektio, Kerros,
+                           COALESCE(Hyllyväli || '-' || Sektio || '-' || Kerros, Kuormaruutu)
+                    FROM SIJAINTI;
+                    """):
+                if aisle is None or section is None or level is None:
+                    aisle, section, level = None, 1, None
+                index._slots[location] = _Slot(warehouse, aisle, section, level, code)
+            for pallet, location, group in connection.execute("""
+                    SELECT L.Lavanumero, L.Sijainti, MIN(T.Tuoteryhmä)
+                    FROM LAVA L LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
+                    LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
+                    LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
+                    GROUP BY L.Lavanumero;
+                    """):
+                index._pallet_group[pallet] = group
+                index._pallet_at[pallet] = location
+                if location in index._slots:
+                    index._occupants[location].add(pallet)
+                    index._count_group(location, group, 1)
+            index.last_movement = connection.execute(
+                "SELECT IFNULL(MAX(rowid), 0) FROM SIIRTOTAPAHTUMA;").fetchone()[0]
+        finally:
+            if began:
+                connection.rollback()
+        buckets = collections.defaultdict(set)
+        for location, slot in index._slots.items():
+            bucket = (slot.aisle, slot.level)
+            buckets[slot.warehouse].add(bucket)
+            if not index._occupants.get(location):
+                index._free[slot.warehouse].setdefault(bucket, []).append((slot.section, location))
+        for free in index._free.values():
+            for slots in free.values():
+                slots.sort()
+        for warehouse, keys in buckets.items():
+            dock = index.docks.get(warehouse, DOCK_AISLE)
+            index._buckets[warehouse] = sorted(
+                ((FLOOR_UNIT_COST if bucket == _FLOOR_UNITS else
+                  AISLE_WEIGHT * abs(bucket[0] - dock) + LEVEL_WEIGHT * (bucket[1] - 1), bucket)
+                 for bucket in keys), key=lambda item: item[0])
+        return index
+
+    def _count_group(self, location: int, group: str|None, change: int):
+        slot = self._slots[location]
+        if group is None or slot.aisle is None:
+            return
+        counts = self._groups[slot.warehouse][slot.aisle]
+        counts[group] += change
+        if counts[group] <= 0:
+            del counts[group]
+
+    def _place(self, pallet: int, location: int|None):
+        previous = self._pallet_at.get(pallet)
+        if previous == location:
+            return
+        group = self._pallet_group.get(pallet)
+        if previous in self._slots:
+            occupants = self._occupants[previous]
+            occupants.discard(pallet)
+            self._count_group(previous, group, -1)
+            if not occupants:
+                slot = self._slots[previous]
+                bisect.insort(self._free[slot.warehouse].setdefault((slot.aisle, slot.level), []),
+                              (slot.section, previous))
+        self._pallet_at[pallet] = location
+        if location in self._slots:
+            occupants = self._occupants[location]
+            if not occupants:
+                slot = self._slots[location]
+                slots = self._free[slot.warehouse].get((slot.aisle, slot.level), [])
+                i = bisect.bisect_left(slots, (slot.section, location))
+                if i < len(slots) and slots[i] == (slot.section, location):
+                    del slots[i]
+            occupants.add(pallet)
+            self._count_group(location, group, 1)
+
+    def place(self, pallet: int, location: int|None):
+        """
+        Records that a pallet is in a location, freeing its previous location.
+
+        Args:
+            pallet (int): The ID of the pallet.
+            location (int|None): The ID of the location, or None if the pallet is not in the warehouse.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._place(pallet, location)
+
+    def refresh(self, connection: sql.Connection) -> int:
+        """
+        Applies the movements recorded in SIIRTOTAPAHTUMA after the last applied one.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the warehouse database.
+
+        Returns:
+            int: The number of applied movements.
+        """
+        with self._lock:
+            rows = connection.execute("SELECT rowid, Lavanumero, Sijainti FROM SIIRTOTAPAHTUMA WHERE rowid > ? "
+                                      "ORDER BY rowid;", (self.last_movement,)).fetchall()
+            for movement, pallet, location in rows:
+                self._place(pallet, location)
+                self.last_movement = movement
+            return len(rows)
+
+    def recommend(self, warehouse: int, count: int=5, pallet: int|None=None,
+                  group: str|None=None) -> list[Recommendation]:
+        """
+        Returns the cheapest free locations of a warehouse.
+
+        Args:
+            warehouse (int): The ID of the warehouse.
+            count (int, optional): The maximum number of locations. Defaults to 5.
+            pallet (int|None, optional): The pallet to put away, whose product group is used for clustering.
+                                         Defaults to None.
+            group (str|None, optional): The product group, if not that of the pallet. Defaults to None.
+
+        Returns:
+            list[Recommendation]: The locations, cheapest first.
+        """
+        with self._lock:
+            if group is None and pallet is not None:
+                group = self._pallet_group.get(pallet)
+            free = self._free.get(warehouse, {})
+            groups = self._groups.get(warehouse, {})
+            bonus = CLUSTER_BONUS if group is not None else 0.0
+            # The count cheapest found so far as (-cost, -location), most expensive first
+            best = []
+            for cost, bucket in self._buckets.get(warehouse, ()):
+                if len(best) >= count and cost - bonus > -best[0][0]:
+                    break
+                slots = free.get(bucket)
+                if not slots:
+                    continue
+                aisle = bucket[0]
+                if bonus and aisle is not None and groups.get(aisle, {}).get(group):
+                    cost -= bonus
+                for section, location in slots:
+                    slot_cost = cost + SECTION_WEIGHT * (section - 1)
+                    if len(best) < count:
+                        heapq.heappush(best, (-slot_cost, -location))
+                    elif (-slot_cost, -location) > best[0]:
+                        heapq.heapreplace(best, (-slot_cost, -location))
+                    else:
+                        break
+            return [Recommendation(-location, self._slots[-location].code, round(-cost, 6))
+                    for cost, location in sorted(best, reverse=True)]
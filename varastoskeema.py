@@ -0,0 +1,789 @@
+"""
+Views and schema extensions of the warehouse database that are created together with the tables in
+create_db.py and can be added to existing databases with upgrade().
+"""
+import sqlite3 as sql
+
+# Stored string representation of a location, same as location_to_str() in varastologiikka.py
+# (eg. "12-3-4" or "RU941"), so that locations can be looked up with an index
+LOCATION_CODE = """
+    Sijaintikoodi VARCHAR(20) COLLATE NOCASE
+        GENERATED ALWAYS AS (COALESCE(Hyllyväli || '-' || Sektio || '-' || Kerros, Kuormaruutu)) VIRTUAL
+    """
+
+# Movement events. Siirto_ID orders the events and never repeats, also after archiving, so a pallet can be
+# moved any number of times within a second. Siirtoaika has microseconds and increases with Siirto_ID;
+# movements of databases created before Siirto_ID keep their times with whole seconds.
+MOVEMENTS = """
+    CREATE TABLE {}
+        (Siirto_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+         Siirtoaika VARCHAR(26) NOT NULL
+                    CHECK (Siirtoaika LIKE '____-__-__ __:__:__' OR Siirtoaika LIKE '____-__-__ __:__:__.______'),
+         Lavanumero INTEGER NOT NULL,
+         Sijainti INTEGER NOT NULL,
+        FOREIGN KEY (Lavanumero) REFERENCES LAVA(Lavanumero)
+                    ON DELETE CASCADE ON UPDATE CASCADE,
+        FOREIGN KEY (Sijainti) REFERENCES SIJAINTI(STunniste)
+                    ON DELETE CASCADE ON UPDATE CASCADE );
+    """
+
+# The counts of VARASTOTIEDOT and TUOTETIEDOT are read from the summary tables, see SUMMARIES
+# View name: SELECT statement
+VIEWS = {
+    "TUOTETIEDOT": """
+        SELECT T.*, IFNULL(ET.Erämäärä, 0) AS Erämäärä
+        FROM TUOTE T LEFT OUTER JOIN ERÄT_TUOTTEITTAIN ET ON T.Tuotenumero = ET.Tuotenumero;
+        """,
+    "TUOTEERÄT": """
+        SELECT T.Nimi, T.Valmistaja, E.*, T.Tuoteryhmä, T.Säilytyslt, EL.Lavanumero, L.Tyyppi,
+               S.Sijaintikoodi AS Sijainti, S.Varasto
+        FROM ERÄ E JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
+        LEFT OUTER JOIN ERÄ_LAVALLA EL ON E.Eränumero = EL.Eränumero
+        LEFT OUTER JOIN LAVA L ON EL.Lavanumero = L.Lavanumero
+        LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste;
+        """,
+    "LAVAPAIKAT": """
+        SELECT S.Sijaintikoodi AS Sijainti,
+               S.Varasto, L.Lavanumero, L.Tyyppi, T.Nimi, E.PE_pvm, E.Ltk_määrä,
+               S.STunniste AS Sijainti_ID
+        FROM SIJAINTI S LEFT OUTER JOIN LAVA L ON S.STunniste = L.Sijainti
+        LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
+        LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
+        LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero;
+        """,
+    "LAVATIEDOT": """
+        SELECT L.Lavanumero, L.Tyyppi, S.Sijaintikoodi AS Sijainti,
+               E.Ltk_määrä, T.Nimi AS Tuotenimi, E.PE_pvm, SL.Viimeisin AS Siirtoaika
+        FROM LAVA L LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste
+        LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
+        LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
+        LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
+        LEFT OUTER JOIN SIIRROT_LAVOITTAIN SL ON L.Lavanumero = SL.Lavanumero
+        GROUP BY L.Lavanumero;
+        """,
+    "VARASTOTIEDOT": """
+        SELECT V.VTunniste AS Tunniste, V.Osoite, IFNULL(SV.Lavat, 0) AS Lavat,
+               IFNULL(SV.Lavapaikat, 0) AS Lavapaikat
+        FROM VARASTO V LEFT OUTER JOIN SIJAINNIT_VARASTOITTAIN SV ON V.VTunniste = SV.Varasto;
+        """,
+    "LAVASIIRROT": """
+        SELECT L.Lavanumero, ST.Siirtoaika, S.Sijaintikoodi AS Sijainti,
+               L.Tyyppi, T.Nimi AS Tuotenimi, E.PE_pvm
+        FROM LAVA L LEFT OUTER JOIN SIJAINTI S ON L.Sijainti = S.STunniste
+        LEFT OUTER JOIN ERÄ_LAVALLA EL ON L.Lavanumero = EL.Lavanumero
+        LEFT OUTER JOIN ERÄ E ON EL.Eränumero = E.Eränumero
+        LEFT OUTER JOIN TUOTE T ON E.Tuotenumero = T.Tuotenumero
+        LEFT OUTER JOIN SIIRTOTAPAHTUMA ST ON L.Lavanumero = ST.Lavanumero
+        GROUP BY L.Lavanumero, ST.Siirtoaika;
+        """,
+}
+
+# Secondary indexes on the foreign key columns the views join on. The movements of a pallet are indexed
+# newest first, so that its latest movement is a single seek. The batches of a product are indexed in the
+# order they expire (PE_pvm is an ISO date, so it sorts as text) for first-expired-first-out picking, and
+# all batches by their expiry for finding the ones about to expire.
+# Index name: CREATE statement
+INDEXES = {
+    "LAVASIJIX": "CREATE INDEX IF NOT EXISTS LAVASIJIX ON LAVA(Sijainti);",
+    "SIJVARIX": "CREATE INDEX IF NOT EXISTS SIJVARIX ON SIJAINTI(Varasto);",
+    "ELERÄIX": "CREATE INDEX IF NOT EXISTS ELERÄIX ON ERÄ_LAVALLA(Eränumero);",
+    "ERÄTUOTEPEIX": "CREATE INDEX IF NOT EXISTS ERÄTUOTEPEIX ON ERÄ(Tuotenumero, PE_pvm, Eränumero);",
+    "ERÄPEIX": "CREATE INDEX IF NOT EXISTS ERÄPEIX ON ERÄ(PE_pvm, Eränumero);",
+    "SIIRTOLAVAAIKAIX": "CREATE INDEX IF NOT EXISTS SIIRTOLAVAAIKAIX ON SIIRTOTAPAHTUMA(Lavanumero, Siirtoaika DESC);",
+    "SIIRTOAIKAIX": "CREATE INDEX IF NOT EXISTS SIIRTOAIKAIX ON SIIRTOTAPAHTUMA(Siirtoaika);",
+    "SIJKOODITA": "CREATE UNIQUE INDEX IF NOT EXISTS SIJKOODITA ON SIJAINTI(Sijaintikoodi, Varasto);",
+}
+# Indexes of earlier versions that the ones above make redundant
+OBSOLETE_INDEXES = ("SIIRTOLAVAIX", "ERÄTUOTEIX")
+
+# The search tables keep prefix indexes of the first one to three characters of every word, so that a short
+# prefix such as "1" is a lookup instead of a merge of every word starting with it.
+SEARCH_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(Teksti, Avain UNINDEXED, prefix='1 2 3');"
+# Full-text search indexes, one FTS5 table per searchable entity. Avain is the key the views join on. The
+# rowid of a document is the integer primary key of the indexed row, which VACUUM keeps unlike a plain rowid,
+# or for a composite primary key a number kept for the key in the table {FTS table}_RIVIT. A document is only
+# rewritten when one of the columns its text or keys are made of is updated, so that eg. moving a pallet does
+# not touch HAKU_LAVA.
+# FTS table: (indexed table, key column, document text expression, the columns of the keys and the text,
+#             primary key)
+SEARCH_TABLES = {
+    "HAKU_TUOTE": ("TUOTE", "Tuotenumero",
+                   "{0}.Tuotenumero || ' ' || {0}.Nimi || ' ' || IFNULL({0}.Valmistaja, '') || ' ' "
+                   "|| {0}.Tuoteryhmä",
+                   ("Tuotenumero", "Nimi", "Valmistaja", "Tuoteryhmä"), ("Tuotenumero",)),
+    "HAKU_ERÄ": ("ERÄ", "Eränumero", "{0}.Eränumero || ' ' || IFNULL({0}.PE_pvm, '')",
+                 ("Eränumero", "Tuotenumero", "PE_pvm"), ("Eränumero", "Tuotenumero")),
+    "HAKU_LAVA": ("LAVA", "Lavanumero", "{0}.Lavanumero || ' ' || {0}.Tyyppi", ("Lavanumero", "Tyyppi"),
+                  ("Lavanumero",)),
+    # Sijaintikoodi is generated from the location columns, which are the ones updated
+    "HAKU_SIJAINTI": ("SIJAINTI", "STunniste",
+                      "IFNULL({0}.Sijaintikoodi, '') || ' ' || IFNULL({0}.Varasto, '')",
+                      ("STunniste", "Hyllyväli", "Sektio", "Kerros", "Kuormaruutu", "Varasto"), ("STunniste",)),
+}
+
+# Occupant of every location, kept in sync with SIJAINTI and LAVA.Sijainti by triggers. If several pallets
+# share a location the smallest pallet number is recorded.
+OCCUPANCY = (
+    """
+    CREATE TABLE IF NOT EXISTS PAIKKAVARAUS
+        (Sijainti INTEGER NOT NULL,
+         Varasto INTEGER,
+         Lavanumero INTEGER,
+        CONSTRAINT PAIKKAVARAUSPA PRIMARY KEY (Sijainti) );
+    """,
+    "CREATE INDEX IF NOT EXISTS PAIKKAVARIX ON PAIKKAVARAUS(Varasto, Lavanumero);",
+)
+# Trigger name: CREATE statement
+OCCUPANCY_TRIGGERS = {
+    "PAIKKAVARAUS_SIJ_LISÄYS": """
+        CREATE TRIGGER PAIKKAVARAUS_SIJ_LISÄYS AFTER INSERT ON SIJAINTI BEGIN
+            INSERT INTO PAIKKAVARAUS VALUES
+                (NEW.STunniste, NEW.Varasto, (SELECT MIN(Lavanumero) FROM LAVA WHERE Sijainti = NEW.STunniste));
+        END;
+        """,
+    "PAIKKAVARAUS_SIJ_POISTO": """
+        CREATE TRIGGER PAIKKAVARAUS_SIJ_POISTO AFTER DELETE ON SIJAINTI BEGIN
+            DELETE FROM PAIKKAVARAUS WHERE Sijainti = OLD.STunniste;
+        END;
+        """,
+    "PAIKKAVARAUS_SIJ_MUUTOS": """
+        CREATE TRIGGER PAIKKAVARAUS_SIJ_MUUTOS AFTER UPDATE OF STunniste, Varasto ON SIJAINTI BEGIN
+            UPDATE PAIKKAVARAUS SET Sijainti = NEW.STunniste, Varasto = NEW.Varasto WHERE Sijainti = OLD.STunniste;
+        END;
+        """,
+    "PAIKKAVARAUS_LAVA_LISÄYS": """
+        CREATE TRIGGER PAIKKAVARAUS_LAVA_LISÄYS AFTER INSERT ON LAVA
+        WHEN NEW.Sijainti IS NOT NULL BEGIN
+            UPDATE PAIKKAVARAUS SET Lavanumero = (SELECT MIN(Lavanumero) FROM LAVA WHERE Sijainti = NEW.Sijainti)
+            WHERE Sijainti = NEW.Sijainti;
+        END;
+        """,
+    "PAIKKAVARAUS_LAVA_POISTO": """
+        CREATE TRIGGER PAIKKAVARAUS_LAVA_POISTO AFTER DELETE ON LAVA
+        WHEN OLD.Sijainti IS NOT NULL BEGIN
+            UPDATE PAIKKAVARAUS SET Lavanumero = (SELECT MIN(Lavanumero) FROM LAVA WHERE Sijainti = OLD.Sijainti)
+            WHERE Sijainti = OLD.Sijainti;
+        END;
+        """,
+    "PAIKKAVARAUS_LAVA_MUUTOS": """
+        CREATE TRIGGER PAIKKAVARAUS_LAVA_MUUTOS AFTER UPDATE OF Sijainti, Lavanumero ON LAVA BEGIN
+            UPDATE PAIKKAVARAUS
+            SET Lavanumero = (SELECT MIN(Lavanumero) FROM LAVA WHERE Sijainti = PAIKKAVARAUS.Sijainti)
+            WHERE Sijainti IN (OLD.Sijainti, NEW.Sijainti);
+        END;
+        """,
+}
+
+# Movement counts per day and per pallet, kept up to date by a trigger on SIIRTOTAPAHTUMA. Archiving movements
+# (see varastoarkisto.py) does not change them, so they cover the whole history. The per-pallet rollup is also
+# the projection of the latest movement of every pallet that LAVATIEDOT shows.
+ROLLUPS = (
+    """
+    CREATE TABLE IF NOT EXISTS SIIRROT_PÄIVITTÄIN
+        (Päivä CHAR(10) NOT NULL,
+         Siirrot INTEGER NOT NULL,
+        CONSTRAINT SIIRROT_PÄIVITTÄINPA PRIMARY KEY (Päivä) );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS SIIRROT_LAVOITTAIN
+        (Lavanumero INTEGER NOT NULL,
+         Siirrot INTEGER NOT NULL,
+         Ensimmäinen VARCHAR(26),
+         Viimeisin VARCHAR(26),
+         Viimeisin_sijainti INTEGER,
+        CONSTRAINT SIIRROT_LAVOITTAINPA PRIMARY KEY (Lavanumero) );
+    """,
+)
+# Trigger name: CREATE statement
+ROLLUP_TRIGGERS = {
+    "SIIRROT_LISÄYS": """
+        CREATE TRIGGER SIIRROT_LISÄYS AFTER INSERT ON SIIRTOTAPAHTUMA BEGIN
+            INSERT INTO SIIRROT_PÄIVITTÄIN VALUES (substr(NEW.Siirtoaika, 1, 10), 1)
+            ON CONFLICT (Päivä) DO UPDATE SET Siirrot = Siirrot + 1;
+            INSERT INTO SIIRROT_LAVOITTAIN VALUES (NEW.Lavanumero, 1, NEW.Siirtoaika, NEW.Siirtoaika, NEW.Sijainti)
+            ON CONFLICT (Lavanumero) DO UPDATE SET
+                Siirrot = Siirrot + 1,
+                Ensimmäinen = min(Ensimmäinen, excluded.Ensimmäinen),
+                Viimeisin = max(Viimeisin, excluded.Viimeisin),
+                Viimeisin_sijainti = CASE WHEN excluded.Viimeisin >= Viimeisin THEN excluded.Viimeisin_sijainti
+                                          ELSE Viimeisin_sijainti END;
+        END;
+        """,
+}
+
+# Counts and stock of the dashboards, kept up to date by triggers so that VARASTOTIEDOT and TUOTETIEDOT read
+# one row per warehouse or product instead of joining and grouping the whole warehouse. Rows are not removed
+# when their counts drop to zero.
+# Summary table: (CREATE statement, number of key columns, SELECT computing the rows from the data)
+SUMMARIES = {
+    "SIJAINNIT_VARASTOITTAIN": (
+        """
+        CREATE TABLE IF NOT EXISTS SIJAINNIT_VARASTOITTAIN
+            (Varasto INTEGER NOT NULL,
+             Lavapaikat INTEGER NOT NULL,
+             Lavat INTEGER NOT NULL,
+            CONSTRAINT SIJAINNIT_VARASTOITTAINPA PRIMARY KEY (Varasto) );
+        """,
+        1,
+        """
+        SELECT S.Varasto, COUNT(DISTINCT S.STunniste), COUNT(L.Lavanumero)
+        FROM SIJAINTI S LEFT OUTER JOIN LAVA L ON L.Sijainti = S.STunniste
+        WHERE S.Varasto IS NOT NULL
+        GROUP BY S.Varasto
+        """),
+    "ERÄT_TUOTTEITTAIN": (
+        """
+        CREATE TABLE IF NOT EXISTS ERÄT_TUOTTEITTAIN
+            (Tuotenumero INTEGER NOT NULL,
+             Erämäärä INTEGER NOT NULL,
+            CONSTRAINT ERÄT_TUOTTEITTAINPA PRIMARY KEY (Tuotenumero) );
+        """,
+        1,
+        "SELECT Tuotenumero, COUNT(*) FROM ERÄ GROUP BY Tuotenumero"),
+    # Ltk_määrä of the batches on the pallets of each warehouse by product group, Erät counting the batches
+    "SALDOT_RYHMITTÄIN": (
+        """
+        CREATE TABLE IF NOT EXISTS SALDOT_RYHMITTÄIN
+            (Varasto INTEGER NOT NULL,
+             Tuoteryhmä VARCHAR(50) NOT NULL COLLATE NOCASE,
+             Erät INTEGER NOT NULL,
+             Ltk_määrä REAL NOT NULL,
+            CONSTRAINT SALDOT_RYHMITTÄINPA PRIMARY KEY (Varasto, Tuoteryhmä) );
+        """,
+        2,
+        """
+        SELECT S.Varasto, T.Tuoteryhmä, COUNT(*), TOTAL(E.Ltk_määrä)
+        FROM LAVA L JOIN SIJAINTI S ON S.STunniste = L.Sijainti
+        JOIN ERÄ_LAVALLA EL ON EL.Lavanumero = L.Lavanumero
+        JOIN ERÄ E ON E.Eränumero = EL.Eränumero
+        JOIN TUOTE T ON T.Tuotenumero = E.Tuotenumero
+        WHERE S.Varasto IS NOT NULL
+        GROUP BY S.Varasto, T.Tuoteryhmä
+        """),
+}
+# The share of the rows matching {where} in a summary table, added with {sign} "+" and removed with "-"
+# Summary table: INSERT statement
+SUMMARY_CHANGES = {
+    "SIJAINNIT_VARASTOITTAIN": """
+        INSERT INTO SIJAINNIT_VARASTOITTAIN (Varasto, Lavapaikat, Lavat)
+        SELECT S.Varasto, {sign}{locations}, {sign}COUNT(L.Lavanumero)
+        FROM SIJAINTI S LEFT OUTER JOIN LAVA L ON L.Sijainti = S.STunniste
+        WHERE S.Varasto IS NOT NULL AND {where}
+        GROUP BY S.Varasto
+        ON CONFLICT (Varasto) DO UPDATE SET
+            Lavapaikat = Lavapaikat + excluded.Lavapaikat, Lavat = Lavat + excluded.Lavat;
+        """,
+    "ERÄT_TUOTTEITTAIN": """
+        INSERT INTO ERÄT_TUOTTEITTAIN (Tuotenumero, Erämäärä)
+        SELECT E.Tuotenumero, {sign}COUNT(*) FROM ERÄ E
+        WHERE {where}
+        GROUP BY E.Tuotenumero
+        ON CONFLICT (Tuotenumero) DO UPDATE SET Erämäärä = Erämäärä + excluded.Erämäärä;
+        """,
+    "SALDOT_RYHMITTÄIN": """
+        INSERT INTO SALDOT_RYHMITTÄIN (Varasto, Tuoteryhmä, Erät, Ltk_määrä)
+        SELECT S.Varasto, T.Tuoteryhmä, {sign}COUNT(*), {sign}TOTAL(E.Ltk_määrä)
+        FROM LAVA L JOIN SIJAINTI S ON S.STunniste = L.Sijainti
+        JOIN ERÄ_LAVALLA EL ON EL.Lavanumero = L.Lavanumero
+        JOIN ERÄ E ON E.Eränumero = EL.Eränumero
+        JOIN TUOTE T ON T.Tuotenumero = E.Tuotenumero
+        WHERE S.Varasto IS NOT NULL AND {where}
+        GROUP BY S.Varasto, T.Tuoteryhmä
+        ON CONFLICT (Varasto, Tuoteryhmä) DO UPDATE SET
+            Erät = Erät + excluded.Erät, Ltk_määrä = Ltk_määrä + excluded.Ltk_määrä;
+        """,
+}
+# The tables the summaries are computed from. The share of a changed row is removed before the change, while
+# the row and its joins are still in place, and added back after it. A pallet moving within its warehouse
+# changes nothing, so only the warehouses of its locations are compared.
+# Table: (condition on the row {0} in SUMMARY_CHANGES, the columns the summaries depend on, condition for an
+#         update to change the summaries or None for a change of any of the columns, summary tables)
+SUMMARY_SOURCES = {
+    "SIJAINTI": ("S.STunniste = {0}.STunniste", ("STunniste", "Varasto"), None,
+                 ("SIJAINNIT_VARASTOITTAIN", "SALDOT_RYHMITTÄIN")),
+    "LAVA": ("L.Lavanumero = {0}.Lavanumero", ("Sijainti", "Lavanumero"),
+             "OLD.Lavanumero IS NOT NEW.Lavanumero "
+             "OR (SELECT Varasto FROM SIJAINTI WHERE STunniste = OLD.Sijainti) "
+             "IS NOT (SELECT Varasto FROM SIJAINTI WHERE STunniste = NEW.Sijainti)",
+             ("SIJAINNIT_VARASTOITTAIN", "SALDOT_RYHMITTÄIN")),
+    "ERÄ_LAVALLA": ("EL.Lavanumero = {0}.Lavanumero AND EL.Eränumero = {0}.Eränumero", ("Lavanumero", "Eränumero"),
+                    None, ("SALDOT_RYHMITTÄIN",)),
+    "ERÄ": ("E.Eränumero = {0}.Eränumero AND E.Tuotenumero = {0}.Tuotenumero",
+            ("Eränumero", "Tuotenumero", "Ltk_määrä"), None, ("ERÄT_TUOTTEITTAIN", "SALDOT_RYHMITTÄIN")),
+    "TUOTE": ("T.Tuotenumero = {0}.Tuotenumero", ("Tuotenumero", "Tuoteryhmä"), None, ("SALDOT_RYHMITTÄIN",)),
+}
+
+# Change counters of the tables the in-memory indexes of varastosijoitus and varastoanalytiikka are built from,
+# kept by triggers, so that every connection and process sees when an index has to be loaded again. Moving a
+# pallet only updates LAVA.Sijainti and is recorded in SIIRTOTAPAHTUMA, which the indexes follow, so it is not
+# counted.
+CHANGES = """
+    CREATE TABLE IF NOT EXISTS TAULUMUUTOKSET
+        (Taulu VARCHAR(50) NOT NULL,
+         Muutokset INTEGER NOT NULL,
+        CONSTRAINT TAULUMUUTOKSETPA PRIMARY KEY (Taulu) );
+    """
+# Counts up the changes of the table {}
+COUNT_CHANGE = ("INSERT INTO TAULUMUUTOKSET VALUES ('{}', 1) "
+                "ON CONFLICT (Taulu) DO UPDATE SET Muutokset = Muutokset + 1;")
+# Table: the columns whose updates are counted
+CHANGE_COUNTERS = {
+    "SIJAINTI": ("STunniste", "Varasto", "Hyllyväli", "Sektio", "Kerros", "Kuormaruutu"),
+    "LAVA": ("Lavanumero", "Tyyppi"),
+    "ERÄ_LAVALLA": ("Lavanumero", "Eränumero"),
+    "ERÄ": ("Eränumero", "Tuotenumero"),
+    "TUOTE": ("Tuotenumero", "Tuoteryhmä"),
+}
+
+def _summary_changes(table: str, sign: str, row: str) -> str:
+    """
+    Returns the statements that add or remove the share of a row of a table in the summary tables.
+
+    Args:
+        table (str): The changed table, one of SUMMARY_SOURCES.
+        sign (str): "+" to add the share, "-" to remove it.
+        row (str): "NEW" or "OLD".
+
+    Returns:
+        str: The statements.
+    """
+    where, _, _, summaries = SUMMARY_SOURCES[table]
+    return "".join(SUMMARY_CHANGES[summary].format(sign=sign, where=where.format(row),
+                                                   locations="1" if table == "SIJAINTI" else "0")
+                   for summary in summaries)
+
+def summary_triggers() -> dict[str, str]:
+    """
+    Returns the triggers that keep the summary tables up to date, see SUMMARY_SOURCES.
+
+    Returns:
+        dict[str, str]: Trigger names and their CREATE TRIGGER statements.
+    """
+    triggers = {}
+    for table, (_, columns, changed, _) in SUMMARY_SOURCES.items():
+        changed = changed or " OR ".join("OLD.{0} IS NOT NEW.{0}".format(column) for column in columns)
+        events = (
+            ("LISÄYS", "AFTER INSERT", "", "+", "NEW"),
+            ("POISTO", "BEFORE DELETE", "", "-", "OLD"),
+            ("ENNEN_MUUTOSTA", "BEFORE UPDATE OF " + ", ".join(columns), "WHEN " + changed, "-", "OLD"),
+            ("MUUTOS", "AFTER UPDATE OF " + ", ".join(columns), "WHEN " + changed, "+", "NEW"),
+        )
+        for suffix, event, when, sign, row in events:
+            name = "SUMMAT_{}_{}".format(table, suffix)
+            triggers[name] = "CREATE TRIGGER {} {} ON {} {} BEGIN {} END;".format(
+                name, event, table, when, _summary_changes(table, sign, row))
+    return triggers
+
+def create_location_code(cur: sql.Cursor):
+    """
+    Adds the generated location code column to SIJAINTI if it is missing.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_xinfo(SIJAINTI);")]
+    if "Sijaintikoodi" not in columns:
+        cur.execute("ALTER TABLE SIJAINTI ADD COLUMN {};".format(LOCATION_CODE.strip()))
+
+def migrate_movements(cur: sql.Cursor):
+    """
+    Rebuilds a SIIRTOTAPAHTUMA keyed by (Siirtoaika, Lavanumero, Sijainti) as MOVEMENTS, numbering the existing
+    movements in time order. The views are dropped first and must be created again afterwards.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_xinfo(SIIRTOTAPAHTUMA);")]
+    if not columns or "Siirto_ID" in columns:
+        return
+    for name in VIEWS:
+        cur.execute("DROP VIEW IF EXISTS {};".format(name))
+    cur.execute(MOVEMENTS.format("SIIRTOTAPAHTUMA_UUSI"))
+    cur.execute("""
+                INSERT INTO SIIRTOTAPAHTUMA_UUSI (Siirtoaika, Lavanumero, Sijainti)
+                SELECT Siirtoaika, Lavanumero, Sijainti FROM SIIRTOTAPAHTUMA ORDER BY Siirtoaika, rowid;
+                """)
+    cur.execute("DROP TABLE SIIRTOTAPAHTUMA;")
+    cur.execute("ALTER TABLE SIIRTOTAPAHTUMA_UUSI RENAME TO SIIRTOTAPAHTUMA;")
+
+def create_views(cur: sql.Cursor):
+    """
+    Creates the views, replacing any earlier definitions.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    for name, select in VIEWS.items():
+        cur.execute("DROP VIEW IF EXISTS {};".format(name))
+        cur.execute("CREATE VIEW {} AS {}".format(name, select.strip()))
+
+def create_triggers(cur: sql.Cursor, triggers: dict[str, str]):
+    """
+    Creates the given triggers, replacing any earlier definitions.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+        triggers (dict[str, str]): Trigger names and their CREATE TRIGGER statements.
+
+    Returns:
+        None
+    """
+    for name, statement in triggers.items():
+        cur.execute("DROP TRIGGER IF EXISTS {};".format(name))
+        cur.execute(statement)
+
+def create_occupancy_table(cur: sql.Cursor):
+    """
+    Creates the location occupancy table and its triggers. A new table is filled from the current data.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'PAIKKAVARAUS';").fetchone()
+    for statement in OCCUPANCY:
+        cur.execute(statement)
+    create_triggers(cur, OCCUPANCY_TRIGGERS)
+    if not exists:
+        cur.execute("""
+                    INSERT INTO PAIKKAVARAUS
+                    SELECT S.STunniste, S.Varasto, (SELECT MIN(L.Lavanumero) FROM LAVA L WHERE L.Sijainti = S.STunniste)
+                    FROM SIJAINTI S;
+                    """)
+
+def create_rollups(cur: sql.Cursor):
+    """
+    Creates the movement rollup tables and their trigger. New tables are filled from the current movements.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'SIIRROT_PÄIVITTÄIN';").fetchone()
+    for statement in ROLLUPS:
+        cur.execute(statement)
+    columns = [row[1] for row in cur.execute("PRAGMA table_xinfo(SIIRROT_LAVOITTAIN);")]
+    if "Viimeisin_sijainti" not in columns:
+        cur.execute("ALTER TABLE SIIRROT_LAVOITTAIN ADD COLUMN Viimeisin_sijainti INTEGER;")
+        cur.execute("""
+                    UPDATE SIIRROT_LAVOITTAIN SET Viimeisin_sijainti =
+                        (SELECT Sijainti FROM SIIRTOTAPAHTUMA S WHERE S.Lavanumero = SIIRROT_LAVOITTAIN.Lavanumero
+                         ORDER BY S.Siirtoaika DESC LIMIT 1);
+                    """)
+    create_triggers(cur, ROLLUP_TRIGGERS)
+    if not exists:
+        cur.execute("""
+                    INSERT INTO SIIRROT_PÄIVITTÄIN
+                    SELECT substr(Siirtoaika, 1, 10), COUNT(*) FROM SIIRTOTAPAHTUMA GROUP BY 1;
+                    """)
+        cur.execute("""
+                    INSERT INTO SIIRROT_LAVOITTAIN
+                    SELECT Lavanumero, COUNT(*), MIN(Siirtoaika), MAX(Siirtoaika),
+                           (SELECT Sijainti FROM SIIRTOTAPAHTUMA S WHERE S.Lavanumero = ST.Lavanumero
+                            ORDER BY S.Siirtoaika DESC LIMIT 1)
+                    FROM SIIRTOTAPAHTUMA ST GROUP BY Lavanumero;
+                    """)
+
+def create_summaries(cur: sql.Cursor):
+    """
+    Creates the summary tables and their triggers. New tables are filled from the current data.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    for table, (statement, _, select) in SUMMARIES.items():
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?;", (table,)).fetchone()
+        cur.execute(statement)
+        if not exists:
+            cur.execute("INSERT INTO {} {};".format(table, select.strip()))
+    create_triggers(cur, summary_triggers())
+
+def check_summaries(connection: sql.Connection) -> dict[str, list[tuple]]:
+    """
+    Compares the summary tables against their rows computed from the data. Rows with only zero counts equal
+    missing rows, and Ltk_määrä is compared to six decimals.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+
+    Returns:
+        dict[str, list[tuple]]: The keys of the rows that differ in each summary table, empty if the table is up
+                                to date.
+    """
+    def rows(query: str, keys: int) -> dict[tuple, tuple]:
+        result = {}
+        for row in connection.execute(query):
+            values = tuple(round(value, 6) if isinstance(value, float) else value for value in row[keys:])
+            if any(values):
+                result[row[:keys]] = values
+        return result
+
+    differences = {}
+    for table, (_, keys, select) in SUMMARIES.items():
+        stored = rows("SELECT * FROM {};".format(table), keys)
+        computed = rows(select, keys)
+        differences[table] = sorted(key for key in stored.keys() | computed.keys()
+                                    if stored.get(key) != computed.get(key))
+    return differences
+
+def create_change_counters(cur: sql.Cursor):
+    """
+    Creates the table change counters and their triggers, see CHANGE_COUNTERS.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    cur.execute(CHANGES)
+    triggers = {}
+    for table, columns in CHANGE_COUNTERS.items():
+        count = COUNT_CHANGE.format(table)
+        for suffix, event in (("LISÄYS", "AFTER INSERT"), ("POISTO", "AFTER DELETE"),
+                              ("MUUTOS", "AFTER UPDATE OF " + ", ".join(columns))):
+            name = "MUUTOKSET_{}_{}".format(table, suffix)
+            triggers[name] = "CREATE TRIGGER {} {} ON {} BEGIN {} END;".format(name, event, table, count)
+    create_triggers(cur, triggers)
+
+def change_counts(connection: sql.Connection, tables: tuple[str, ...]) -> tuple[int, ...]:
+    """
+    Reads the change counters of tables. An in-memory index built from the tables is up to date as long as the
+    counters read before building it have not changed.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+        tables (tuple[str, ...]): The tables, some of CHANGE_COUNTERS.
+
+    Returns:
+        tuple[int, ...]: The number of changes of each table, 0 for a table not changed since the counters were
+                         created.
+    """
+    counts = dict(connection.execute("SELECT Taulu, Muutokset FROM TAULUMUUTOKSET WHERE Taulu IN ({});"
+                                     .format(", ".join("?" * len(tables))), tables).fetchall())
+    return tuple(counts.get(table, 0) for table in tables)
+
+def fts5_available(connection: sql.Connection) -> bool:
+    """
+    Checks whether the SQLite library supports FTS5 full-text search tables.
+
+    Args:
+        connection (sqlite3.Connection): The connection to check with.
+
+    Returns:
+        bool: True if FTS5 tables can be created.
+    """
+    try:
+        connection.execute("CREATE VIRTUAL TABLE temp.FTS5_TESTI USING fts5(Teksti);")
+    except sql.OperationalError:
+        return False
+    connection.execute("DROP TABLE temp.FTS5_TESTI;")
+    return True
+
+def _search_triggers(fts_table: str) -> dict[str, str]:
+    """
+    Returns the triggers that keep a full-text search table in sync with its indexed table, see SEARCH_TABLES.
+
+    Args:
+        fts_table (str): The full-text search table.
+
+    Returns:
+        dict[str, str]: Trigger names and their CREATE TRIGGER statements.
+    """
+    table, key, text, columns, primary_key = SEARCH_TABLES[fts_table]
+    if len(primary_key) == 1:
+        def row_id(row: str) -> str:
+            return "{}.{}".format(row, primary_key[0])
+        add_row = remove_row = update_row = ""
+    else:
+        rows = fts_table + "_RIVIT"
+        match = " AND ".join("{0} = {{0}}.{0}".format(column) for column in primary_key)
+
+        def row_id(row: str) -> str:
+            return "(SELECT Rivi FROM {} WHERE {})".format(rows, match.format(row))
+        add_row = "INSERT INTO {} ({}) VALUES ({});".format(
+            rows, ", ".join(primary_key), ", ".join("NEW." + column for column in primary_key))
+        remove_row = "DELETE FROM {} WHERE {};".format(rows, match.format("OLD"))
+        update_row = "UPDATE {} SET {} WHERE {};".format(
+            rows, ", ".join("{0} = NEW.{0}".format(column) for column in primary_key), match.format("OLD"))
+    insert = "INSERT INTO {}(rowid, Teksti, Avain) VALUES ({}, {}, NEW.{});".format(
+        fts_table, row_id("NEW"), text.format("NEW"), key)
+    delete = "DELETE FROM {} WHERE rowid = {};".format(fts_table, row_id("OLD"))
+    return {
+        fts_table + "_LISÄYS": "CREATE TRIGGER {}_LISÄYS AFTER INSERT ON {} BEGIN {} {} END;".format(
+            fts_table, table, add_row, insert),
+        fts_table + "_POISTO": "CREATE TRIGGER {}_POISTO AFTER DELETE ON {} BEGIN {} {} END;".format(
+            fts_table, table, delete, remove_row),
+        fts_table + "_MUUTOS": "CREATE TRIGGER {}_MUUTOS AFTER UPDATE OF {} ON {} BEGIN {} {} {} END;".format(
+            fts_table, ", ".join(columns), table, delete, update_row, insert),
+    }
+
+def create_search_index(cur: sql.Cursor):
+    """
+    Creates the full-text search tables and the triggers that keep them in sync with the indexed tables.
+    Tables that did not exist yet, were created without prefix indexes or were keyed by the rowids of a table
+    with a composite primary key are filled from the current data.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    for fts_table, (table, key, text, _, primary_key) in SEARCH_TABLES.items():
+        exists = cur.execute("SELECT sql FROM sqlite_master WHERE name = ?;", (fts_table,)).fetchone()
+        if exists and "prefix" not in exists[0]:
+            # Created before the prefix indexes
+            cur.execute("DROP TABLE {};".format(fts_table))
+            exists = None
+        rows = fts_table + "_RIVIT"
+        if len(primary_key) > 1:
+            types = {row[1]: row[2] for row in cur.execute("PRAGMA table_info({});".format(table))}
+            declared = {row[1]: row[2] for row in cur.execute("PRAGMA table_info({});".format(rows))}
+            if exists and any(declared.get(column) != types[column] for column in primary_key):
+                # Keyed by rowids that VACUUM may renumber, or by keys without the types of the table, which
+                # the joins on the keys cannot look up in the index of the keys
+                cur.execute("DROP TABLE IF EXISTS {};".format(rows))
+                cur.execute("DROP TABLE {};".format(fts_table))
+                exists = None
+            cur.execute("CREATE TABLE IF NOT EXISTS {} (Rivi INTEGER PRIMARY KEY, {}, UNIQUE ({}));".format(
+                rows, ", ".join("{} {}".format(column, types[column]) for column in primary_key),
+                ", ".join(primary_key)))
+        cur.execute(SEARCH_TABLE.format(fts_table))
+        create_triggers(cur, _search_triggers(fts_table))
+        if not exists:
+            if len(primary_key) > 1:
+                cur.execute("DELETE FROM {};".format(rows))
+            _add_search_documents(cur, fts_table)
+
+def _add_search_documents(cur: sql.Cursor, fts_table: str):
+    """
+    Adds the documents of the rows of the indexed table that are not in a full-text search table yet.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+        fts_table (str): The full-text search table.
+
+    Returns:
+        None
+    """
+    table, key, text, _, primary_key = SEARCH_TABLES[fts_table]
+    if len(primary_key) == 1:
+        cur.execute("INSERT INTO {0}(rowid, Teksti, Avain) SELECT {3}, {2}, {4} FROM {1} "
+                    "WHERE {3} NOT IN (SELECT rowid FROM {0});"
+                    .format(fts_table, table, text.format(table), primary_key[0], key))
+        return
+    rows = fts_table + "_RIVIT"
+    match = " AND ".join("R.{0} = {1}.{0}".format(column, table) for column in primary_key)
+    # The keys added now get the numbers after the largest one
+    last = cur.execute("SELECT IFNULL(MAX(Rivi), 0) FROM {};".format(rows)).fetchone()[0]
+    cur.execute("INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE NOT EXISTS (SELECT 1 FROM {0} R WHERE {3});"
+                .format(rows, ", ".join(primary_key), table, match))
+    cur.execute("INSERT INTO {0}(rowid, Teksti, Avain) SELECT R.Rivi, {2}, {1}.{3} FROM {4} R JOIN {1} ON {5} "
+                "WHERE R.Rivi > ?;".format(fts_table, table, text.format(table), key, rows, match), (last,))
+
+def suspend_triggers(cur: sql.Cursor, table: str) -> dict[str, str]:
+    """
+    Drops the search index, summary and change counter triggers of a table for a bulk insert, so that the
+    search tables, the summary tables and the change counter are brought up to date once afterwards by
+    restore_triggers() instead of once per row. Rows may only be inserted into the table until the triggers are
+    restored. Run both in the same transaction, so that the triggers are not lost if the insert fails.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+        table (str): The table.
+
+    Returns:
+        dict[str, str]: Names and CREATE TRIGGER statements of the dropped triggers.
+    """
+    names = set(summary_triggers())
+    names.update("MUUTOKSET_{}_{}".format(table, suffix) for suffix in ("LISÄYS", "POISTO", "MUUTOS"))
+    for fts_table in SEARCH_TABLES:
+        names.update(_search_triggers(fts_table))
+    triggers = {name: statement for name, statement in cur.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?;", (table,)) if name in names}
+    for name in triggers:
+        cur.execute("DROP TRIGGER {};".format(name))
+    return triggers
+
+def restore_triggers(cur: sql.Cursor, table: str, triggers: dict[str, str]):
+    """
+    Creates the triggers dropped by suspend_triggers() again. The documents of the inserted rows are added to
+    the search tables, the summary tables depending on the table are computed again from the data and the
+    change counter of the table is counted up once.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+        table (str): The table.
+        triggers (dict[str, str]): The triggers returned by suspend_triggers().
+
+    Returns:
+        None
+    """
+    create_triggers(cur, triggers)
+    if "MUUTOKSET_{}_LISÄYS".format(table) in triggers:
+        cur.execute(COUNT_CHANGE.format(table))
+    for fts_table in SEARCH_TABLES:
+        if fts_table + "_LISÄYS" in triggers:
+            _add_search_documents(cur, fts_table)
+    summaries = {summary for table, (*_, depending) in SUMMARY_SOURCES.items()
+                 if "SUMMAT_{}_LISÄYS".format(table) in triggers for summary in depending}
+    for summary in SUMMARIES:
+        if summary in summaries:
+            cur.execute("DELETE FROM {};".format(summary))
+            cur.execute("INSERT INTO {} {};".format(summary, SUMMARIES[summary][2].strip()))
+
+def create_indexes(cur: sql.Cursor):
+    """
+    Creates the secondary indexes that do not exist yet and drops the obsolete ones.
+
+    Args:
+        cur (sqlite3.Cursor): The cursor to execute the statements with.
+
+    Returns:
+        None
+    """
+    for statement in INDEXES.values():
+        cur.execute(statement)
+    for name in OBSOLETE_INDEXES:
+        cur.execute("DROP INDEX IF EXISTS {};".format(name))
+
+def upgrade(connection: sql.Connection):
+    """
+    Creates the views and adds the missing schema extensions to a database and commits the changes.
+    Safe to run repeatedly.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+
+    Returns:
+        None
+    """
+    cur = connection.cursor()
+    create_location_code(cur)
+    migrate_movements(cur)
+    create_indexes(cur)
+    create_occupancy_table(cur)
+    create_rollups(cur)
+    create_summaries(cur)
+    create_change_counters(cur)
+    create_views(cur)
+    if fts5_available(connection):
+        create_search_index(cur)
+    connection.commit()
@@ -0,0 +1,417 @@
+"""
+Bulk import of products, batches and pallets from files, eg. the batch manifests of suppliers. The rows are
+read as a stream and inserted in chunks of one statement each, all files in one transaction. The values are
+converted by the affinities of the columns like in Database.add_entry(), columns missing from the file get
+their defaults and empty fields are NULL. References to other tables are checked for a whole chunk at a
+time. Rows that do not fit are skipped and reported with their line numbers, the rest are imported.
+
+CSV files need a header row with the column names, and may be separated by semicolons, commas or tabs.
+Parquet files can be imported when pyarrow is installed.
+
+The import can be run from the command line:
+    python varastotuonti.py varasto.db TAULU=TIEDOSTO [TAULU=TIEDOSTO ...] [--chunk-size N]
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import operator
+import os
+import sqlite3 as sql
+import time
+from typing import Iterable, Iterator, NamedTuple, Sequence
+import varastokysely
+import varastoskeema
+
+# The tables data can be imported into, in the order their rows reference each other
+TABLES = ("TUOTE", "ERÄ", "LAVA", "ERÄ_LAVALLA")
+
+# Rows inserted with one statement
+CHUNK_SIZE = 5000
+
+# Files with at least this many rows are imported with the search index, summary and change counter triggers
+# of the table suspended, see varastoskeema.suspend_triggers(). Computing the summaries again afterwards reads
+# the whole warehouse, which only pays off for large files.
+BULK_ROWS = 100000
+
+# Decimal commas of numbers as text
+_decimal_point = operator.methodcaller("replace", ",", ".")
+
+# Messages of the constraint errors of SQLite and the reasons reported for them
+_CONSTRAINT_REASONS = (
+    ("UNIQUE constraint failed: ", "Tietue on jo olemassa ({})."),
+    ("NOT NULL constraint failed: ", "Arvo puuttuu ({})."),
+    ("CHECK constraint failed: ", "Arvo ei täytä ehtoa {}."),
+)
+
+class Rejection(NamedTuple):
+    """
+    A row that was not imported.
+
+    Attributes:
+        line (int): The line of the row in the file, the header being line 1.
+        reason (str): Why the row was rejected.
+    """
+    line: int
+    reason: str
+
+class ImportResult(NamedTuple):
+    """
+    The result of importing a file into a table.
+
+    Attributes:
+        table (str): The table.
+        imported (int): The number of imported rows.
+        rejected (list[Rejection]): The rejected rows in the order of the file.
+        seconds (float): The time the import took.
+    """
+    table: str
+    imported: int
+    rejected: list[Rejection]
+    seconds: float
+
+def read_csv(path: str, delimiter: str|None=None) -> tuple[list[str], Iterator[tuple[int, list]]]:
+    """
+    Reads a CSV file with a header row as a stream.
+
+    Args:
+        path (str): The path to the file.
+        delimiter (str|None, optional): The field separator. Defaults to None to use the one of ";", "," and
+                                        tab that the header has most of.
+
+    Returns:
+        tuple[list[str], Iterator[tuple[int, list]]]: The column names and the rows with their line numbers.
+    """
+    file = open(path, newline="", encoding="utf-8-sig")
+    if delimiter is None:
+        first = file.readline()
+        delimiter = max((";", ",", "\t"), key=first.count)
+        file.seek(0)
+    reader = csv.reader(file, delimiter=delimiter)
+    header = [name.strip() for name in next(reader, [])]
+    def rows():
+        with file:
+            for row in reader:
+                if row:
+                    yield reader.line_num, row
+    return header, rows()
+
+def read_parquet(path: str) -> tuple[list[str], Iterator[tuple[int, list]]]:
+    """
+    Reads a Parquet file as a stream of record batches. pyarrow is only imported on first use.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        tuple[list[str], Iterator[tuple[int, list]]]: The column names and the rows with their numbers,
+                                                      counting from 2 like the lines of a CSV file.
+
+    Raises:
+        ValueError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet-tiedostojen tuonti vaatii pyarrow-kirjaston.") from None
+    parquet = pq.ParquetFile(path)
+    def rows():
+        line = 1
+        for batch in parquet.iter_batches():
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                line += 1
+                # Dates are stored as text, eg. PE_pvm
+                yield line, [value.isoformat() if isinstance(value, datetime.date) else value for value in row]
+    return list(parquet.schema_arrow.names), rows()
+
+def read_file(path: str, delimiter: str|None=None) -> tuple[list[str], Iterator[tuple[int, list]]]:
+    """
+    Reads a Parquet file (.parquet, .pq) or otherwise a CSV file, see read_csv() and read_parquet().
+
+    Args:
+        path (str): The path to the file.
+        delimiter (str|None, optional): The field separator of a CSV file. Defaults to None to detect it.
+
+    Returns:
+        tuple[list[str], Iterator[tuple[int, list]]]: The column names and the rows with their line numbers.
+    """
+    if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+        return read_parquet(path)
+    return read_csv(path, delimiter)
+
+def _constraint_reason(error: sql.IntegrityError) -> str:
+    """
+    Returns the reason reported for a constraint error.
+
+    Args:
+        error (sqlite3.IntegrityError): The error.
+
+    Returns:
+        str: The reason.
+    """
+    message = str(error)
+    for prefix, reason in _CONSTRAINT_REASONS:
+        if message.startswith(prefix):
+            return reason.format(message[len(prefix):])
+    return message
+
+def _convert_column(values: Sequence, convert, numeric: bool, errors: dict[int, str]) -> Sequence:
+    """
+    Converts the values of a column of a chunk, see varastokysely.SchemaCatalog.convert(). Empty strings are
+    NULL. A column of numbers as text is converted with int() or float() at once, and only a column with
+    other values one value at a time.
+
+    Args:
+        values (Sequence): The values.
+        convert (Callable[[Any], Any]): The conversion of the column, see SchemaCatalog.converter().
+        numeric (bool): Whether the column has a numeric affinity.
+        errors (dict[int, str]): The conversion errors by the positions of the values. Updated.
+
+    Returns:
+        Sequence: The converted values. The values with errors are left as they are.
+    """
+    if "" in values:
+        values = [None if value == "" else value for value in values]
+    if not numeric:
+        return values
+    if set(map(type, values)) == {str}:
+        try:
+            return list(map(int, values))
+        except ValueError:
+            pass
+        try:
+            return list(map(float, map(_decimal_point, values)))
+        except ValueError:
+            pass
+    converted = []
+    for i, value in enumerate(values):
+        try:
+            converted.append(convert(value))
+        except ValueError as error:
+            errors.setdefault(i, str(error))
+            converted.append(value)
+    return converted
+
+def import_rows(connection: sql.Connection, catalog: varastokysely.SchemaCatalog, table: str,
+                header: Sequence[str], rows: Iterable[tuple[int, Sequence]],
+                chunk_size: int=CHUNK_SIZE) -> ImportResult:
+    """
+    Inserts rows into a table in chunks. The values of a chunk are converted a column at a time and the
+    chunk is inserted with one statement, and only a chunk with a constraint error is inserted again row by
+    row to find the failing rows. The references of a chunk to other tables are checked with one query per
+    foreign key before inserting it. Does not commit.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        catalog (varastokysely.SchemaCatalog): The catalog of the database.
+        table (str): The table, one of TABLES.
+        header (Sequence[str]): The columns of the values.
+        rows (Iterable[tuple[int, Sequence]]): The line numbers and values of the rows.
+        chunk_size (int, optional): Rows per insert statement. Defaults to CHUNK_SIZE.
+
+    Returns:
+        ImportResult: The numbers of imported and rejected rows.
+
+    Raises:
+        ValueError: If data cannot be imported into the table or a column is not in it.
+    """
+    start = time.perf_counter()
+    table = catalog.relation(table)
+    if table not in TABLES:
+        raise ValueError("Tauluun {} ei voi tuoda tietoja.".format(table))
+    if chunk_size < 1:
+        raise ValueError("Erän koon on oltava vähintään 1.")
+    if not header:
+        raise ValueError("Tiedostossa ei ole otsikkoriviä.")
+    columns = [catalog.column(table, name) for name in header]
+    query = varastokysely.QueryBuilder(catalog).insert(table, len(columns), columns)
+    converters = [catalog.converter(table, name) for name in columns]
+    # References whose columns are all in the file: positions, referenced table and the query of the missing keys
+    references = []
+    for key in catalog.foreign_keys(table):
+        if all(name in columns for name in key.columns):
+            # A reference without columns is to the primary key
+            referenced = key.references if None not in key.references else catalog.primary_key(key.table)
+            conditions = " AND ".join(
+                "{} = value ->> {}".format(catalog.sql_name(catalog.column(key.table, name)), i)
+                for i, name in enumerate(referenced))
+            references.append((
+                [columns.index(catalog.column(table, name)) for name in key.columns],
+                "{}({})".format(key.table, ", ".join(referenced)),
+                "SELECT value FROM json_each(?) WHERE NOT EXISTS (SELECT 1 FROM {} WHERE {})".format(
+                    catalog.sql_name(catalog.relation(key.table)), conditions),
+            ))
+
+    numeric = [catalog.column_info(table, name).affinity in varastokysely.NUMERIC_AFFINITIES for name in columns]
+    # The rows of a chunk as one JSON array, so that the triggers of the table, eg. the search index, are
+    # run in a single statement instead of one per row. A table without triggers, eg. while they are suspended,
+    # is faster to insert into row by row in a savepoint.
+    triggered = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?;",
+                                   (table,)).fetchone()
+    chunk_query = "INSERT INTO {} ({}) SELECT {} FROM json_each(?)".format(
+        catalog.sql_name(table), ", ".join(map(catalog.sql_name, columns)),
+        ", ".join("value ->> {}".format(i) for i in range(len(columns))))
+
+    imported = 0
+    rejected = []
+
+    def insert(chunk: list[tuple[int, Sequence]]):
+        nonlocal imported
+        lines = [line for line, _ in chunk]
+        errors = {}
+        converted = [_convert_column(values, convert, is_numeric, errors)
+                     for values, convert, is_numeric in zip(zip(*(row for _, row in chunk)), converters, numeric)]
+        if errors:
+            rejected.extend(Rejection(lines[i], error) for i, error in errors.items())
+            kept = [i for i in range(len(lines)) if i not in errors]
+            lines = [lines[i] for i in kept]
+            converted = [[values[i] for i in kept] for values in converted]
+        for positions, referenced, missing_query in references:
+            keys = [key for key in set(zip(*(converted[i] for i in positions))) if None not in key]
+            if not keys:
+                continue
+            missing = {tuple(json.loads(row[0])) for row in connection.execute(missing_query, (json.dumps(keys),))}
+            if missing:
+                kept = []
+                for i, key in enumerate(zip(*(converted[i] for i in positions))):
+                    if key in missing:
+                        rejected.append(Rejection(lines[i], "Viitattua riviä {} = {} ei ole.".format(
+                            referenced, ", ".join(map(str, key)))))
+                    else:
+                        kept.append(i)
+                lines = [lines[i] for i in kept]
+                converted = [[values[i] for i in kept] for values in converted]
+        chunk = list(zip(lines, zip(*converted)))
+        if not chunk:
+            return
+        try:
+            if triggered:
+                # A failing statement is rolled back as a whole
+                connection.execute(chunk_query, (json.dumps([values for _, values in chunk], allow_nan=False),))
+            else:
+                connection.execute("SAVEPOINT TUONTI;")
+                try:
+                    connection.executemany(query, (values for _, values in chunk))
+                except sql.IntegrityError:
+                    connection.execute("ROLLBACK TO TUONTI;")
+                    raise
+                finally:
+                    connection.execute("RELEASE TUONTI;")
+            imported += len(chunk)
+            return
+        except sql.IntegrityError:
+            pass
+        except (TypeError, ValueError):
+            # Values that are not JSON, eg. bytes
+            pass
+        for line, values in chunk:
+            try:
+                connection.execute(query, values)
+            except sql.IntegrityError as error:
+                rejected.append(Rejection(line, _constraint_reason(error)))
+            else:
+                imported += 1
+
+    chunk = []
+    count = len(columns)
+    for line, row in rows:
+        if len(row) != count:
+            rejected.append(Rejection(line, "Rivillä on {} arvoa, otsikossa {} saraketta.".format(len(row), count)))
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            insert(chunk)
+            chunk = []
+    if chunk:
+        insert(chunk)
+    rejected.sort()
+    return ImportResult(table, imported, rejected, time.perf_counter() - start)
+
+def import_files(connection: sql.Connection, files: Iterable[tuple[str, str]], chunk_size: int=CHUNK_SIZE,
+                 catalog: varastokysely.SchemaCatalog|None=None, delimiter: str|None=None) -> list[ImportResult]:
+    """
+    Imports files into tables in one transaction, in the order of TABLES so that eg. batches can refer to
+    products imported at the same time. Rejected rows do not stop the import, but an error in a file rolls
+    back all of them. The triggers of the table are suspended while importing a file of at least BULK_ROWS
+    rows, and the search tables and summary tables are brought up to date once at its end.
+
+    Even so, an import runs at tens of thousands rather than hundreds of thousands of rows per second: SQLite
+    alone inserts about 90 000 rows of ERÄ per second with its three indexes, adding them to the search index
+    takes almost as long again and reading and converting the rows in Python about as long as inserting them.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        files (Iterable[tuple[str, str]]): (table, path) pairs.
+        chunk_size (int, optional): Rows per insert statement. Defaults to CHUNK_SIZE.
+        catalog (varastokysely.SchemaCatalog|None, optional): The catalog of the database. Defaults to None to
+                                                              load it.
+        delimiter (str|None, optional): The field separator of CSV files. Defaults to None to detect it.
+
+    Returns:
+        list[ImportResult]: The result of each file in the order of import.
+
+    Raises:
+        ValueError: If a table or column is unknown or a file cannot be read.
+    """
+    if catalog is None:
+        catalog = varastokysely.SchemaCatalog.load(connection)
+    files = sorted(((catalog.relation(table), path) for table, path in files),
+                   key=lambda file: TABLES.index(file[0]) if file[0] in TABLES else -1)
+    results = []
+    try:
+        connection.execute("BEGIN IMMEDIATE;")
+        for table, path in files:
+            try:
+                header, rows = read_file(path, delimiter)
+            except OSError as error:
+                raise ValueError("Tiedostoa {} ei voi lukea: {}".format(path, error.strerror)) from None
+            first = list(itertools.islice(rows, BULK_ROWS))
+            cursor = connection.cursor()
+            triggers = varastoskeema.suspend_triggers(cursor, table) if len(first) == BULK_ROWS else {}
+            results.append(import_rows(connection, catalog, table, header, itertools.chain(first, rows),
+                                       chunk_size))
+            varastoskeema.restore_triggers(cursor, table, triggers)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return results
+
+def main(args: list[str]|None=None):
+    parser = argparse.ArgumentParser(description="Tuo tuotteita, eriä ja lavoja tiedostoista varastotietokantaan.")
+    parser.add_argument("db", help="Varastotietokanta.")
+    parser.add_argument("files", nargs="+", metavar="TAULU=TIEDOSTO",
+                        help="Taulu ({}) ja CSV- tai Parquet-tiedosto.".format(", ".join(TABLES)))
+    parser.add_argument("-c", "--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Kerralla lisättävien rivien määrä (oletus {}).".format(CHUNK_SIZE))
+    parser.add_argument("-d", "--delimiter", default=None, help="CSV-tiedostojen erotin (oletus tunnistetaan).")
+    options = parser.parse_args(args)
+    files = []
+    for file in options.files:
+        table, separator, path = file.partition("=")
+        if not separator or not path:
+            parser.error("Anna tiedosto muodossa TAULU=TIEDOSTO: {}".format(file))
+        files.append((table, path))
+
+    # Imported here, as varastologiikka imports this module
+    import varastologiikka
+    db = varastologiikka.Database(options.db)
+    try:
+        results = db.import_files(files, options.chunk_size, options.delimiter)
+    except ValueError as error:
+        print("Virhe: {}".format(error))
+        return
+    finally:
+        db.close()
+    for result in results:
+        print("{}: tuotu {} riviä, hylätty {} ({:.2f} s, {:,.0f} riviä/s).".format(
+            result.table, result.imported, len(result.rejected), result.seconds,
+            (result.imported + len(result.rejected)) / max(result.seconds, 1e-9)))
+        for rejection in result.rejected[:20]:
+            print("  rivi {}: {}".format(rejection.line, rejection.reason))
+        if len(result.rejected) > 20:
+            print("  ... ja {} muuta.".format(len(result.rejected) - 20))
+
+if __name__ == "__main__":
+    main()
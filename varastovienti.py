@@ -0,0 +1,316 @@
+"""
+Export of tables and views to files and online snapshots of the warehouse database, eg. for reporting and
+nightly reconciliation.
+
+The rows are streamed from a cursor in batches of EXPORT_BATCH rows, so the memory use does not grow with
+the size of the relation. Several relations are read in one read transaction, so the files agree with
+each other. Relations can be written as CSV, JSON Lines and, when pyarrow is installed, Parquet.
+
+A snapshot copies the whole database with the backup API of SQLite in one step, which is a single read
+transaction. In WAL mode (Database(concurrent=True)) neither the exports nor the snapshots block writers.
+
+The export can be run from the command line:
+    python varastovienti.py varasto.db [NÄKYMÄ=TIEDOSTO ...] [--backup PATH]
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3 as sql
+import time
+from typing import Iterable, Iterator, NamedTuple, Sequence
+import varastokysely
+
+# Rows fetched from the cursor at a time
+EXPORT_BATCH = 5000
+
+# File extension: format
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+# Column affinity: Parquet type of the column, see varastokysely.affinity()
+_PARQUET_TYPES = {
+    "INTEGER": "int64",
+    "REAL": "float64",
+    "NUMERIC": "float64",
+    "TEXT": "string",
+}
+
+class ExportResult(NamedTuple):
+    """
+    The result of exporting a table or view.
+
+    Attributes:
+        relation (str): The table or view.
+        path (str): The written file.
+        rows (int): The number of exported rows.
+        seconds (float): The time the export took.
+    """
+    relation: str
+    path: str
+    rows: int
+    seconds: float
+
+def file_format(path: str) -> str:
+    """
+    Returns the export format of a file by its extension.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: "csv", "jsonl" or "parquet".
+
+    Raises:
+        ValueError: If the extension is not one of FORMATS.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError("Tiedostomuotoa '{}' ei tueta, käytä jotakin näistä: {}.".format(
+            extension, ", ".join(FORMATS)))
+    return FORMATS[extension]
+
+def _batches(cursor: sql.Cursor, batch_size: int) -> Iterator[list[tuple]]:
+    """
+    Yields the rows of a cursor in batches.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor of the query.
+        batch_size (int): Rows per batch.
+
+    Yields:
+        list[tuple]: The rows of a batch.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+def write_csv(path: str, columns: Sequence[str], batches: Iterable[list[tuple]], delimiter: str=";") -> int:
+    """
+    Writes rows to a CSV file with a header row. NULL is written as an empty field, like varastotuonti reads
+    it.
+
+    Args:
+        path (str): The path to the file.
+        columns (Sequence[str]): The column names.
+        batches (Iterable[list[tuple]]): The rows in batches.
+        delimiter (str, optional): The field separator. Defaults to ";".
+
+    Returns:
+        int: The number of written rows.
+    """
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=delimiter)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def write_json_lines(path: str, columns: Sequence[str], batches: Iterable[list[tuple]]) -> int:
+    """
+    Writes rows to a JSON Lines file, one object per row.
+
+    Args:
+        path (str): The path to the file.
+        columns (Sequence[str]): The column names.
+        batches (Iterable[list[tuple]]): The rows in batches.
+
+    Returns:
+        int: The number of written rows.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for rows in batches:
+            file.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+            count += len(rows)
+    return count
+
+def write_parquet(path: str, columns: Sequence[str], batches: Iterable[list[tuple]],
+                  affinities: Sequence[str]) -> int:
+    """
+    Writes rows to a Parquet file, one row group per batch. pyarrow is only imported on first use.
+
+    Args:
+        path (str): The path to the file.
+        columns (Sequence[str]): The column names.
+        batches (Iterable[list[tuple]]): The rows in batches.
+        affinities (Sequence[str]): The affinities of the columns. The types of columns without a declared
+                                    type, eg. COUNT() in a view, are taken from the first batch.
+
+    Returns:
+        int: The number of written rows.
+
+    Raises:
+        ValueError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet-tiedostojen vienti vaatii pyarrow-kirjaston.") from None
+    count = 0
+    writer = None
+    try:
+        for rows in batches:
+            data = [list(values) for values in zip(*rows)]
+            if writer is None:
+                fields = []
+                for name, affinity, values in zip(columns, affinities, data):
+                    if affinity in _PARQUET_TYPES:
+                        kind = pa.type_for_alias(_PARQUET_TYPES[affinity])
+                    else:
+                        kind = pa.array(values).type
+                        kind = pa.string() if pa.types.is_null(kind) else kind
+                    fields.append(pa.field(name, kind))
+                writer = pq.ParquetWriter(path, pa.schema(fields))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, field.type) for values, field in zip(data, writer.schema_arrow)],
+                schema=writer.schema_arrow))
+            count += len(rows)
+        if writer is None:
+            writer = pq.ParquetWriter(path, pa.schema([
+                pa.field(name, pa.type_for_alias(_PARQUET_TYPES.get(affinity, "string")))
+                for name, affinity in zip(columns, affinities)]))
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def export_relation(connection: sql.Connection, catalog: varastokysely.SchemaCatalog, relation: str, path: str,
+                    batch_size: int=EXPORT_BATCH) -> ExportResult:
+    """
+    Writes all rows of a table or view to a file in the format of its extension, see file_format().
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        catalog (varastokysely.SchemaCatalog): The catalog of the database.
+        relation (str): The table or view.
+        path (str): The path to the file.
+        batch_size (int, optional): Rows fetched at a time. Defaults to EXPORT_BATCH.
+
+    Returns:
+        ExportResult: The number of exported rows.
+
+    Raises:
+        ValueError: If the relation does not exist or the format is not supported.
+    """
+    start = time.perf_counter()
+    kind = file_format(path)
+    if batch_size < 1:
+        raise ValueError("Erän koon on oltava vähintään 1.")
+    relation = catalog.relation(relation)
+    cursor = connection.execute(varastokysely.QueryBuilder(catalog).select(relation, "*"))
+    columns = [description[0] for description in cursor.description]
+    batches = _batches(cursor, batch_size)
+    if kind == "csv":
+        count = write_csv(path, columns, batches)
+    elif kind == "jsonl":
+        count = write_json_lines(path, columns, batches)
+    else:
+        affinities = [column.affinity for column in catalog.columns(relation)]
+        count = write_parquet(path, columns, batches, affinities)
+    return ExportResult(relation, path, count, time.perf_counter() - start)
+
+def export_relations(connection: sql.Connection, exports: Iterable[tuple[str, str]],
+                     batch_size: int=EXPORT_BATCH,
+                     catalog: varastokysely.SchemaCatalog|None=None) -> list[ExportResult]:
+    """
+    Writes tables and views to files in one read transaction, so that all files show the same state of
+    the database. Must not be called inside a transaction.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        exports (Iterable[tuple[str, str]]): (table or view, path) pairs.
+        batch_size (int, optional): Rows fetched at a time. Defaults to EXPORT_BATCH.
+        catalog (varastokysely.SchemaCatalog|None, optional): The catalog of the database. Defaults to None to
+                                                              load it.
+
+    Returns:
+        list[ExportResult]: The result of each export in the order given.
+
+    Raises:
+        ValueError: If a relation does not exist or a format is not supported.
+    """
+    exports = list(exports)
+    if catalog is None:
+        catalog = varastokysely.SchemaCatalog.load(connection)
+    for relation, path in exports:
+        catalog.relation(relation)
+        file_format(path)
+    results = []
+    connection.execute("BEGIN;")
+    try:
+        for relation, path in exports:
+            results.append(export_relation(connection, catalog, relation, path, batch_size))
+    finally:
+        connection.rollback()
+    return results
+
+def snapshot(connection: sql.Connection, path: str) -> int:
+    """
+    Copies the database to a file with the backup API. The copy is made in one step, so it shows the state
+    of a single moment even while other connections write. An existing file is replaced.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the warehouse database.
+        path (str): The path to the copy.
+
+    Returns:
+        int: The size of the copy in pages.
+    """
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    target = sql.connect(path)
+    try:
+        connection.backup(target)
+        pages = target.execute("PRAGMA page_count;").fetchone()[0]
+    finally:
+        target.close()
+    return pages
+
+def main(args: list[str]|None=None):
+    parser = argparse.ArgumentParser(description="Vie varastotietokannan tauluja ja näkymiä tiedostoihin.")
+    parser.add_argument("db", help="Varastotietokanta.")
+    parser.add_argument("exports", nargs="*", metavar="NÄKYMÄ=TIEDOSTO",
+                        help="Taulu tai näkymä ja tiedosto ({}).".format(", ".join(FORMATS)))
+    parser.add_argument("-b", "--backup", default=None, help="Kopioi koko tietokannan tähän tiedostoon.")
+    options = parser.parse_args(args)
+    exports = []
+    for export in options.exports:
+        relation, separator, path = export.partition("=")
+        if not separator or not path:
+            parser.error("Anna vienti muodossa NÄKYMÄ=TIEDOSTO: {}".format(export))
+        exports.append((relation, path))
+    if not exports and options.backup is None:
+        parser.error("Anna vähintään yksi vienti tai --backup.")
+
+    # Imported here, as varastologiikka imports this module
+    import varastologiikka
+    db = varastologiikka.Database(options.db)
+    try:
+        results = db.export(exports)
+        if options.backup is not None:
+            pages = db.snapshot(options.backup)
+    except ValueError as error:
+        print("Virhe: {}".format(error))
+        return
+    finally:
+        db.close()
+    for result in results:
+        print("{}: {} riviä tiedostoon {} ({:.2f} s).".format(result.relation, result.rows, result.path,
+                                                                result.seconds))
+    if options.backup is not None:
+        print("Tietokanta kopioitu tiedostoon {} ({} sivua).".format(options.backup, pages))
+
+if __name__ == "__main__":
+    main()